@@ -3,6 +3,7 @@ import sys
 import maya.OpenMaya as OpenMaya
 import maya.OpenMayaMPx as OpenMayaMPx
 
+import mila_node
 from mila_node import *
 
 import pprint
@@ -566,6 +567,32 @@ def commandSyntax():
     return syntax
 
 
+class milaDGModifier( OpenMayaMPx.MPxCommand ):
+    """ Execute the operation queued by mila_node.mila_execute and keep its MDGModifier for undo/redo """
+
+    def __init__( self ):
+        OpenMayaMPx.MPxCommand.__init__( self )
+
+        self.dgModifier = None
+
+    @staticmethod
+    def creator():
+        return OpenMayaMPx.asMPxPtr( milaDGModifier() )
+
+    def doIt( self, argList ):
+        operation = mila_node.mila_pop_operation()
+        self.dgModifier = operation()
+
+    def redoIt( self, *args ):
+        self.dgModifier.doIt()
+
+    def undoIt( self, *args ):
+        self.dgModifier.undoIt()
+
+    def isUndoable( self, *args ):
+        return True
+
+
 class milaDragAndDrop( OpenMayaMPx.MPxDragAndDropBehavior ):
 
     def __init__( self ):
@@ -644,6 +671,12 @@ def initializePlugin( mobject ):
         sys.stderr.write( "Failed to register milaMaterial command" )
         raise
 
+    try:
+        mplugin.registerCommand( "milaDGModifier", milaDGModifier.creator )
+    except:
+        sys.stderr.write( "Failed to register milaDGModifier command" )
+        raise
+
     try:
         mplugin.registerDragAndDropBehavior( "milaDragAndDrop", milaDragAndDrop.creator )
     except:
@@ -660,6 +693,12 @@ def uninitializePlugin( mobject ):
         sys.stderr.write( "Failed to deregister milaMaterial command" )
         raise
 
+    try:
+        mplugin.deregisterCommand( "milaDGModifier" )
+    except:
+        sys.stderr.write( "Failed to deregister milaDGModifier command" )
+        raise
+
     try:
         mplugin.deregisterDragAndDropBehavior( "milaDragAndDrop" )
     except:
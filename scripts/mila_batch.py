@@ -0,0 +1,222 @@
+"""
+Batch maintenance of mila networks, meant to be run with mayapy:
+
+    mayapy mila_batch.py --clean --compact --strip-solo --orphans --jobs 4 --report reports scene_a.ma scene_b.mb
+
+Every mila_material of every scene is processed, the scene is saved (unless --dry-run is used)
+and a json report is written per file in the report directory.
+"""
+
+# Python modules
+import os
+import sys
+import json
+import time
+import argparse
+import traceback
+import multiprocessing
+
+# Maya modules
+import maya.cmds as cmds
+
+# Mila modules
+from mila_node import mila_node, mila_root_layer, mila_clean, mila_reorder_node, mila_remove_solo, mila_solo_layer, MILA_GROUP_TYPES, MILA_COMPONENT_TYPES
+
+
+MILA_BATCH_OPERATIONS = ( "strip_solo", "clean", "compact", "orphans" )
+
+_standalone = False
+
+def mila_batch_initialize( plugins=( "Mayatomr", ) ):
+    # Start maya standalone once per process, this is also the worker initializer of the pool
+    global _standalone
+
+    if not _standalone:
+        import maya.standalone
+        maya.standalone.initialize( name="python" )
+        _standalone = True
+
+    for plugin in plugins:
+        cmds.loadPlugin( plugin, quiet=True )
+
+
+def mila_group_nodes( mila ):
+    """ Return all group nodes used by the mila_material (each one only once) """
+
+    root = mila_root_layer( mila )
+    if not root:
+        return []
+
+    groups = [root]
+    for child in root.children( recurse=True ):
+        if child.type() == "group" and child not in groups:
+            groups.append( child )
+
+    return groups
+
+
+def mila_batch_strip_solo( materials ):
+    # Restore the materials left in solo, then delete their solo layers (kept by mila_remove_solo for the next solo)
+
+    restored = []
+    deleted = []
+
+    for mila in materials:
+        save_attr = mila.attr( "save_shader" )
+        if cmds.objExists( save_attr ) and cmds.connectionInfo( save_attr, isExactDestination=True ):
+            mila_remove_solo( mila )
+            restored.append( mila.name() )
+
+        layer = mila_solo_layer( mila )
+        if layer:
+            deleted.append( layer.name() )
+            cmds.delete( layer.name() )
+
+    return {"restored": restored, "deleted": deleted}
+
+
+def mila_batch_clean( materials ):
+
+    removed = 0
+
+    for mila in materials:
+        for group in mila_group_nodes( mila ):
+            count = len( group.indices() )
+            mila_clean( group )
+            removed += count - len( group.indices() )
+
+    return {"removed_slots": removed}
+
+
+def mila_batch_compact( materials ):
+
+    compacted = []
+
+    for mila in materials:
+        for group in mila_group_nodes( mila ):
+            indices = group.indices()
+            if indices != range( len( indices ) ):
+                mila_reorder_node( group, clean=True )
+                compacted.append( group.name() )
+
+    return {"compacted": compacted}
+
+
+def mila_batch_orphans( materials ):
+    # Any mila node that can't be reached from a mila_material is deleted
+
+    used = set()
+
+    for mila in materials:
+        # The network and the solo layer (kept by the material even out of solo) are in use
+        for root in set( [mila_root_layer( mila ), mila.child(), mila_solo_layer( mila )] ):
+            if root:
+                used.add( root.name() )
+                used.update( child.name() for child in root.children( recurse=True ) )
+
+    node_types = list( MILA_GROUP_TYPES ) + MILA_COMPONENT_TYPES
+    orphans = [node for node in cmds.ls( type=node_types ) or [] if node not in used]
+
+    if orphans:
+        cmds.delete( orphans )
+
+    return {"deleted": orphans}
+
+
+MILA_BATCH_FUNCTIONS = {
+                        "strip_solo": mila_batch_strip_solo,
+                        "clean": mila_batch_clean,
+                        "compact": mila_batch_compact,
+                        "orphans": mila_batch_orphans
+                        }
+
+
+def mila_batch_scene( path, operations, save=True ):
+    """ Open the scene, run the operations on all its mila_material and return a report dictionary """
+
+    report = {"file": path, "operations": list( operations ), "saved": False}
+    start = time.time()
+
+    try:
+        cmds.file( path, open=True, force=True, prompt=False )
+
+        materials = [mila_node( item ) for item in cmds.ls( type="mila_material" ) or []]
+        report["materials"] = len( materials )
+
+        # Always use the same order: solo layers must be gone before cleaning, and orphans are only known once the networks are clean
+        for operation in MILA_BATCH_OPERATIONS:
+            if operation in operations:
+                report[operation] = MILA_BATCH_FUNCTIONS[operation]( materials )
+
+        if save:
+            cmds.file( save=True, force=True )
+            report["saved"] = True
+
+    except Exception, e:
+        report["error"] = str( e )
+        report["traceback"] = traceback.format_exc()
+
+    report["time"] = time.time() - start
+
+    return report
+
+
+def _batch_worker( args ):
+    path, operations, save, report_dir = args
+
+    report = mila_batch_scene( path, operations, save )
+
+    if report_dir:
+        report_file = os.path.join( report_dir, "%s.mila.json" % os.path.basename( path ) )
+        with open( report_file, "w" ) as f:
+            json.dump( report, f, indent=2, sort_keys=True )
+
+    return report
+
+
+def main( argv=None ):
+
+    parser = argparse.ArgumentParser( description="Batch maintenance of mila_material networks." )
+    parser.add_argument( "files", nargs="+", help="Maya scene files to process" )
+    parser.add_argument( "--clean", action="store_true", help="remove empty layer/mix slots" )
+    parser.add_argument( "--compact", action="store_true", help="reorder slots so indices are consecutive" )
+    parser.add_argument( "--strip-solo", action="store_true", help="restore materials left in solo state and delete their solo layers" )
+    parser.add_argument( "--orphans", action="store_true", help="delete mila nodes not used by any mila_material" )
+    parser.add_argument( "--report", default="", help="directory receiving one json report per file" )
+    parser.add_argument( "--jobs", "-j", type=int, default=1, help="number of worker processes" )
+    parser.add_argument( "--dry-run", action="store_true", help="do not save the scenes" )
+    parser.add_argument( "--plugin", action="append", default=None, help="plugin defining the mila nodes (default: Mayatomr)" )
+
+    args = parser.parse_args( argv )
+
+    operations = [name for name in MILA_BATCH_OPERATIONS if getattr( args, name )]
+    if not operations:
+        parser.error( "No operation specified" )
+
+    plugins = tuple( args.plugin or ( "Mayatomr", ) )
+
+    if args.report and not os.path.isdir( args.report ):
+        os.makedirs( args.report )
+
+    tasks = [( os.path.abspath( path ), operations, not args.dry_run, args.report ) for path in args.files]
+
+    if args.jobs > 1 and len( tasks ) > 1:
+        pool = multiprocessing.Pool( min( args.jobs, len( tasks ) ), mila_batch_initialize, ( plugins, ) )
+        try:
+            reports = pool.map( _batch_worker, tasks, chunksize=1 )
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        mila_batch_initialize( plugins )
+        reports = [_batch_worker( task ) for task in tasks]
+
+    failed = [report["file"] for report in reports if "error" in report]
+    for path in failed:
+        sys.stderr.write( "mila_batch: failed to process %s\n" % path )
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit( main() )
@@ -0,0 +1,263 @@
+"""
+Benchmark of the mila network operations on synthetic scenes, meant to be run with mayapy:
+
+    mayapy mila_bench.py --layers 10 50 --depth 0 2 --sharing 0 0.5 --gaps 0 3 --output bench.json
+
+or without maya, on the in-memory graph of tools/fakemaya:
+
+    python mila_bench.py --fake --output bench.json --compare previous.json
+
+Every combination of the scene parameters is built from scratch for each run of each operation.
+The time and the number of maya calls (see mila_profile) of every operation are written as json, --compare reports the
+operations that got slower than a previous result file.
+"""
+
+# Python modules
+import os
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+import itertools
+
+if __name__ == "__main__" and "--fake" in sys.argv:
+    # The fake maya modules must be found before any maya import
+    sys.path.insert( 0, os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), "..", "tools", "fakemaya" ) )
+
+# Maya modules
+import maya.cmds as cmds
+
+# Mila modules
+from mila_node import mila_node, mila_init, mila_move, mila_delete, mila_set_solo, mila_remove_solo, mila_reorder_node, MILA_COMPONENT_TYPES
+from mila_profile import MilaProfiler
+
+
+MILA_BENCH_OPERATIONS = ( "move", "reorder", "delete", "solo", "reload" )
+
+
+## Scenes ---
+
+class MilaBenchScene( object ):
+    """ A mila_material with a synthetic network.
+    layers: number of slots per group
+    depth: number of nested group levels under the root layer
+    sharing: probability for a component slot to reuse an existing component (linked node)
+    gaps: number of unused indices between two slots (sparse multi) """
+
+    def __init__( self, layers=10, depth=1, sharing=0.0, gaps=0, seed=0 ):
+
+        self.params = {"layers": layers, "depth": depth, "sharing": sharing, "gaps": gaps}
+
+        self.random = random.Random( seed )
+        self.components = []
+        self.groups = []
+        self.nodes = 0
+
+        self.mila = mila_node( cmds.createNode( "mila_material", skipSelect=True ) )
+        self.root = mila_node( mila_init( self.mila ) )
+
+        self._fill( self.root.name(), "layers", depth )
+
+    def _create( self, nodeType ):
+        self.nodes += 1
+        return cmds.createNode( nodeType, skipSelect=True )
+
+    def _fill( self, group, multi, depth ):
+
+        self.groups.append( group )
+
+        layers = self.params["layers"]
+        # A quarter of the slots hold a nested group
+        subgroups = max( 1, layers // 4 ) if depth > 0 else 0
+
+        for i in range( layers ):
+            index = i * ( self.params["gaps"] + 1 )
+
+            if i < subgroups:
+                nodeType = "mila_mix" if depth % 2 else "mila_layer"
+                child = self._create( nodeType )
+                self._fill( child, "components" if nodeType == "mila_mix" else "layers", depth - 1 )
+
+            elif self.components and self.random.random() < self.params["sharing"]:
+                child = self.random.choice( self.components )
+
+            else:
+                child = self._create( self.random.choice( MILA_COMPONENT_TYPES ) )
+                self.components.append( child )
+
+            cmds.connectAttr( "%s.message" % child, "%s.%s[%s].shader" % ( group, multi, index ), force=True )
+
+
+## Operations ---
+# Each operation gets a fresh scene and returns the function to time
+
+def _bench_move( scene ):
+    # Move the last slot of the root to the top
+    last = list( scene.root.children() )[-1]
+    return lambda: mila_move( [last], scene.root, index=0, remove=True )
+
+def _bench_reorder( scene ):
+    return lambda: mila_reorder_node( scene.root, clean=True )
+
+def _bench_delete( scene ):
+    # Delete the first nested group (or the first slot) of the root
+    first = scene.root.child( scene.root.indices()[0] )
+    return lambda: mila_delete( first )
+
+def _bench_solo( scene ):
+    component = mila_node( scene.components[-1] )
+
+    def run():
+        mila_set_solo( component, scene.mila )
+        mila_remove_solo( scene.mila )
+
+    return run
+
+def _bench_reload( scene ):
+    # Only available in an interactive maya session
+    from mila_material_ui import TreeWidget
+
+    widget = TreeWidget( scene.mila.name(), None )
+    widget.setMila( scene.mila.name() )
+
+    def run():
+        widget.reload()
+        # Without event loop the build timer never fires, the whole tree is built in the timed call
+        widget.finishBuild()
+
+    return run
+
+MILA_BENCH_FUNCTIONS = {
+                        "move": _bench_move,
+                        "reorder": _bench_reorder,
+                        "delete": _bench_delete,
+                        "solo": _bench_solo,
+                        "reload": _bench_reload
+                        }
+
+
+def mila_bench_operation( operation, params, repeat=3 ):
+    """ Time operation on fresh scenes built with params, returns a result dictionary """
+
+    result = {"operation": operation, "params": dict( params ), "times": [], "calls": {}}
+
+    for run in range( repeat ):
+        cmds.file( new=True, force=True )
+        scene = MilaBenchScene( seed=run, **params )
+        result["nodes"] = scene.nodes
+
+        try:
+            fn = MILA_BENCH_FUNCTIONS[operation]( scene )
+        except ImportError, e:
+            result["skipped"] = str( e )
+            return result
+
+        profiler = MilaProfiler( trace=False )
+        with profiler:
+            start = time.time()
+            try:
+                with profiler.operation( operation ):
+                    fn()
+            except Exception, e:
+                result["error"] = "%s: %s" % ( type( e ).__name__, e )
+                return result
+            result["times"].append( time.time() - start )
+
+        # The calls are the same for each run of the same scene
+        result["calls"] = profiler.counts()
+        result["total_calls"] = sum( result["calls"].values() )
+
+    result["best"] = min( result["times"] )
+    result["mean"] = sum( result["times"] ) / len( result["times"] )
+
+    return result
+
+
+def mila_bench( operations=MILA_BENCH_OPERATIONS, layers=( 10, ), depth=( 1, ), sharing=( 0.0, ), gaps=( 0, ), repeat=3 ):
+    """ Run every operation on every combination of the scene parameters, returns the json document """
+
+    doc = {
+            "meta": {
+                    "time": time.strftime( "%Y-%m-%d %H:%M:%S" ),
+                    "python": platform.python_version(),
+                    "maya": "fake" if getattr( sys.modules.get( "maya" ), "FAKE", False ) else cmds.about( version=True ),
+                    "repeat": repeat
+                    },
+            "results": []
+          }
+
+    for layerCount, depthCount, ratio, gapCount in itertools.product( layers, depth, sharing, gaps ):
+        params = {"layers": layerCount, "depth": depthCount, "sharing": ratio, "gaps": gapCount}
+        for operation in operations:
+            doc["results"].append( mila_bench_operation( operation, params, repeat ) )
+
+    return doc
+
+
+def _result_key( result ):
+    params = result["params"]
+    return ( result["operation"], params["layers"], params["depth"], params["sharing"], params["gaps"] )
+
+
+def mila_bench_compare( doc, previous, threshold=1.2 ):
+    """ Return ( key, previous best, best ) for every result slower than threshold times the previous one """
+
+    before = dict( ( _result_key( result ), result ) for result in previous["results"] if "best" in result )
+
+    regressions = []
+    for result in doc["results"]:
+        old = before.get( _result_key( result ) )
+        if old is None or "best" not in result:
+            continue
+        if result["best"] > old["best"] * threshold:
+            regressions.append( ( _result_key( result ), old["best"], result["best"] ) )
+
+    return regressions
+
+
+def main( argv=None ):
+
+    parser = argparse.ArgumentParser( description="Benchmark of the mila network operations." )
+    parser.add_argument( "--operations", nargs="+", default=list( MILA_BENCH_OPERATIONS ), choices=MILA_BENCH_OPERATIONS )
+    parser.add_argument( "--layers", nargs="+", type=int, default=[10], help="slots per group" )
+    parser.add_argument( "--depth", nargs="+", type=int, default=[1], help="nested group levels" )
+    parser.add_argument( "--sharing", nargs="+", type=float, default=[0.0], help="ratio of linked components" )
+    parser.add_argument( "--gaps", nargs="+", type=int, default=[0], help="unused indices between slots" )
+    parser.add_argument( "--repeat", type=int, default=3, help="runs per measure, the best time is kept" )
+    parser.add_argument( "--output", default="", help="json file receiving the results" )
+    parser.add_argument( "--compare", default="", help="previous json result file" )
+    parser.add_argument( "--threshold", type=float, default=1.2, help="slowdown ratio reported by --compare" )
+    parser.add_argument( "--fake", action="store_true", help="run on the in-memory graph of tools/fakemaya" )
+    parser.add_argument( "--plugin", action="append", default=None, help="plugin defining the mila nodes (default: Mayatomr)" )
+
+    args = parser.parse_args( argv )
+
+    if not args.fake:
+        from mila_batch import mila_batch_initialize
+        mila_batch_initialize( tuple( args.plugin or ( "Mayatomr", ) ) )
+
+    doc = mila_bench( args.operations, args.layers, args.depth, args.sharing, args.gaps, args.repeat )
+
+    for result in doc["results"]:
+        status = result.get( "error" ) or result.get( "skipped" ) or "%.4fs  %s calls" % ( result["best"], result["total_calls"] )
+        sys.stdout.write( "%-8s %-50s %s\n" % ( result["operation"], json.dumps( result["params"], sort_keys=True ), status ) )
+
+    if args.output:
+        with open( args.output, "w" ) as f:
+            json.dump( doc, f, indent=2, sort_keys=True )
+
+    if args.compare:
+        with open( args.compare ) as f:
+            regressions = mila_bench_compare( doc, json.load( f ), args.threshold )
+        for key, before, after in regressions:
+            sys.stderr.write( "mila_bench: %s is slower: %.4fs -> %.4fs\n" % ( key, before, after ) )
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit( main() )
@@ -0,0 +1,189 @@
+"""
+Find identical mila sub-networks and make them share a single instance.
+
+Two nodes are identical when they have the same type, the same nice name, the same attribute values, the same
+external inputs and identical children with the same slot data. The structural hash is computed bottom-up and memoized,
+so every node is only read once.
+"""
+
+# Python modules
+import hashlib
+import json
+
+# Maya modules
+import maya.cmds as cmds
+import maya.OpenMaya as OpenMaya
+
+# Mila modules
+from mila_node import *
+from mila_node import mila_attribute_data, mila_slot_data, getDependencyNode, _nice_name, MILA_NODES
+
+
+def _canonical( value ):
+    # Floats are rounded so values read back from a file hash the same
+    if isinstance( value, float ):
+        return round( value, 6 )
+    if isinstance( value, ( list, tuple ) ):
+        return [_canonical( item ) for item in value]
+    if isinstance( value, dict ):
+        return dict( ( key, _canonical( item ) ) for key, item in value.items() )
+    return value
+
+
+class MilaHasher( object ):
+    """ Memoized structural hash of mila nodes """
+
+    def __init__( self ):
+
+        # node name -> hash
+        self.hashes = {}
+
+    def hash( self, node ):
+
+        node = mila_node( node )
+
+        try:
+            return self.hashes[node.name()]
+        except KeyError:
+            pass
+
+        values, inputs = mila_attribute_data( node )
+
+        # The user labels must survive the merge, two copies named differently are kept apart
+        data = [node.nodeType(), _nice_name( node.obj, node._node ) or "", _canonical( values ), inputs]
+
+        if node.type() == "group":
+            # Slot order matters (layers are stacked) but not the sparse indices, a compacted copy is still identical
+            slots = []
+            for child, index in node.children( index=True ):
+                slotValues, slotInputs = mila_slot_data( node, index )
+                slots.append( [self.hash( child ), _canonical( slotValues ), slotInputs] )
+            data.append( slots )
+
+        digest = hashlib.sha1( json.dumps( data, sort_keys=True ) ).hexdigest()
+
+        self.hashes[node.name()] = digest
+
+        return digest
+
+
+def mila_find_duplicates( materials=None, hasher=None ):
+    """ Return {hash: [node names]} for every sub-network found more than once under the materials (all mila_material by default).
+    The root layers of the materials are never part of the result. The first name of each list is the instance that will be kept. """
+
+    if materials is None:
+        materials = cmds.ls( type="mila_material" ) or []
+
+    if hasher is None:
+        hasher = MilaHasher()
+
+    groups = {}
+
+    roots = [root for root in ( mila_root_layer( mila ) for mila in materials ) if root]
+    # The root layers belong to their material, only the sub-networks below them are shared
+    root_names = set( root.name() for root in roots )
+
+    for root in roots:
+        for node in root.children( recurse=True ):
+            if node.name() in root_names:
+                continue
+            digest = hasher.hash( node )
+            names = groups.setdefault( digest, [] )
+            if node.name() not in names:
+                names.append( node.name() )
+
+    return dict( ( digest, names ) for digest, names in groups.items() if len( names ) > 1 )
+
+
+def _subtree_names( node ):
+
+    node = mila_node( node )
+
+    names = set( [node.name()] )
+    names.update( child.name() for child in node.children( recurse=True ) )
+
+    return names
+
+
+def _owned_names( node ):
+    """ Return the names of node and of its children that are only used under node """
+
+    node = mila_node( node )
+
+    owned = set( [node.name()] )
+    children = list( node.children( recurse=True ) )
+
+    # Grow the set until it is stable, a child is owned when all its parents are owned
+    changed = True
+    while changed:
+        changed = False
+        for child in children:
+            if child.name() in owned:
+                continue
+            if all( parent.name() in owned for parent in child.parents() ):
+                owned.add( child.name() )
+                changed = True
+
+    return owned
+
+
+def mila_merge_duplicates( materials=None, dry_run=False ):
+    """ Reconnect every duplicated sub-network to a single shared instance and delete the unused copies.
+    The whole merge is a single MDGModifier (one undo step, see mila_execute).
+    Returns a report dictionary: {"merged": [(duplicate, kept), ...], "deleted": [names], "saved_nodes": count} """
+
+    hasher = MilaHasher()
+    duplicates = mila_find_duplicates( materials, hasher )
+
+    report = {"merged": [], "deleted": [], "saved_nodes": 0}
+
+    # Merge the biggest sub-networks first, their children are then merged with them
+    order = sorted( duplicates.values(), key=lambda names: -len( _subtree_names( names[0] ) ) )
+
+    def operation( modifier ):
+
+        removed = set()
+
+        for names in order:
+            # Some of the nodes may already be gone with a bigger duplicate
+            names = [name for name in names if name not in removed]
+            if len( names ) < 2:
+                continue
+
+            kept = getDependencyNode( names[0] )[0].findPlug( "message" )
+
+            for name in names[1:]:
+                # Read once the previous merges are done, a shared child may only be owned by this copy now
+                owned = _owned_names( name )
+
+                report["merged"].append( ( name, names[0] ) )
+                report["deleted"] += sorted( owned )
+                removed.update( owned )
+
+                if dry_run:
+                    continue
+
+                # Reconnect all parents of the duplicate to the kept instance (it becomes used multiple times, like a linked node)
+                # The slot data stays on the parents. The plugs are used as is, so a mila_material in solo keeps its save_shader
+                message = getDependencyNode( name )[0].findPlug( "message" )
+                plugs = OpenMaya.MPlugArray()
+                message.connectedTo( plugs, False, True )
+                for i in range( plugs.length() ):
+                    if OpenMaya.MFnDependencyNode( plugs[i].node() ).typeName() not in MILA_NODES:
+                        continue
+                    modifier.disconnect( message, plugs[i] )
+                    modifier.connect( kept, plugs[i] )
+
+                for item in owned:
+                    modifier.deleteNode( getDependencyNode( item )[1] )
+
+                modifier.doIt()
+
+    if dry_run:
+        operation( None )
+    else:
+        mila_execute( operation )
+
+    report["saved_nodes"] = len( report["deleted"] )
+
+    return report
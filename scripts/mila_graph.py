@@ -0,0 +1,155 @@
+"""
+Read the whole mila graph of the scene in a single pass.
+
+All mila nodes are listed with one ls and their connections are read through the API,
+so the cost is linear in the number of nodes and slots and there is no per-node cmds round-trip.
+The result is a set of plain dictionaries (forward and reverse indices) that can be queried freely.
+"""
+
+# Maya modules
+import maya.cmds as cmds
+import maya.OpenMaya as OpenMaya
+
+# Mila modules
+from mila_node import MILA_NODES, MILA_GROUP_TYPES, MILA_MULTI_ATTR_NAME
+
+
+def _source_name( plug ):
+    # Return the name of the node connected to plug, None if nothing is connected
+
+    sources = OpenMaya.MPlugArray()
+    if plug.connectedTo( sources, True, False ) and sources.length():
+        return OpenMaya.MFnDependencyNode( sources[0].node() ).name()
+
+    return None
+
+
+class MilaGraph( object ):
+    """ Snapshot of all mila nodes and of their connections """
+
+    def __init__( self ):
+
+        # node name -> node type
+        self.types = {}
+        # node name -> MObject
+        self.objects = {}
+        # group name -> [( index, child name or None )], in index order
+        self.slots = {}
+        # node name -> [( parent name, index )], index is None for the shader/save_shader/solo_layer of a mila_material
+        self.parents = {}
+        # mila_material name -> name of the node connected to shader/save_shader
+        self.shader = {}
+        self.saved = {}
+        # layers with the tmp_layer attribute (solo layers)
+        self.solo_layers = set()
+        # mila_material name -> name of its solo layer (connected to solo_layer, kept between two solos)
+        self.pooled = {}
+
+        self.scan()
+
+    def scan( self ):
+
+        names = cmds.ls( type=list( MILA_NODES ) ) or []
+        if not names:
+            return
+
+        sel = OpenMaya.MSelectionList()
+        for name in names:
+            sel.add( name )
+
+        indices = OpenMaya.MIntArray()
+
+        for i in range( sel.length() ):
+            obj = OpenMaya.MObject()
+            sel.getDependNode( i, obj )
+            fn = OpenMaya.MFnDependencyNode( obj )
+
+            name = fn.name()
+            nodeType = fn.typeName()
+
+            self.types[name] = nodeType
+            self.objects[name] = obj
+            self.parents.setdefault( name, [] )
+
+            if nodeType == "mila_material":
+                self.shader[name] = _source_name( fn.findPlug( "shader" ) )
+                self.saved[name] = _source_name( fn.findPlug( "save_shader" ) ) if fn.hasAttribute( "save_shader" ) else None
+                if fn.hasAttribute( "solo_layer" ):
+                    self.pooled[name] = _source_name( fn.findPlug( "solo_layer" ) )
+
+            elif nodeType in MILA_GROUP_TYPES:
+                if fn.hasAttribute( "tmp_layer" ):
+                    self.solo_layers.add( name )
+
+                multi = fn.findPlug( MILA_MULTI_ATTR_NAME[nodeType] )
+                shader_attr = fn.attribute( "shader" )
+                multi.getExistingArrayAttributeIndices( indices )
+
+                slots = []
+                for index in sorted( indices[j] for j in range( indices.length() ) ):
+                    slots.append( ( index, _source_name( multi.elementByLogicalIndex( index ).child( shader_attr ) ) ) )
+                self.slots[name] = slots
+
+        # Reverse indices, built once every node is known
+        for name, slots in self.slots.items():
+            for index, child in slots:
+                if child is not None:
+                    self.parents.setdefault( child, [] ).append( ( name, index ) )
+
+        for material in self.shader:
+            for source in ( self.shader[material], self.saved[material], self.pooled.get( material ) ):
+                if source is not None:
+                    self.parents.setdefault( source, [] ).append( ( material, None ) )
+
+    def materials( self ):
+        return [name for name, nodeType in self.types.items() if nodeType == "mila_material"]
+
+    def children( self, name ):
+        """ Return the names of the nodes connected to the slots of name """
+        return [child for index, child in self.slots.get( name, [] ) if child is not None]
+
+    def reachable( self, roots ):
+        """ Return the set of node names found under roots (included). Each node is only visited once """
+
+        seen = set()
+        stack = [root for root in roots if root is not None]
+
+        while stack:
+            name = stack.pop()
+            if name in seen:
+                continue
+            seen.add( name )
+            stack.extend( self.children( name ) )
+
+        return seen
+
+    def owned( self, name, edges=() ):
+        """ Return the set of nodes deleted with name once it is disconnected from edges ( a list of ( parent name, index ) ):
+        name itself and every node under it only used by deleted nodes. The set is empty if name is still used elsewhere """
+
+        edges = set( edges )
+        if any( edge not in edges for edge in self.parents.get( name, [] ) ):
+            return set()
+
+        owned = set( [name] )
+        stack = self.children( name )
+
+        # A child is checked again each time one of its parents is added, it is owned once all of them are
+        while stack:
+            child = stack.pop()
+            if child in owned:
+                continue
+            if all( parent in owned for parent, index in self.parents.get( child, [] ) ):
+                owned.add( child )
+                stack.extend( self.children( child ) )
+
+        return owned
+
+    def used( self ):
+        """ Return the set of node names reachable from any mila_material (solo layers and saved network included) """
+
+        roots = []
+        for material in self.shader:
+            roots += [material, self.shader[material], self.saved[material], self.pooled.get( material )]
+
+        return self.reachable( roots )
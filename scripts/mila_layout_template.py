@@ -4,9 +4,12 @@ from PySide import QtGui, QtCore
 import maya.cmds as cmds
 import maya.utils
 import maya.OpenMayaUI as OpenMayaUI
-from shiboken import wrapInstance
+from shiboken import wrapInstance, isValid
 import math
 
+# Mila modules
+from mila_profile import mila_profiled
+
 columnWidthData = [( 1, 80 ), ( 3, 10 )]
 columnWidthData2 = [( 1, 80 ), ( 2, 10 )]
 columnWidthData3 = [( 1, 80 )]
@@ -185,6 +188,74 @@ def graphWidgetUI():
 	return graphUI
 
 
+class LayoutScheduler( QtCore.QObject ):
+	""" Collect widget visibility changes and apply them in a single deferred layout pass.
+	Only the Qt layouts holding the widgets are invalidated, the viewport is never refreshed. """
+
+	def __init__( self, *args ):
+		super( LayoutScheduler, self ).__init__( *args )
+
+		# widget -> visibility value (or a callable returning it, evaluated when flushing)
+		self.pending = {}
+
+		self.timer = QtCore.QTimer( self )
+		self.timer.setSingleShot( True )
+		self.timer.setInterval( 0 )
+		self.timer.timeout.connect( self.flush )
+
+	def setVisible( self, widget, value ):
+		# The last request for a widget wins, every request in the same event loop tick is coalesced
+		self.pending[widget] = value
+
+		if not self.timer.isActive():
+			self.timer.start()
+
+	@QtCore.Slot()
+	def flush( self ):
+
+		pending = self.pending
+		self.pending = {}
+
+		invalidLayouts = set()
+
+		for widget, value in pending.items():
+			if not isValid( widget ):
+				continue
+
+			if callable( value ):
+				try:
+					value = value()
+				except RuntimeError:
+					# The attribute may be gone (node deleted while the request was pending)
+					continue
+
+			value = bool( value )
+			if widget.isHidden() == value:
+				widget.setVisible( value )
+
+			parent = widget.parentWidget()
+			if parent is not None:
+				invalidLayouts.add( parent )
+
+		# One layout pass per touched parent, Qt will propagate the geometry change upward
+		for parent in invalidLayouts:
+			if parent.layout():
+				parent.layout().invalidate()
+			parent.updateGeometry()
+
+
+_layoutScheduler = None
+
+def layoutScheduler():
+
+	global _layoutScheduler
+
+	if _layoutScheduler is None:
+		_layoutScheduler = LayoutScheduler( QtGui.QApplication.instance() )
+
+	return _layoutScheduler
+
+
 class AE_mila_base_ui( object ):
 
 	def __init__( self, node=None, node_parent=None ):
@@ -201,17 +272,18 @@ class AE_mila_base_ui( object ):
 		cmds.setParent( ".." )
 
 
+	@mila_profiled( "ae_update" )
 	def setNode( self, node ):
 
 		cmds.tabLayout( self.tabLayoutComponent, edit=True, manage=True )
 
-		nodeType = cmds.nodeType( node )
+		key = AE_mila_template_key( node )
 
 		data = {}
 
 		# Build the tab if it doesn't already exist
-		if nodeType in self.controlData:
-			data = self.controlData[nodeType]
+		if key in self.controlData:
+			data = self.controlData[key]
 
 		else:
 			if cmds.setParent( self.tabLayoutComponent ):
@@ -222,7 +294,7 @@ class AE_mila_base_ui( object ):
 
 				data["obj"] = obj
 				data["ui"] = layout
-				self.controlData[nodeType] = data
+				self.controlData[key] = data
 
 				cmds.setParent( ".." )
 			cmds.setParent( ".." )
@@ -232,17 +304,18 @@ class AE_mila_base_ui( object ):
 		self._setTab( self.tabLayoutComponent, data )
 
 
+	@mila_profiled( "ae_update" )
 	def setParentNode( self, node ):
 
 		cmds.tabLayout( self.tabLayout, edit=True, manage=True )
 
-		nodeType = cmds.nodeType( node )
+		key = AE_mila_template_key( node )
 
 		data = {}
 
 		# Build the tab if it doesn't already exist
-		if nodeType in self.parentData:
-			data = self.parentData[nodeType]
+		if key in self.parentData:
+			data = self.parentData[key]
 
 		else:
 			if cmds.setParent( self.tabLayout ):
@@ -252,7 +325,7 @@ class AE_mila_base_ui( object ):
 
 				data["obj"] = obj
 				data["ui"] = layout
-				self.parentData[nodeType] = data
+				self.parentData[key] = data
 
 				cmds.setParent( ".." )
 			cmds.setParent( ".." )
@@ -307,6 +380,9 @@ class AE_mila_base_template( object ):
 		self.connectControls = []
 		self.scriptJobs = []
 
+		# Sections registered with addSection, their content is built the first time they are expanded
+		self.sections = []
+
 		oldParent = cmds.setParent( query=True )
 
 		self.layout = cmds.columnLayout( adj=True )
@@ -325,6 +401,44 @@ class AE_mila_base_template( object ):
 	def addControlGrp( self, input ):
 		pass
 
+	def addSection( self, label, builder, collapse=True ):
+		""" Create a frameLayout filled by builder( node ), which must return a ( controls, connectControls ) tuple.
+		A collapsed section stays empty until the user expands it. """
+
+		section = {"label": label, "builder": builder, "built": False}
+
+		section["frame"] = cmds.frameLayout( label=label, collapse=collapse, collapsable=True )
+		section["layout"] = cmds.columnLayout( adj=True )
+		cmds.setParent( ".." )
+		cmds.setParent( ".." )
+
+		self.sections.append( section )
+
+		if collapse:
+			cmds.frameLayout( section["frame"], edit=True, expandCommand=lambda *args: self.buildSection( section ) )
+		else:
+			self.buildSection( section )
+
+		return section
+
+	def buildSection( self, section ):
+
+		if section["built"]:
+			return
+
+		section["built"] = True
+
+		oldParent = cmds.setParent( query=True )
+		cmds.setParent( section["layout"] )
+
+		controls, connectControls = section["builder"]( self.node )
+
+		cmds.setParent( oldParent )
+
+		# From now on update() will rebind these controls like the others
+		self.controls += controls
+		self.connectControls += connectControls
+
 	def setNode( self, node ):
 
 		self.node = node
@@ -333,10 +447,22 @@ class AE_mila_base_template( object ):
 
 		self.setNode( node )
 
-		nodeType = cmds.nodeType( self.node )
+		self.bindControls( self.controls, self.connectControls )
+
+		# Update all scriptJob to target the correct node
+		for item in self.scriptJobs:
+
+			attr, parentControl, scriptJobArg, cmd = item
+			attribute = self.attr( attr )
+
+			kargs = {scriptJobArg: ( attribute, cmd )}
+
+			cmds.scriptJob( replacePrevious=True, parent=parentControl, **kargs )
+
+	def bindControls( self, controls, connectControls ):
 
 		# Connect all attributes of the current node to the corresponding control
-		for item in self.connectControls:
+		for item in connectControls:
 
 			attr, control = item[:2]
 			index = None
@@ -358,7 +484,7 @@ class AE_mila_base_template( object ):
 
 			cmds.control( control, edit=True, manage=enable )
 
-		for item in self.controls:
+		for item in controls:
 			attr, control, cmd = item[:3]
 			index = None
 
@@ -371,40 +497,35 @@ class AE_mila_base_template( object ):
 
 			cmds.control( control, edit=True, manage=enable )
 
-		# Update all scriptJob to target the correct node
-		for item in self.scriptJobs:
-
-			attr, parentControl, scriptJobArg, cmd = item
-			attribute = self.attr( attr )
-
-			kargs = {scriptJobArg: ( attribute, cmd )}
-
-			cmds.scriptJob( replacePrevious=True, parent=parentControl, **kargs )
-
 
 class AE_bump_template( AE_mila_base_template ):
 	def __init__( self, node, collapse=True ):
 		super( AE_bump_template, self ).__init__( node )
 
-		if cmds.frameLayout( label="Bump", collapse=True, collapsable=True ):
-			if cmds.columnLayout( adj=True ):
+		self.bump = None
 
-				self.bump = cmds.attrNavigationControlGrp( attribute=self.attr( "bump" ), label="Bump", columnWidth=columnWidthData2, adj=2 )
-				self.addControl( "bump", self.bump, cmds.attrNavigationControlGrp )
+		self.addSection( "Bump", self._bumpSection, collapse )
 
-				self.scriptJobA = cmds.scriptJob( replacePrevious=True, parent=self.bump, connectionChange=( self.attr( "bump" ), self.updateBumpControl ) )
-				self.scriptJobs.append( ( "bump", self.bump, "connectionChange", self.updateBumpControl ) )
+	def _bumpSection( self, node ):
 
-				self.columnLayout = cmds.columnLayout( adj=True, manage=False )
+		self.bump = cmds.attrNavigationControlGrp( attribute=self.attr( "bump" ), label="Bump", columnWidth=columnWidthData2, adj=2 )
 
-				cmds.setParent( ".." )
+		self.scriptJobA = cmds.scriptJob( replacePrevious=True, parent=self.bump, connectionChange=( self.attr( "bump" ), self.updateBumpControl ) )
+		self.scriptJobs.append( ( "bump", self.bump, "connectionChange", self.updateBumpControl ) )
 
-			cmds.setParent( ".." )
+		self.columnLayout = cmds.columnLayout( adj=True, manage=False )
 		cmds.setParent( ".." )
 
 		self.updateBumpControl()
 
+		return [( "bump", self.bump, cmds.attrNavigationControlGrp )], []
+
 	def updateBumpControl( self ):
+
+		# The section has not been expanded yet, there is nothing to update
+		if self.bump is None:
+			return
+
 		# We were unable to set the values, something must be plugin, get it and build controls for it
 		nodeAttr = cmds.connectionInfo( self.attr( "bump" ), sfd=True )
 
@@ -484,9 +605,9 @@ class AE_mila_layer_template( AE_mila_base_template ):
 															cc=self.customFresnelChanged )
 					self.addControl( "exponent", self.exponent, cmds.attrFieldSliderGrp )
 
-					col = cmds.columnLayout( adj=True )
-					if col:
-						self.graphWidget = graphWidgetUI()
+					# The graph widget is built the first time a directional weight mode needs it (see graph())
+					self.graphWidget = None
+					col = self.graphLayout = cmds.columnLayout( adj=True )
 					cmds.setParent( ".." )
 
 				cmds.setParent( ".." )
@@ -559,36 +680,47 @@ class AE_mila_layer_template( AE_mila_base_template ):
 		self.bump.update( node )
 		self._directionalModeChanged()
 
+	def graph( self ):
+
+		if self.graphWidget is None:
+			oldParent = cmds.setParent( query=True )
+			cmds.setParent( self.graphLayout )
+			self.graphWidget = graphWidgetUI()
+			cmds.setParent( oldParent )
+
+		return self.graphWidget
+
 	def _showCurveChanged( self, *args ):
 
-		self.graphWidget.setVisible( False )
-		cmds.refresh()
-		def cmd( obj ):
-			value = cmds.checkBox( obj.showCurve, query=True, value=True ) and cmds.getAttr( obj.attr( "use_directional_weight" ) )
-			self.graphWidget.setVisible( value )
-			cmds.refresh()
+		# Nothing to show or hide until the graph has been built
+		if self.graphWidget is None:
+			return
+
+		def visible():
+			return cmds.checkBox( self.showCurve, query=True, value=True ) and cmds.getAttr( self.attr( "use_directional_weight" ) )
 
 		self.graphWidget.update()
 
-		maya.utils.executeDeferred( cmd, self )
+		# The visibility is resolved on the next event loop tick, so successive calls (update + attribute change) only cost one layout pass
+		layoutScheduler().setVisible( self.graphWidget, visible )
 
 	def customFresnelChanged( self, *args ):
 
-		self.graphWidget.setFunc( schlickFresnel )
+		self.graph().setFunc( schlickFresnel )
 
 		facing = cmds.getAttr( self.attr( "normal_reflectivity" ) )
 		grzing = cmds.getAttr( self.attr( "grazing_reflectivity" ) )
 		expo = cmds.getAttr( self.attr( "exponent" ) )
 
-		self.graphWidget.setArgs( facing, grzing, expo )
+		self.graph().setArgs( facing, grzing, expo )
 
 	def iorFresnelChanged( self, *args ):
 
-		self.graphWidget.setFunc( exactFresnel )
+		self.graph().setFunc( exactFresnel )
 
 		ior = cmds.getAttr( self.attr( "ior" ) )
 
-		self.graphWidget.setArgs( ior )
+		self.graph().setArgs( ior )
 
 
 	def _directionalModeChanged( self, *args ):
@@ -687,296 +819,309 @@ class AE_mila_mix_template( AE_mila_base_template ):
 			pass
 
 
-class AE_mila_diffuse_reflection_template( AE_mila_base_template ):
-
-	def __init__( self, node ):
-
-		super( AE_mila_diffuse_reflection_template, self ).__init__( node )
-
-		self.controls = []
-
-		self.controls += AE_tint_roughness_template( node, "Diffuse Reflection", False )
-		self.controls += AE_contribution_template( node )
-
-
-class AE_mila_diffuse_transmission_template( AE_mila_base_template ):
+# Declarative templates ---
+# Component templates are described by a spec (sections of controls) and built by AE_mila_spec_template
 
-	def __init__( self, node ):
-
-		super( AE_mila_diffuse_transmission_template, self ).__init__( node )
-
-		self.controls = []
-
-		self.controls += AE_tint_roughness_template( node, "Diffuse Reflection", False )
-		self.controls += AE_contribution_template( node )
-
-
-class AE_mila_glossy_reflection_template( AE_mila_base_template ):
-
-	def __init__( self, node ):
-
-		super( AE_mila_glossy_reflection_template, self ).__init__( node )
-
-		self.controls = []
-
-		self.controls += AE_tint_roughness_template( node, "Glossy Reflection", False )
-		self.controls += AE_anisotropy_template( node )
-		max_dist_data = AE_max_dist_template( node )
-		self.controls += max_dist_data[0]
-		self.connectControls += max_dist_data[1]
-		self.controls += AE_contribution_template( node )
-
-
-class AE_mila_specular_reflection_template( AE_mila_base_template ):
-
-	def __init__( self, node ):
-
-		super( AE_mila_specular_reflection_template, self ).__init__( node )
-
-		self.controls = []
-
-		self.controls += AE_tint_roughness_template( node, "Specular Reflection", False )
-		max_dist_data = AE_max_dist_template( node )
-		self.controls += max_dist_data[0]
-		self.connectControls += max_dist_data[1]
-		self.controls += AE_contribution_template( node )
-
-
-class AE_mila_glossy_transmission_template( AE_mila_base_template ):
-
-	def __init__( self, node ):
-
-		super( AE_mila_glossy_transmission_template, self ).__init__( node )
-
-		self.controls = []
-
-		self.controls += AE_tint_roughness_template( node, "Glossy Reflection", False )
-		self.controls += AE_anisotropy_template( node )
-
-		max_dist_data = AE_max_dist_template( node )
-		self.controls += max_dist_data[0]
-		self.connectControls += max_dist_data[1]
-
-		self.controls += AE_contribution_template( node )
-
-
-class AE_mila_specular_transmission_template( AE_mila_base_template ):
-
-	def __init__( self, node ):
-
-		super( AE_mila_specular_transmission_template, self ).__init__( node )
-
-		self.controls = []
-
-		self.controls += AE_tint_roughness_template( node, "Specular Transmission", False )
-		max_dist_data = AE_max_dist_template( node )
-		self.controls += max_dist_data[0]
-		self.connectControls += max_dist_data[1]
-		self.controls += AE_contribution_template( node )
-
-
-class AE_mila_emission_template( AE_mila_base_template ):
-
-	def __init__( self, node ):
-
-		super( AE_mila_emission_template, self ).__init__( node )
-
-		self.controls = []
-
-		self.controls += AE_tint_roughness_template( node, "Emission", False )
-
-
-class AE_mila_transparency_template( AE_mila_base_template ):
-
-	def __init__( self, node ):
-
-		super( AE_mila_transparency_template, self ).__init__( node )
-
-		self.controls = []
-
-		self.addControl( "transparency", cmds.attrColorSliderGrp( attribute=self.attr( "transparency" ), label="Transparency", columnWidth=columnWidthData ), cmds.attrColorSliderGrp )
-
-
-class AE_mila_scatter_template( AE_mila_base_template ):
-
-	def __init__( self, node ):
-
-		super( AE_mila_scatter_template, self ).__init__( node )
-
-		if cmds.frameLayout( label="Front Scatter", collapsable=True ):
-			if cmds.columnLayout( adj=True ):
-				self.addControl( "front_tint", cmds.attrColorSliderGrp( attribute=self.attr( "front_tint" ), label="Tint", columnWidth=columnWidthData ), cmds.attrColorSliderGrp )
-				self.addControl( "front_weight", cmds.attrFieldSliderGrp( attribute=self.attr( "front_weight" ), label="Weight", columnWidth=columnWidthData ), cmds.attrFieldSliderGrp )
-				self.addControl( "front_radius", cmds.attrFieldGrp( attribute=self.attr( "front_radius" ), label="Radius", columnWidth=columnWidthData3 ), cmds.attrFieldGrp )
-				self.addControl( "front_radius_mod", cmds.attrColorSliderGrp( attribute=self.attr( "front_radius_mod" ), label="Radius Mod", columnWidth=columnWidthData ), cmds.attrColorSliderGrp )
-			cmds.setParent( ".." )
-		cmds.setParent( ".." )
-
-		if cmds.frameLayout( label="Back Scatter", collapsable=True ):
-			if cmds.columnLayout( adj=True ):
-				self.addControl( "back_tint", cmds.attrColorSliderGrp( attribute=self.attr( "back_tint" ), label="Tint", columnWidth=columnWidthData ), cmds.attrColorSliderGrp )
-				self.addControl( "back_weight", cmds.attrFieldSliderGrp( attribute=self.attr( "back_weight" ), label="Weight", columnWidth=columnWidthData ), cmds.attrFieldSliderGrp )
-				self.addControl( "back_radius", cmds.attrFieldGrp( attribute=self.attr( "back_radius" ), label="Radius", columnWidth=columnWidthData3 ), cmds.attrFieldGrp )
-				self.addControl( "back_radius_mod", cmds.attrColorSliderGrp( attribute=self.attr( "back_radius_mod" ), label="Radius Mod", columnWidth=columnWidthData ), cmds.attrColorSliderGrp )
-				self.addControl( "back_depth", cmds.attrFieldSliderGrp( attribute=self.attr( "back_depth" ), label="Depth", columnWidth=columnWidthData ), cmds.attrFieldSliderGrp )
-			cmds.setParent( ".." )
-		cmds.setParent( ".." )
-
-
-		if cmds.frameLayout( label="Storage And Optimization", collapsable=True ):
-			if cmds.columnLayout( adj=True ):
-
-				self.addControl( "scale_conversion", cmds.attrFieldSliderGrp( attribute=self.attr( "scale_conversion" ), label="Scale", columnWidth=columnWidthData ), cmds.attrFieldSliderGrp )
-				self.addControl( "sampling_radius_mult", cmds.attrFieldSliderGrp( attribute=self.attr( "sampling_radius_mult" ), label="Sampling Factor", columnWidth=columnWidthData ), cmds.attrFieldSliderGrp )
-
-				self.addControl( "resolution", cmds.attrEnumOptionMenuGrp( attribute=self.attr( "resolution" ), label='Resolution', columnWidth=columnWidthData3,
-						   ei=[( 0, "2 x Image" ),
-								 ( 1, "1 x Image" ),
-								 ( 2, "1/2 x Image" ),
-								 ( 3, "1/3 x Image" ),
-								 ( 4, "1/4 x Image" ),
-								 ( 5, "1/5 x Image" )] ),
-							cmds.attrEnumOptionMenuGrp
-								)
-
-				self.addControl( "light_storage_gamma", cmds.attrFieldSliderGrp( attribute=self.attr( "light_storage_gamma" ), label="Gamma", columnWidth=columnWidthData ), cmds.attrFieldSliderGrp )
-			cmds.setParent( ".." )
-		cmds.setParent( ".." )
-
-		self.controls += AE_contribution_template( node )
-
-
-def AE_anisotropy_template( node, label="Anisotropy", collapse=True ):
-
-	controls = []
-
-	def attr( attr ):
-		return "%s.%s" % ( node, attr )
-
-	if cmds.frameLayout( label=label, collapse=collapse, collapsable=True ):
-		if cmds.columnLayout( adj=True ):
-
-			controls.append( ( "anisotropy", cmds.attrFieldSliderGrp( attribute=attr( "anisotropy" ), label="Anisotropy" , columnWidth=columnWidthData ), cmds.attrFieldSliderGrp ) )
-			controls.append( ( "aniso_angle", cmds.attrFieldSliderGrp( attribute=attr( "aniso_angle" ), label="Angle", columnWidth=columnWidthData ), cmds.attrFieldSliderGrp ) )
-			controls.append( ( "aniso_channel", cmds.attrFieldSliderGrp( attribute=attr( "aniso_channel" ), label="Channel", columnWidth=columnWidthData ), cmds.attrFieldSliderGrp ) )
-
-		cmds.setParent( ".." )
-	cmds.setParent( ".." )
-
-	return controls
+class Control( object ):
+	kSlider = "slider"
+	kColor = "color"
+	kField = "field"
+	kEnum = "enum"
+	kCheck = "check"
+
+AE_CONTROL_COMMANDS = {
+						Control.kSlider: cmds.attrFieldSliderGrp,
+						Control.kColor: cmds.attrColorSliderGrp,
+						Control.kField: cmds.attrFieldGrp,
+						Control.kEnum: cmds.attrEnumOptionMenuGrp,
+						Control.kCheck: cmds.checkBoxGrp
+						}
+
+AE_CONTROL_COLUMNS = {
+						Control.kSlider: columnWidthData,
+						Control.kColor: columnWidthData,
+						Control.kField: columnWidthData3,
+						Control.kEnum: columnWidthData3,
+						Control.kCheck: columnWidthData
+						}
+
+
+class AE_control( object ):
+	""" A single attribute control.
+	enable is a list of check attributes, the control is only enabled when all of them are on. """
+
+	def __init__( self, attr, label, kind=Control.kSlider, enable=(), **flags ):
+
+		self.attr = attr
+		self.label = label
+		self.kind = kind
+		self.enable = tuple( enable )
+		self.flags = flags
+
+	def key( self ):
+		return ( self.attr, self.label, self.kind, self.enable, repr( sorted( self.flags.items() ) ) )
+
+
+class AE_section( object ):
+	""" A frameLayout holding controls, a section without label is built directly in the template layout """
+
+	def __init__( self, label, controls, collapse=True ):
+
+		self.label = label
+		self.controls = tuple( controls )
+		self.collapse = collapse
+
+	def key( self ):
+		# The label is not part of the key, it is updated when the template switches node
+		return ( self.label is None, self.collapse, tuple( control.key() for control in self.controls ) )
+
+
+class AE_spec( object ):
+
+	def __init__( self, sections ):
+
+		self.sections = tuple( sections )
+		self.key = tuple( section.key() for section in self.sections )
+
+	def controls( self ):
+		for section in self.sections:
+			for control in section.controls:
+				yield control
+
+
+AE_TINT_ROUGHNESS = (
+						AE_control( "tint", "Tint", Control.kColor ),
+						AE_control( "roughness", "Roughness" ),
+						AE_control( "ior", "IOR" ),
+						AE_control( "intensity", "Intensity" )
+						)
+
+AE_ANISOTROPY = (
+						AE_control( "anisotropy", "Anisotropy" ),
+						AE_control( "aniso_angle", "Angle" ),
+						AE_control( "aniso_channel", "Channel" )
+						)
+
+AE_MAX_DIST = (
+						AE_control( "use_max_dist", "Use Max Distance", Control.kCheck ),
+						AE_control( "max_dist", "Max Dist", enable=["use_max_dist"] ),
+						AE_control( "use_max_dist_color", "Use Color", Control.kCheck, enable=["use_max_dist"] ),
+						AE_control( "max_dist_color", "Color", Control.kColor, enable=["use_max_dist", "use_max_dist_color"] )
+						)
+
+AE_CONTRIBUTION = (
+						AE_control( "direct", "Direct" ),
+						AE_control( "indirect", "Indirect" )
+						)
+
+AE_MILA_SPECS = {
+				"mila_diffuse_reflection": (
+											AE_section( "Diffuse Reflection", AE_TINT_ROUGHNESS, False ),
+											AE_section( "Contribution", AE_CONTRIBUTION )
+											),
+				"mila_diffuse_transmission": (
+											AE_section( "Diffuse Transmission", AE_TINT_ROUGHNESS, False ),
+											AE_section( "Contribution", AE_CONTRIBUTION )
+											),
+				"mila_glossy_reflection": (
+											AE_section( "Glossy Reflection", AE_TINT_ROUGHNESS, False ),
+											AE_section( "Anisotropy", AE_ANISOTROPY ),
+											AE_section( "Max Distance", AE_MAX_DIST ),
+											AE_section( "Contribution", AE_CONTRIBUTION )
+											),
+				"mila_glossy_transmission": (
+											AE_section( "Glossy Transmission", AE_TINT_ROUGHNESS, False ),
+											AE_section( "Anisotropy", AE_ANISOTROPY ),
+											AE_section( "Max Distance", AE_MAX_DIST ),
+											AE_section( "Contribution", AE_CONTRIBUTION )
+											),
+				"mila_specular_reflection": (
+											AE_section( "Specular Reflection", AE_TINT_ROUGHNESS, False ),
+											AE_section( "Max Distance", AE_MAX_DIST ),
+											AE_section( "Contribution", AE_CONTRIBUTION )
+											),
+				"mila_specular_transmission": (
+											AE_section( "Specular Transmission", AE_TINT_ROUGHNESS, False ),
+											AE_section( "Max Distance", AE_MAX_DIST ),
+											AE_section( "Contribution", AE_CONTRIBUTION )
+											),
+				"mila_emission": (
+											AE_section( "Emission", AE_TINT_ROUGHNESS, False ),
+											),
+				"mila_transparency": (
+											AE_section( None, [AE_control( "transparency", "Transparency", Control.kColor )] ),
+											),
+				"mila_scatter": (
+											AE_section( "Front Scatter", [
+																		AE_control( "front_tint", "Tint", Control.kColor ),
+																		AE_control( "front_weight", "Weight" ),
+																		AE_control( "front_radius", "Radius", Control.kField ),
+																		AE_control( "front_radius_mod", "Radius Mod", Control.kColor )
+																		], False ),
+											AE_section( "Back Scatter", [
+																		AE_control( "back_tint", "Tint", Control.kColor ),
+																		AE_control( "back_weight", "Weight" ),
+																		AE_control( "back_radius", "Radius", Control.kField ),
+																		AE_control( "back_radius_mod", "Radius Mod", Control.kColor ),
+																		AE_control( "back_depth", "Depth" )
+																		], False ),
+											AE_section( "Storage And Optimization", [
+																		AE_control( "scale_conversion", "Scale" ),
+																		AE_control( "sampling_radius_mult", "Sampling Factor" ),
+																		AE_control( "resolution", "Resolution", Control.kEnum,
+																					ei=[( 0, "2 x Image" ),
+																						( 1, "1 x Image" ),
+																						( 2, "1/2 x Image" ),
+																						( 3, "1/3 x Image" ),
+																						( 4, "1/4 x Image" ),
+																						( 5, "1/5 x Image" )] ),
+																		AE_control( "light_storage_gamma", "Gamma" )
+																		], False ),
+											AE_section( "Contribution", AE_CONTRIBUTION )
+											)
+				}
+
+# Templates that can't be described by a spec
+AE_MILA_TEMPLATES = {
+					"mila_layer": AE_mila_layer_template,
+					"mila_mix": AE_mila_mix_template
+					}
+
+# nodeType -> compiled AE_spec, and spec key -> AE_spec so equivalent node types share the same object
+_AE_SPEC_CACHE = {}
+_AE_SPEC_KEYS = {}
+# nodeType -> labels of the framed sections kept in its compiled spec
+_AE_SPEC_LABELS = {}
+
+def AE_mila_spec( nodeType ):
+	""" Return the compiled spec of nodeType (only controls whose attribute exists on the type are kept), or None.
+	The result is cached for the whole session and shared by all AE_mila_base_ui. """
 
+	try:
+		return _AE_SPEC_CACHE[nodeType]
+	except KeyError:
+		pass
 
-def AE_tint_roughness_template( node, label="Base", collapse=True ):
+	spec = None
 
-	controls = []
+	if nodeType in AE_MILA_SPECS:
+		sections = []
+		for section in AE_MILA_SPECS[nodeType]:
+			controls = [control for control in section.controls if cmds.attributeQuery( control.attr, type=nodeType, exists=True )]
+			if controls:
+				sections.append( AE_section( section.label, controls, section.collapse ) )
 
-	def attr( attr ):
-		return "%s.%s" % ( node, attr )
+		spec = AE_spec( sections )
+		spec = _AE_SPEC_KEYS.setdefault( spec.key, spec )
 
-	if cmds.frameLayout( label=label, collapse=collapse, collapsable=True ):
-		if cmds.columnLayout( adj=True ):
+		_AE_SPEC_LABELS[nodeType] = [section.label for section in sections if section.label is not None]
 
-			controls.append( ( "tint", cmds.attrColorSliderGrp( attribute=attr( "tint" ), label="Tint" , columnWidth=columnWidthData ), cmds.attrColorSliderGrp ) )
+	_AE_SPEC_CACHE[nodeType] = spec
 
-			try:
-				controls.append( ( "roughness", cmds.attrFieldSliderGrp( attribute=attr( "roughness" ), label="Roughness", columnWidth=columnWidthData ), cmds.attrFieldSliderGrp ) )
-			except RuntimeError:
-				pass
+	return spec
 
-			try:
-				controls.append( ( "ior", cmds.attrFieldSliderGrp( attribute=attr( "ior" ), label="IOR", columnWidth=columnWidthData ), cmds.attrFieldSliderGrp ) )
-			except RuntimeError:
-				pass
-			try:
-				controls.append( ( "intensity", cmds.attrFieldSliderGrp( attribute=attr( "intensity" ), label="Intensity", columnWidth=columnWidthData ), cmds.attrFieldSliderGrp ) )
-			except RuntimeError:
-				pass
 
-		cmds.setParent( ".." )
-	cmds.setParent( ".." )
+class AE_mila_spec_template( AE_mila_base_template ):
 
-	return controls
+	def __init__( self, node, spec ):
 
+		super( AE_mila_spec_template, self ).__init__( node )
 
-def AE_contribution_template( node, label="Contribution" , collapse=True ):
+		self.spec = spec
 
-	controls = []
+		# attr -> ( control, kind ) for every control already built
+		self.uiControls = {}
 
-	def attr( attr ):
-		return "%s.%s" % ( node, attr )
+		for section in spec.sections:
+			if section.label is None:
+				controls, connectControls = self._sectionBuilder( section )( self.node )
+				self.controls += controls
+				self.connectControls += connectControls
+			else:
+				self.addSection( section.label, self._sectionBuilder( section ), section.collapse )
 
-	if cmds.frameLayout( label=label, collapse=collapse, collapsable=True ):
-		if cmds.columnLayout( adj=True ):
+	def _sectionBuilder( self, section ):
 
-			controls.append( ( "direct", cmds.attrFieldSliderGrp( attribute=attr( "direct" ), label="Direct" , columnWidth=columnWidthData ), cmds.attrFieldSliderGrp ) )
-			controls.append( ( "indirect", cmds.attrFieldSliderGrp( attribute=attr( "indirect" ), label="Indirect", columnWidth=columnWidthData ), cmds.attrFieldSliderGrp ) )
+		def builder( node ):
 
-		cmds.setParent( ".." )
-	cmds.setParent( ".." )
+			controls = []
+			connectControls = []
 
-	return controls
+			for control in section.controls:
+				attribute = "%s.%s" % ( node, control.attr )
 
+				if control.kind == Control.kCheck:
+					ui = cmds.checkBoxGrp( label="", label1=control.label, columnWidth=AE_CONTROL_COLUMNS[control.kind], cc=self.updateDependencies )
+					cmds.connectControl( ui, attribute, index=2 )
+					connectControls.append( ( control.attr, ui, 2 ) )
+				else:
+					cmd = AE_CONTROL_COMMANDS[control.kind]
+					ui = cmd( attribute=attribute, label=control.label, columnWidth=AE_CONTROL_COLUMNS[control.kind], **control.flags )
+					controls.append( ( control.attr, ui, cmd ) )
 
-def AE_max_dist_template( node, label="Max Distance", collapse=True ):
-	class AE_max_dist_template_obj( object ):
+				self.uiControls[control.attr] = ( ui, control.kind )
 
-		def __init__( self, node, label="Max Distance", collapse=True ):
+			self.updateDependencies()
 
-			self.controls = []
-			self.connectControls = []
+			return controls, connectControls
 
-			def attr( attr ):
-				return "%s.%s" % ( node, attr )
+		return builder
 
-			self.node = node
+	def update( self, node ):
+		super( AE_mila_spec_template, self ).update( node )
 
-			if cmds.frameLayout( label=label, collapse=collapse, collapsable=True ):
-				if cmds.columnLayout( adj=True ):
+		# Node types sharing this template may have different section labels
+		nodeType = cmds.nodeType( self.node )
+		AE_mila_spec( nodeType )
+		for section, label in zip( self.sections, _AE_SPEC_LABELS.get( nodeType, [] ) ):
+			cmds.frameLayout( section["frame"], edit=True, label=label )
 
-					self.use_max_dist = cmds.checkBoxGrp( label="", label1="Use Max Distance", columnWidth=columnWidthData , cc=self.value_changed )
-					self.connectControls.append( ( "use_max_dist", self.use_max_dist, 2 ) )
-					cmds.connectControl( self.use_max_dist, attr( "use_max_dist" ), index=2 )
+		self.updateDependencies()
 
-					self.max_dist = cmds.attrFieldSliderGrp( attribute=attr( "max_dist" ), label="Max Dist", columnWidth=columnWidthData )
-					self.controls.append( ( "max_dist", self.max_dist, cmds.attrFieldSliderGrp ) )
+	def _checked( self, attr ):
 
-					self.use_color = cmds.checkBoxGrp( label="", label1="Use Color", columnWidth=columnWidthData , cc=self.value_changed )
-					self.connectControls.append( ( "use_max_dist_color", self.use_color, 2 ) )
-					cmds.connectControl( self.use_color, attr( "use_max_dist_color" ), index=2 )
+		if attr in self.uiControls and self.uiControls[attr][1] == Control.kCheck:
+			return cmds.checkBoxGrp( self.uiControls[attr][0], query=True, value1=True )
 
-					self.color = cmds.attrColorSliderGrp( attribute=attr( "max_dist_color" ), label="Color", columnWidth=columnWidthData )
-					self.controls.append( ( "max_dist_color", self.color, cmds.attrColorSliderGrp ) )
+		try:
+			return cmds.getAttr( self.attr( attr ) )
+		except ValueError:
+			return False
 
-				cmds.setParent( ".." )
-			cmds.setParent( ".." )
+	def updateDependencies( self, *args ):
 
-			self.value_changed()
+		for control in self.spec.controls():
+			if not control.enable or control.attr not in self.uiControls:
+				continue
 
+			value = all( self._checked( attr ) for attr in control.enable )
+			cmds.control( self.uiControls[control.attr][0], edit=True, enable=value )
 
-		def attr( self, attr ):
-			return "%s.%s" % ( self.node, attr )
 
-		def value_changed( self, *args ):
+def AE_mila_template_key( node ):
+	""" Key used by AE_mila_base_ui to store built templates, node types with the same spec share one template """
 
-			value = cmds.checkBoxGrp( self.use_max_dist, q=True, value1=True )
+	nodeType = cmds.nodeType( node )
 
-			for control in [self.max_dist, self.use_color, self.color]:
-				cmds.control( control, edit=True, enable=value )
+	spec = None
+	if nodeType not in AE_MILA_TEMPLATES:
+		spec = AE_mila_spec( nodeType )
 
-			color_value = cmds.checkBoxGrp( self.use_color, q=True, value1=True )
+	if spec is not None:
+		return spec.key
 
-			cmds.control( self.color, edit=True, enable=color_value )
+	return nodeType
 
-	obj = AE_max_dist_template_obj( node, label, collapse )
 
-	return obj.controls, obj.connectControls
+def AE_mila_component_template( node ):
 
+	nodeType = cmds.nodeType( node )
 
-def AE_mila_component_template( node ):
+	if nodeType in AE_MILA_TEMPLATES:
+		return AE_MILA_TEMPLATES[nodeType]( node )
 
-	function = "AE_%s_template" % cmds.nodeType( node )
-	try:
-		return globals()[function]( node )
-	except KeyError:
-		return ""
+	spec = AE_mila_spec( nodeType )
+	if spec is not None:
+		return AE_mila_spec_template( node, spec )
 
+	return ""
@@ -2,6 +2,9 @@
 
 # Python
 import os
+import time
+import functools
+import collections
 from shiboken import wrapInstance, isValid
 import copy
 
@@ -16,6 +19,9 @@ import maya.OpenMaya as OpenMaya
 # Mila modules
 from mila_layout_template import AE_mila_base_ui
 from mila_node import *
+from mila_node import mila_refresh_swatch, MILA_NODES
+from mila_profile import mila_profiled
+from mila_serialize import MILA_MIME_TYPE, MilaFormatError, mila_pack_networks, mila_unpack_networks, mila_rebuild
 
 # Load mila plugin for drag and drop behavior
 cmds.loadPlugin( "mila", quiet=True )
@@ -66,20 +72,80 @@ class UndoChunk( object ):
     def __exit__( self, *args ):
         cmds.undoInfo( closeChunk=True )
 
+def _ipr_pause( value ):
+    # Only the mental ray IPR can be paused, and only while it is running
+    try:
+        cmds.Mayatomr( pauseTuning=value )
+    except ( AttributeError, RuntimeError, TypeError ):
+        pass
+
+def _remove_callbacks( callbacks, *args ):
+    for callback in callbacks:
+        try:
+            OpenMaya.MMessage.removeCallback( callback )
+        except RuntimeError:
+            pass
+    del callbacks[:]
+
+def _feeds_node( obj, target ):
+    # True if target is found walking down the message outputs of the mila node obj (obj is part of the network of target)
+
+    visited = set()
+    stack = [obj]
+    plugs = OpenMaya.MPlugArray()
+
+    while stack:
+        obj = stack.pop()
+        if obj == target:
+            return True
+
+        fn = OpenMaya.MFnDependencyNode( obj )
+        if fn.name() in visited:
+            continue
+        visited.add( fn.name() )
+
+        fn.findPlug( "message" ).connectedTo( plugs, False, True )
+        for i in range( plugs.length() ):
+            node = plugs[i].node()
+            if OpenMaya.MFnDependencyNode( node ).typeName() in MILA_NODES:
+                stack.append( node )
+
+    return False
+
 class IprWait( object ):
+    """ Edit transaction of the ui: one undo chunk, the IPR is paused and the swatch refreshes are suspended (see MilaEdit).
+    On exit, every touched mila_material (node included) is refreshed once. Can be nested, only the outermost one pauses the IPR """
+
+    depth = 0
 
-    def __init__( self, node ):
+    def __init__( self, node, name="" ):
 
         self.node = node
+        self.name = name
+        self.edit = MilaEdit( node )
 
     def __enter__( self ):
-#         cmds.Mayatomr(pauseTuning=True)
-        pass
+
+        if not IprWait.depth:
+            _ipr_pause( True )
+        IprWait.depth += 1
+
+        cmds.undoInfo( openChunk=True, chunkName=self.name )
+        self.edit.__enter__()
+
+        return self
 
     def __exit__( self, *args ):
-#         cmds.Mayatomr(pauseTuning=False)
-        pass
-        # Now do a fake edit to force the ipr to refresh
+
+        IprWait.depth -= 1
+        if not IprWait.depth:
+            _ipr_pause( False )
+
+        # Now dirty the touched materials so the ipr and the swatches refresh once
+        try:
+            self.edit.__exit__( *args )
+        finally:
+            cmds.undoInfo( closeChunk=True )
 
 
 def ICON( imageFile ):
@@ -145,6 +211,14 @@ class MilaTreeLayout( QtGui.QWidget ):
 
         self.reloadButton = QtGui.QPushButton( "Reload", self )
 
+        # Find component
+        self.findField = QtGui.QLineEdit( self )
+        self.findField.setPlaceholderText( "Find component" )
+
+        self.headerLayout = QtGui.QHBoxLayout()
+        self.headerLayout.setContentsMargins( 0, 0, 0, 0 )
+        self.headerLayout.setSpacing( 0 )
+
         self.treeCreationLayout = QtGui.QVBoxLayout()
 
         # Tree/Create Layout
@@ -183,8 +257,11 @@ class MilaTreeLayout( QtGui.QWidget ):
         self.parentLayout = parent
 
         self.reloadButton.clicked.connect( self.treeUI.reload )
+        self.findField.returnPressed.connect( self.findComponent )
 
-        self.layout.addWidget( self.reloadButton )
+        self.headerLayout.addWidget( self.findField )
+        self.headerLayout.addWidget( self.reloadButton )
+        self.layout.addLayout( self.headerLayout )
 
         self.layout.addLayout( self.treeCreationLayout )
 
@@ -258,6 +335,10 @@ class MilaTreeLayout( QtGui.QWidget ):
 
 
 
+    @QtCore.Slot()
+    def findComponent( self ):
+        self.treeUI.findItems( self.findField.text() )
+
     @QtCore.Slot()
     def clearComponent( self ):
 
@@ -320,6 +401,9 @@ class TreeWidget( QtGui.QScrollArea ):
     updateComponentUI = QtCore.Signal( MilaNode )
     clearComponentUI = QtCore.Signal()
 
+    # Seconds spent building rows before the event loop gets the hand back, see reload
+    BUILD_SLICE = 0.02
+
     def __repr__( self ):
 
         return 'TreeWidget("%s")' % self._node.name()
@@ -336,7 +420,24 @@ class TreeWidget( QtGui.QScrollArea ):
         self._node = None
         self._last_selected = None
         self.save_select = {}
-        self._iconStateQuery = False
+        self._iconStateQuery = None
+        # Items whose enable state was painted since the mouse press, they are set on release
+        self._paintedItems = []
+
+        # Items waiting for their children during a progressive build, see reload
+        self._buildQueue = collections.deque()
+        self._buildTimer = QtCore.QTimer( self )
+        self._buildTimer.setSingleShot( True )
+        self._buildTimer.timeout.connect( self._buildStep )
+
+        # Names of the mila nodes whose input connections changed, the rows are patched at the next idle tick
+        self._dirtyNodes = set()
+        self._patchTimer = QtCore.QTimer( self )
+        self._patchTimer.setSingleShot( True )
+        self._patchTimer.timeout.connect( self._patchTree )
+
+        self._dgCallbacks = []
+        self.destroyed.connect( functools.partial( _remove_callbacks, self._dgCallbacks ) )
         
         self._menuItemList = ( "Select", "Copy", "Delete" )
 
@@ -406,33 +507,169 @@ class TreeWidget( QtGui.QScrollArea ):
         self.setFixedHeight( newHeight )
 
     @QtCore.Slot()
+    @mila_profiled( "reload" )
     def reload( self ):
-        """ Clear and re feed the ui """
+        """ Clear and re feed the ui.
+        The rows are built level by level in time slices (see BUILD_SLICE), the ui stays usable while a big tree fills in.
+        A new reload (eg, another material is set) cancels the build in progress """
 
 #        self.saveSelection()
 
-        with DisabledUndo():
+        self.cancelBuild()
 
+        with DisabledUndo():
             self.clear()
-            self.feedUIRecurse()
 
-            # Restore soloState
-            solo_item = self.mila().soloItem()
-            if solo_item:
-                for item in self.children():
-                    if item._node == solo_item:
-                        item.setSolo()
+        self._buildQueue.append( self )
+        self._buildStep()
+
+    def building( self ):
+        return bool( self._buildQueue )
 
-            self.restoreSelection()
+    def cancelBuild( self ):
+        self._buildTimer.stop()
+        self._buildQueue.clear()
+
+    def finishBuild( self ):
+        """ Build the rows left by reload right away, for callers reading the whole tree (or without event loop) """
+
+        while self.building():
+            self._buildStep()
+        self._buildTimer.stop()
+
+    @QtCore.Slot()
+    @mila_profiled( "reload" )
+    def _buildStep( self ):
+
+        start = time.time()
+
+        with DisabledUndo():
+
+            while self._buildQueue:
+                uiItem = self._buildQueue.popleft()
+                # The item may have been deleted since it was queued
+                if not uiItem:
+                    continue
+
+                self._buildQueue.extend( self._feedItem( uiItem ) )
+
+                if self._buildQueue and time.time() - start > self.BUILD_SLICE:
+                    # Let the event loop run, the build goes on at the next tick
+                    self._buildTimer.start( 0 )
+                    return
+
+            self._buildFinished()
+
+    def _buildFinished( self ):
+
+        # Restore soloState, the solo item is cached by mila_node until the solo connections change
+        solo_item = mila_solo_item( self.mila() )
+        if solo_item:
+            for item in self.children():
+                if item._node == solo_item:
+                    item.setSolo()
+
+        self.restoreSelection()
 
     def setMila( self, mila ):
         """ Set the ui to work on the specified node, it will also init the mila_material if nescessary.
         This function also peform a reload of the ui. """
         self._mila_node = mila_node( mila )
-        self._node = mila_node( mila_init( mila ) )
+        mila_init( mila )
+        # The network, even if the material is in solo
+        self._node = mila_root_layer( mila )
+
+        if not self._dgCallbacks:
+            self._dgCallbacks.append( OpenMaya.MDGMessage.addConnectionCallback( self._connectionChanged ) )
+            self._dgCallbacks.append( OpenMaya.MDGMessage.addNodeRemovedCallback( self._nodeRemoved ) )
 
         self.reload()
 
+    ## Incremental updates ---
+    # Changes made outside of the tree (scripts, undo/redo, hypershade) are picked up from the DG messages.
+    # The callbacks only record the node names, the rows are patched once per idle tick
+
+    def _connectionChanged( self, srcPlug, dstPlug, made, *args ):
+
+        fn = OpenMaya.MFnDependencyNode( dstPlug.node() )
+        if fn.typeName() not in MILA_NODES or not self.mila():
+            return
+
+        # Only the network of the material of the tree (solo layer included) is patched
+        if _feeds_node( dstPlug.node(), self.mila().obj ):
+            self._dirtyNodes.add( fn.name() )
+            self._patchTimer.start( 0 )
+
+    def _nodeRemoved( self, node, *args ):
+
+        # The connections of a removed node are broken first, only the material itself needs care
+        if self.mila() and OpenMaya.MFnDependencyNode( node ).name() == self.mila().name():
+            self.cancelBuild()
+            self._dirtyNodes.clear()
+            self._mila_node = None
+            self.clear()
+
+    @QtCore.Slot()
+    @mila_profiled( "patch" )
+    def _patchTree( self ):
+        """ Update the rows of the groups whose connections changed, the rest of the tree is kept as is """
+
+        names, self._dirtyNodes = self._dirtyNodes, set()
+
+        if not self.mila() or not names:
+            return
+
+        if self.building():
+            # The rows already built may be stale, start again
+            self.reload()
+            return
+
+        mila = self.mila()
+        solo_layer = mila_solo_layer( mila )
+
+        if mila.name() in names or ( solo_layer and solo_layer.name() in names ):
+            root = mila_root_layer( mila )
+            if root != self._node:
+                # Another network was connected to the material
+                self._node = root
+                self.reload()
+                return
+            self.updateSoloState()
+
+        selected = set( item._node.name() for item in self.selected( sort=False ) )
+        # Rows released by the rebuild of one of their parents
+        released = set()
+        patched = False
+
+        with DisabledUndo():
+            for row in [self] + self.children():
+                if row in released or row._node.name() not in names:
+                    continue
+
+                rows = mila_children_data( row._node )
+                items = [row.child_layout.itemAt( i ).widget() for i in range( row.child_layout.count() )]
+
+                if [item._node.name() for item in items] == [child.name() for index, child, on, tint in rows]:
+                    # Same children, only the states may have changed
+                    for item, ( index, child, on, tint ) in zip( items, rows ):
+                        item.setState( on )
+                    continue
+
+                released.update( row.findChildren( TreeItemWidget ) )
+                self.feedUIRecurse( row )
+                patched = True
+
+        if patched:
+            self.updateSoloState()
+            self.select( [item for item in self.children() if item._node.name() in selected], Selection.kReplace )
+
+    def updateSoloState( self ):
+        """ Show the solo item of the material (see mila_solo_item) """
+
+        solo_item = mila_solo_item( self.mila() )
+        for item in self.children():
+            item.setSoloState( solo_item is not None and item._node == solo_item )
+
     def mila( self ):
         return self._mila_node
 
@@ -472,9 +709,12 @@ class TreeWidget( QtGui.QScrollArea ):
         self.addItems( type, destination )
 
 
-    def addItems( self, items, destination=None, position=Position.kDefault, uiOnly=False, behaviour=MoveBehaviour.kLink ):
+    @mila_profiled( "move" )
+    def addItems( self, items, destination=None, position=Position.kDefault, uiOnly=False, behaviour=MoveBehaviour.kLink, rows=None ):
         """ add a new Node to the tree, a MilaNode, the name of a mila_component or mila_layer or a mila type.
-        The correct data will be build """
+        The correct data will be build.
+        With uiOnly, rows can give the ( on, tint ) already read for each item (see mila_children_data).
+        All items are handled as one operation: one copy pass, one mila_move and one undo chunk """
 
         if destination is None:
             destination = self
@@ -489,61 +729,99 @@ class TreeWidget( QtGui.QScrollArea ):
         if not isinstance( items, ( list, tuple ) ):
             items = [items]
 
-        items = [ mila_node( item, create=True ) for item in items]
-
-        remove = False
-
-        # First try to delete all existing TreeItemWidget with the same nodes
-        # Only if we are moving the nodes
-        if not uiOnly and behaviour == MoveBehaviour.kMove:
-            remove = True
-            for treeItem in self.children():
-                if treeItem._node in items:
-                    treeItem.setParent( None )
-                    treeItem.deleteLater()
-
-        if behaviour == MoveBehaviour.kCopy:
-            copy_items = []
-            for item in items:
-                copy_items.append( mila_copy( item ) )
-            items = copy_items
-
-        elif behaviour == MoveBehaviour.kLink:
-            remove = False
-
-
-        new_items = [TreeItemWidget( item, self ) for item in items]
-
         if uiOnly:
             # When we build the ui on existing graph, we only want to add the TreeWidgetItems without actualy adding any node
-            for item in new_items:
+            rows = rows or [( None, None )] * len( items )
+            new_items = [TreeItemWidgetPool.acquire( mila_node( item ), self, tint ) for item, ( on, tint ) in zip( items, rows )]
+
+            for item, ( on, tint ) in zip( new_items, rows ):
                 item.setParent( destination )
                 destination.child_layout.addWidget( item )
 
-                item.setState()
+                item.setState( on )
 
                 try:
                     destination.expand()
                 except AttributeError:
                     pass
 
-        else:
+            return new_items
+
+        with IprWait( self.mila(), "addItems( [%s], behaviour=%s )" % ( ", ".join( str( item ) for item in items ), STR_BEHAV( behaviour ) ) ):
+
+            items = [ mila_node( item, create=True ) for item in items]
+
+            remove = False
+
+            # First try to delete all existing TreeItemWidget with the same nodes
+            # Only if we are moving the nodes
+            if behaviour == MoveBehaviour.kMove:
+                remove = True
+                for treeItem in self.children():
+                    if treeItem._node in items:
+                        treeItem.setParent( None )
+                        treeItem.deleteLater()
+
+            elif behaviour == MoveBehaviour.kCopy:
+                items = [mila_copy( item ) for item in items]
+
+            new_items = [TreeItemWidget( item, self ) for item in items]
+
             # Add all items to the tree
-            
             parent, index = self.getIndex( destination, position )
 
             # Move the ui
             self.moveItem( new_items, parent, index=index, remove=remove )
 
             # Move the nodes
-            with UndoChunk( "mila_move( %s, %s, index=%s, remove=%s )" % ( repr(item), parent.node(), index, remove ) ):
-                mila_move( items, parent.node(), index=index, remove=remove )
+            mila_move( items, parent.node(), index=index, remove=remove )
 
+        # We need to refresh the state of the control since it may have changed after the move
+        for item in new_items:
+            item.setState()
 
-            # We need to refresh the state of the control since it may have changed after the move
-            for item in new_items:
-                item.setState()
-                self.feedUIRecurse( item )
+        return new_items
+
+    @mila_profiled( "duplicate" )
+    def duplicateItems( self, items ):
+        """ Duplicate the items above themselves.
+        Items sharing a parent are inserted with a single mila_insert, and everything is one undo step """
+
+        # parent -> [( ui index, item )], in the order the parents are found
+        plan = {}
+        parents = []
+        for item in items:
+            parent = item.parent()
+            if parent not in plan:
+                plan[parent] = []
+                parents.append( parent )
+            plan[parent].append( ( parent.child_layout.indexOf( item ), item ) )
+
+        new_items = []
+
+        with IprWait( self.mila(), "duplicateItems( [%s] )" % ", ".join( item._node.name() for item in items ) ):
+
+            for parent in parents:
+
+                insertions = []
+                for index, item in sorted( plan[parent], key=lambda x: x[0] ):
+                    node = item.node()
+                    node_parent, node_index = node.parent()
+                    data = node_parent.attrData( node_index ) if node_parent else {}
+                    insertions.append( ( index, mila_copy( node ), data ) )
+
+                mila_insert( parent.node(), insertions )
+
+                # Insert the widgets from the bottom, so the indices of the remaining insertions are still valid
+                for index, copy, data in reversed( insertions ):
+                    widget = TreeItemWidget( copy, self )
+                    widget.setParent( parent )
+                    parent.child_layout.insertWidget( index, widget )
+                    self.feedUIRecurse( widget )
+                    new_items.append( widget )
+
+        for item in new_items:
+            item.setState()
 
         return new_items
 
@@ -563,6 +841,7 @@ class TreeWidget( QtGui.QScrollArea ):
             elif state:
                 item.setSolo( True )
 
+    @mila_profiled( "delete" )
     def removeItem( self, _input, delete_node=True ):
 
         # Test that the _input might not exists
@@ -579,12 +858,36 @@ class TreeWidget( QtGui.QScrollArea ):
         _input.deleteLater()
 
         if delete_node:
-            with UndoChunk( "mila_delete(%s)" % node.name() ):
+            with IprWait( self.mila(), "mila_delete(%s)" % node.name() ):
                 mila_delete( node )
 
         self.updateParentComponent()
 
 
+    def findItems( self, text ):
+        """ Select the items whose nice name or name contains text (see mila_find_nice_name).
+        Their parents are expanded and the view scrolls to the first one """
+
+        names = set( mila_find_nice_name( text ) )
+        # The matches may not have their rows yet
+        self.finishBuild()
+        items = [item for item in self.children() if item._node.name() in names]
+
+        if not items:
+            return items
+
+        for item in items:
+            parent = item.parent()
+            while not parent.isRoot():
+                parent.expand()
+                parent = parent.parent()
+
+        self.select( items, Selection.kReplace )
+        self.ensureWidgetVisible( items[0] )
+        self.updateParentComponent()
+
+        return items
+
     def updateParentComponent( self ):
 
         if self._last_selected:
@@ -603,13 +906,21 @@ class TreeWidget( QtGui.QScrollArea ):
             uiItems = [uiItems]
 
         for uiItem in uiItems:
+            for item in self._feedItem( uiItem ):
+                self.feedUIRecurse( item )
 
-            uiItem.clear()
+    def _feedItem( self, uiItem ):
+        # Rebuild the rows of the children of uiItem (not recursive), returns the new rows
 
-            for child in uiItem._node.children():
-                new_items = self.addItems( child, destination=uiItem, uiOnly=True )
-                for item in new_items:
-                    self.feedUIRecurse( item )
+        uiItem.clear()
+
+        new_items = []
+
+        # The slots of each group are read in one pass, the widgets get their state and color from it
+        for index, child, on, tint in mila_children_data( uiItem._node ):
+            new_items += self.addItems( child, destination=uiItem, uiOnly=True, rows=[( on, tint )] )
+
+        return new_items
 
     def getIndex( self, destination, position ):
 
@@ -665,14 +976,12 @@ class TreeWidget( QtGui.QScrollArea ):
     def clear( self ):
         """ Reset the TreeWidget, it will only perform a UI reset, the maya graph won't be affected """
 
-        # Delete Qt layout"
+        # Give the rows back to the pool, the next tree will reuse them
         child = self.child_layout.takeAt( 0 )
         while child:
             widget = child.widget()
             if widget:
-                widget.setParent( None )
-                widget.deleteLater()
-                del widget
+                TreeItemWidgetPool.release( widget )
 
             child = self.child_layout.takeAt( 0 )
 
@@ -705,6 +1014,7 @@ class TreeWidget( QtGui.QScrollArea ):
         self.select( last_selected_item )
 
 
+    @mila_profiled( "select" )
     def select( self, itemList=None, mode=None, fast=False ):
         """ Select items in the TreeWidget
         This procedure is called by the clickEvent """
@@ -927,14 +1237,15 @@ class TreeWidget( QtGui.QScrollArea ):
             if self.itemButtonGeometry(item).contains( event.pos() ):
                 button = self.itemAt( event.pos(), item_type=IconButton)
                 
-                if button:
+                if button and button is item.enable_widget:
                     if self._iconStateQuery is None:
                         # The state is not set, we are the first one, store the value
                         self._iconStateQuery = button.state()
-                        
-                    # Set the button state and the mila state manually, we can't trigger the signal because the drag will constantly call it
-                    button.setState( self._iconStateQuery )
-                    item.setState( self._iconStateQuery, set=True )
+
+                    # Only the ui is updated while painting, the mila nodes are set all at once on release
+                    if item not in self._paintedItems:
+                        button.setState( self._iconStateQuery )
+                        self._paintedItems.append( item )
                 return
 
             event.ignore()
@@ -979,9 +1290,40 @@ class TreeWidget( QtGui.QScrollArea ):
                     self.removeItem( item, delete_node=False )
                     
     def mouseReleaseEvent(self, event):
-        # reset the iconStateQuery
+        # Set the painted enable states, reset the iconStateQuery
+        if self._paintedItems:
+            self.commitPaintedStates()
         self._iconStateQuery = None
 
+    def startEnablePaint( self, item ):
+        """ The enable icon of item is pressed: toggle it and paint its new state on the icons dragged over.
+        Only the ui is updated until the release, see commitPaintedStates """
+
+        self._iconStateQuery = not item.node().enabled()
+        self._paintedItems = [item]
+        item.enable_widget.setState( self._iconStateQuery )
+
+    @mila_profiled( "enable" )
+    def commitPaintedStates( self ):
+        """ Set the enable state painted on the items in one undo step, the swatch is refreshed once afterwards """
+
+        items, self._paintedItems = self._paintedItems, []
+
+        slots = []
+        for item in items:
+            node = item.node()
+            slots.append( ( node._parent, node._parent_id ) )
+
+        with UndoChunk( "mila_enable_slots( %s, value=%s )" % ( len( slots ), self._iconStateQuery ) ):
+            changed = mila_enable_slots( slots, self._iconStateQuery )
+
+        if changed:
+            QtCore.QTimer.singleShot( 0, self.refreshSwatch )
+
+    def refreshSwatch( self ):
+        if self.mila():
+            mila_refresh_swatch( self.mila() )
+
     def _getDragData( self, event ):
 
         data = event.mimeData()
@@ -1162,6 +1504,31 @@ class TreeWidget( QtGui.QScrollArea ):
 
             return "\n".join( dragData )
 
+    def _buildSelectionMimeData( self, inputItems=[] ):
+        # The text form is kept for the drops in the same scene, the serialized networks let a paste work without the original nodes
+
+        if not inputItems:
+            inputItems = self.flattenedSelection()
+
+        mimeData = QtCore.QMimeData()
+        mimeData.setText( self._buildSelectionData( inputItems ) )
+        mimeData.setData( MILA_MIME_TYPE, QtCore.QByteArray( mila_pack_networks( [item.node() for item in inputItems] ) ) )
+
+        return mimeData
+
+    def _getNetworkData( self, event ):
+        # Return the documents stored in the mime data, or None if there is none (or it can't be read)
+
+        data = event.mimeData()
+
+        if not data.hasFormat( MILA_MIME_TYPE ):
+            return None
+
+        try:
+            return mila_unpack_networks( data.data( MILA_MIME_TYPE ).data() )
+        except ( MilaFormatError, ValueError ):
+            return None
+
     def _buildDragPixmap( self, items ):
 
         items = list( items )
@@ -1272,7 +1639,7 @@ class TreeWidget( QtGui.QScrollArea ):
         # Feed the clipboard with the current selection
         
         clipboard = QtGui.QApplication.clipboard()
-        clipboard.setText( self._buildSelectionData() )
+        clipboard.setMimeData( self._buildSelectionMimeData() )
         
         if erase:
             # We are cuting, delete the selected nodes
@@ -1283,22 +1650,40 @@ class TreeWidget( QtGui.QScrollArea ):
     def pasteClipboard(self):
         
         clipboard = QtGui.QApplication.clipboard()
-        
+
+        paste_destination = self.lastSelected()
+
+        # Rebuild the copied networks from the clipboard when they are available, it works across scenes and sessions
+        docs = self._getNetworkData( clipboard )
+        if docs:
+            with IprWait( self.mila(), "pasteClipboard()" ):
+                clipboard_nodes = []
+                missing = []
+                for doc in docs:
+                    node, doc_missing = mila_rebuild( doc )
+                    if node:
+                        clipboard_nodes.append( node )
+                    missing += doc_missing
+
+                # The nodes are new, they are placed as is
+                self.addItems( clipboard_nodes, paste_destination, behaviour=MoveBehaviour.kLink )
+
+            if missing:
+                cmds.warning( "mila: Some connections could not be restored: %s" % ", ".join( missing ) )
+            return
+
         clipboard_nodes = self._getDragData( clipboard )
         if clipboard_nodes:
-            paste_destination = self.lastSelected()
-            
             self.addItems( clipboard_nodes, paste_destination, behaviour=MoveBehaviour.kCopy )
         
     @QtCore.Slot()
     def duplicate(self):
         
-        selectedNodes = self.flattenedSelection()
+        selectedItems = self.flattenedSelection()
                 
-        if selectedNodes:
-            # For every selected node, duplicate it above itself
-            for node in selectedNodes:
-                self.addItems( node, node, position=Position.kAbove, behaviour=MoveBehaviour.kCopy )
+        if selectedItems:
+            # Every selected node is duplicated above itself
+            self.duplicateItems( selectedItems )
         
         
         
@@ -1318,7 +1703,7 @@ class TreeItemWidget( QtGui.QWidget ):
     __bool__ = __nonzero__
 
 
-    def __init__( self, input_, parent ):
+    def __init__( self, input_, parent, tint=None ):
         super( TreeItemWidget, self ).__init__( parent )
 
         self._node = mila_node( input_, create=True )
@@ -1387,7 +1772,25 @@ class TreeItemWidget( QtGui.QWidget ):
         self.main_layout.addWidget( self.child_widget )
 
 
-        self.updateIconColor()
+        self.updateIconColor( tint )
+
+    def setNode( self, input_, tint=None ):
+        """ Point a recycled item to another node: icon, label, state and callbacks are reset """
+
+        self.deleteAllCallback()
+
+        self._node = mila_node( input_, create=True )
+
+        self.select( False )
+        self.setSoloState( False )
+        self.child_widget.hide()
+
+        self.icon_widget.setImage( ICON( "%s.png" % self._node.nodeType() ) )
+        self.icon_widget.setColor()
+        self.createColorChangeCallBack()
+        self.label_widget.setNode( self._node )
+
+        self.updateIconColor( tint )
 
     def matches( self, other ):
         try:
@@ -1405,12 +1808,17 @@ class TreeItemWidget( QtGui.QWidget ):
         self.deleteAllCallback()
         super( TreeItemWidget, self ).deleteLater( *args, **kargs )
 
-    def updateIconColor( self ):
-        try:
-            color = cmds.getAttr( self._node.attr( "tint" ) )[0]
-        except ValueError:
+    def updateIconColor( self, color=None ):
+        # color is the tint already read (see mila_children_data), MILA_NO_TINT for the nodes without tint
+        if color == MILA_NO_TINT:
             return
 
+        if color is None:
+            try:
+                color = cmds.getAttr( self._node.attr( "tint" ) )[0]
+            except ValueError:
+                return
+
         self.icon_widget.setColor( *color )
 
     def colorChangeCallback( self, msg, thisPlug, otherPlug, *args ):
@@ -1486,13 +1894,12 @@ class TreeItemWidget( QtGui.QWidget ):
 
     def clear( self ):
 
-        # Delete Qt layout"
+        # Give the child rows back to the pool
         child = self.child_layout.takeAt( 0 )
         while child:
             widget = child.widget()
             if widget:
-                widget.deleteLater()
-                del widget
+                TreeItemWidgetPool.release( widget )
             child = self.child_layout.takeAt( 0 )
 
     def setSoloState( self, value=True ):
@@ -1509,6 +1916,7 @@ class TreeItemWidget( QtGui.QWidget ):
             with UndoChunk( "mila_enable_node( %s, value=%s )" % ( self._node.name(), value ) ):
                 mila_enable_node( self.node(), value=value )
 
+    @mila_profiled( "solo" )
     def setSolo( self, value=True, set=False ):
 
         if value:
@@ -1516,13 +1924,13 @@ class TreeItemWidget( QtGui.QWidget ):
 
             if set:
                 self.root().resetSolo( self, True )
-                with UndoChunk( "mila_set_solo(%s,%s)" % ( self._node.name(), self.root().mila().name() ) ):
+                with IprWait( self.root().mila(), "mila_set_solo(%s,%s)" % ( self._node.name(), self.root().mila().name() ) ):
                     mila_set_solo( self._node, self.root().mila() )
         else:
             self.setSoloState( False )
             if set:
                 self.root().resetSolo( self, False )
-                with UndoChunk( "mila_remove_solo(%s)" % self.root().mila().name() ):
+                with IprWait( self.root().mila(), "mila_remove_solo(%s)" % self.root().mila().name() ):
                     mila_remove_solo( self.root().mila() )
 
     @QtCore.Slot()
@@ -1532,8 +1940,8 @@ class TreeItemWidget( QtGui.QWidget ):
 
     @QtCore.Slot()
     def enable_widget_clicked( self ):
-        state = self._node.enabled()
-        self.setState( value=not state, set=True )
+        # The state is set with the painted ones on release, a click and a paint stroke are one undo step
+        self.root().startEnablePaint( self )
 
     @QtCore.Slot()
     def delete_button_clicked( self ):
@@ -1672,6 +2080,48 @@ class TreeItemWidget( QtGui.QWidget ):
 
 
 
+class TreeItemWidgetPool( object ):
+    """ Bounded pool of detached TreeItemWidget. The rows of a cleared tree are kept hidden and re-pointed
+    to the nodes of the next tree (see TreeItemWidget.setNode) instead of being deleted and built again """
+
+    size = 512
+
+    _items = []
+    # Hidden widget holding the pooled rows
+    _holder = None
+
+    @classmethod
+    def acquire( cls, node, parent, tint=None ):
+
+        while cls._items:
+            item = cls._items.pop()
+            if isValid( item ):
+                item.setParent( parent )
+                item.setNode( node, tint )
+                return item
+
+        return TreeItemWidget( node, parent, tint )
+
+    @classmethod
+    def release( cls, item ):
+        """ Detach item and its children from their tree, they are kept for reuse or deleted when the pool is full """
+
+        item.clear()
+        item.deleteAllCallback()
+
+        if len( cls._items ) >= cls.size:
+            item.setParent( None )
+            item.deleteLater()
+            return
+
+        if cls._holder is None or not isValid( cls._holder ):
+            cls._holder = QtGui.QWidget()
+            cls._holder.hide()
+
+        item.setParent( cls._holder )
+        cls._items.append( item )
+
+
 class TreeItemWidgetLabel( QtGui.QWidget ):
 
     def __init__( self, node, parent ):
@@ -1717,6 +2167,18 @@ class TreeItemWidgetLabel( QtGui.QWidget ):
 
         self.update()
 
+    def setNode( self, node ):
+
+        self.node = node
+
+        self.niceName.setText( self.node.niceName() )
+        self.realName.setText( self.node.name() )
+
+        self.editWidget.hide()
+        self.displayWidget.show()
+
+        self.update()
+
     def mouseDoubleClickEvent( self, event ):
 
         newName = self.niceName.text().strip()
@@ -1856,9 +2318,20 @@ class ColoredIcon( QtGui.QLabel ):
 
         super( ColoredIcon, self ).__init__( parent )
 
+        self.size = size
+        self.fileName = None
+
+        self.setImage( fileName )
+
+    def setImage( self, fileName ):
+
+        if fileName == self.fileName:
+            return
+
+        self.fileName = fileName
         self.orig_image = QtGui.QImage( fileName )
 
-        self.orig_image = self.orig_image.scaled( size[0], size[1], QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation )
+        self.orig_image = self.orig_image.scaled( self.size[0], self.size[1], QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation )
 
         self._setPixmap( self.orig_image )
 
@@ -1931,30 +2404,36 @@ class AutoHideMenu(QtGui.QMenu):
 ## BASE Maya function ---
 ## This is where the modification to the DG is performed
 
-def set_widget_name( object, name ):
+# base name -> last number used, see _unique_object_name
+_object_name_counters = {}
+
+def _unique_object_name( name, find ):
+    # Return name followed by a number, the numbers of a base name only grow for the whole session.
+    # Each candidate is still searched in the maya ui (controls may be made outside of this function, or before
+    # a reload of this module), the first one is almost always free
 
-    # We will use the maya naming convention, we use the class name followed by a number to ensure unique name
     name = str( name )
 
-    ptr = True
-    i = 0
-    while ptr:
+    i = _object_name_counters.get( name, 0 )
+    while True:
         i += 1
-        ptr = OpenMayaUI.MQtUtil.findControl( name + str( i ) )
+        if not find( name + str( i ) ):
+            break
 
-    object.setObjectName( name + str( i ) )
+    _object_name_counters[name] = i
 
+    return name + str( i )
 
-def set_layout_name( object, name ):
-    name = str( name )
 
-    ptr = True
-    i = 0
-    while ptr:
-        i += 1
-        ptr = OpenMayaUI.MQtUtil.findLayout( name + str( i ) )
+def set_widget_name( object, name ):
+
+    # We will use the maya naming convention, we use the class name followed by a number to ensure unique name
+    object.setObjectName( _unique_object_name( name, OpenMayaUI.MQtUtil.findControl ) )
+
+
+def set_layout_name( object, name ):
 
-    object.setObjectName( name + str( i ) )
+    object.setObjectName( _unique_object_name( name, OpenMayaUI.MQtUtil.findLayout ) )
 
 
 def mila_nice_name( milaName ):
@@ -1,6 +1,6 @@
 from maya import OpenMaya
 
-__all__ = ['MilaNode', 'mila_node', 'mila_copy', 'mila_init', 'mila_move', 'mila_delete', 'mila_enable_node', 'mila_set_solo', 'mila_remove_solo', 'MILA_GROUP_TYPES', 'MILA_COMPONENT_TYPES']
+__all__ = ['MilaNode', 'MilaEdit', 'mila_node', 'mila_copy', 'mila_init', 'mila_move', 'mila_delete', 'mila_enable_node', 'mila_enable_slots', 'mila_set_solo', 'mila_remove_solo', 'mila_solo_item', 'mila_solo_layer', 'mila_insert', 'mila_children_data', 'MILA_NO_TINT', 'mila_find_nice_name', 'mila_root_layer', 'mila_execute', 'MILA_GROUP_TYPES', 'MILA_COMPONENT_TYPES']
 
 # Python modules
 import re
@@ -9,6 +9,9 @@ import re
 import maya.cmds as cmds
 import maya.OpenMaya as OpenMaya
 
+# Mila modules
+from mila_profile import mila_profiled
+
 # Global var
 MILA_MULTI_ATTR_NAME = {
                         "mila_layer": "layers",
@@ -33,6 +36,29 @@ MILA_NODES = set( MILA_COMPONENT_TYPES )
 MILA_NODES.update( MILA_GROUP_TYPES )
 MILA_NODES.add( "mila_material" )
 
+# Attributes that are not part of a node data (see mila_attribute_data)
+MILA_IGNORED_ATTRS = set( [
+                            "message",
+                            "caching",
+                            "frozen",
+                            "isHistoricallyInteresting",
+                            "nodeState",
+                            "binMembership",
+                            "shader",
+                            "save_shader",
+                            "tmp_layer",
+                            "solo_layer",
+                            "mila_nice_name"
+                        ] )
+
+# Tint of the nodes without tint attribute (the groups) in mila_children_data
+MILA_NO_TINT = ()
+
+MILA_BOOL_TYPES = set( [OpenMaya.MFnNumericData.kBoolean] )
+MILA_SHORT_TYPES = set( [OpenMaya.MFnNumericData.kByte, OpenMaya.MFnNumericData.kChar, OpenMaya.MFnNumericData.kShort] )
+MILA_INT_TYPES = set( [OpenMaya.MFnNumericData.kInt] )
+MILA_FLOAT_TYPES = set( [OpenMaya.MFnNumericData.kFloat] )
+
 def getDependencyNode( node ):
 
     sel = OpenMaya.MSelectionList()
@@ -108,10 +134,18 @@ class MilaNode( object ):
 
     def attrChangeCallback( self, node, plug, *args ):
 
+        # Inside a MilaEdit, the materials of a node are only looked up once
+        if MilaEdit.depth and self.name() in MilaEdit.touched:
+            return
+
         # Refresh the parent mila node if any
-        for parent in self.parentMila():
+        materials = self.parentMila()
+        for parent in materials:
             mila_refresh_swatch( parent )
 
+        if MilaEdit.depth and materials:
+            MilaEdit.touched.add( self.name() )
+
 
     def deleteCallback( self, *args ):
         
@@ -252,25 +286,20 @@ class MilaNode( object ):
                     yield node
 
     def soloItem( self ):
-        """Only Work for mila_material node, return the solo item if any"""
+        """Only Work for mila_material node, return the solo item if any (cached, see mila_solo_item)"""
         if self.type() != "root":
             return None
 
-        tmp_layer = self.soloLayer()
-        if tmp_layer:
-            solo_node = tmp_layer.source( tmp_layer.inAttr( 0 ) )
-            if solo_node:
-                return solo_node
-        return None
+        return mila_solo_item( self )
 
     def soloLayer( self ):
+        """Only Work for mila_material node, return the solo layer if the material is in solo"""
         if self.type() != "root":
             return None
 
-        tmp_layer = self.source( self.inAttr() )
-        if cmds.objExists( tmp_layer.attr( "tmp_layer" ) ):
-            return tmp_layer
-        return None
+        if _solo_state( self )[0] is None:
+            return None
+        return mila_solo_layer( self )
 
 
     def index( self, inputNode ):
@@ -372,19 +401,14 @@ class MilaNode( object ):
 
 
     def niceName( self ):
+        # Cached, see _nice_name
 
-        if cmds.objExists( "%s.%s" % ( self.name(), "mila_nice_name" ) ):
-            niceName = str( cmds.getAttr( "%s.%s" % ( self.name(), "mila_nice_name" ) ) ).strip()
-
-            if niceName:
-                return niceName
-
-        return self.name()
+        return _nice_name( self.obj, self._node ) or self.name()
 
 
     def setNiceName( self, newName ):
 
-        if not cmds.objExists( "%s.%s" % ( self.name(), "mila_nice_name" ) ):
+        if not self._node.hasAttribute( "mila_nice_name" ):
             cmds.addAttr( self.name(), longName="mila_nice_name", dt="string" )
 
         cmds.setAttr( "%s.%s" % ( self.name(), "mila_nice_name" ), str( newName ).strip(), type="string" )
@@ -396,10 +420,184 @@ class MilaNode( object ):
         else:
             return False
 
+## Nice names ---
+# The nice names are read once per node and kept until an attribute changed callback tells they changed.
+# The scene index (see mila_nice_name_index) is built with one ls and rebuilt after any nice name or mila node change.
+
+# node name -> nice name ( "" when it has none )
+_nice_names = {}
+# node name -> callback ids of the nodes watched by the nice name cache
+_nice_name_callbacks = {}
+# callback ids of the node added/removed messages
+_nice_name_scene_callbacks = []
+# nice or real name (lower case) -> set of node names, None when it must be rebuilt
+_nice_name_index = None
+
+
+def _nice_name_changed( msg, plug, otherPlug, *args ):
+    global _nice_name_index
+
+    if OpenMaya.MFnAttribute( plug.attribute() ).name() == "mila_nice_name":
+        _nice_names.pop( OpenMaya.MFnDependencyNode( plug.node() ).name(), None )
+        _nice_name_index = None
+
+
+def _nice_name_renamed( node, previous, *args ):
+    global _nice_name_index
+
+    _nice_names.pop( previous, None )
+    _nice_name_index = None
+    try:
+        _nice_name_callbacks[OpenMaya.MFnDependencyNode( node ).name()] = _nice_name_callbacks.pop( previous )
+    except KeyError:
+        pass
+
+
+def _nice_name_removed( node, *args ):
+    global _nice_name_index
+
+    name = OpenMaya.MFnDependencyNode( node ).name()
+    _nice_names.pop( name, None )
+    _nice_name_index = None
+    for callback in _nice_name_callbacks.pop( name, [] ):
+        OpenMaya.MMessage.removeCallback( callback )
+
+
+def _nice_name_scene_changed( node, *args ):
+    global _nice_name_index
+
+    if OpenMaya.MFnDependencyNode( node ).typeName() in MILA_NODES:
+        _nice_name_index = None
+
+
+def _nice_name( obj, fn=None ):
+    # Return the nice name of the node ( "" if it has none ), read once then cached
+
+    fn = fn or OpenMaya.MFnDependencyNode( obj )
+    name = fn.name()
+
+    try:
+        return _nice_names[name]
+    except KeyError:
+        pass
+
+    if name not in _nice_name_callbacks:
+        _nice_name_callbacks[name] = [
+                                    OpenMaya.MNodeMessage.addAttributeChangedCallback( obj, _nice_name_changed ),
+                                    OpenMaya.MNodeMessage.addNameChangedCallback( obj, _nice_name_renamed ),
+                                    OpenMaya.MNodeMessage.addNodePreRemovalCallback( obj, _nice_name_removed )
+                                    ]
+
+    niceName = ""
+    if fn.hasAttribute( "mila_nice_name" ):
+        niceName = fn.findPlug( "mila_nice_name" ).asString().strip()
+
+    _nice_names[name] = niceName
+
+    return niceName
+
+
+def mila_nice_name_index():
+    """ Return {name: set of node names} for all mila layers and components of the scene, indexed by their nice name and
+    their real name (lower case) """
+
+    global _nice_name_index
+
+    if _nice_name_index is not None:
+        return _nice_name_index
+
+    if not _nice_name_scene_callbacks:
+        _nice_name_scene_callbacks.append( OpenMaya.MDGMessage.addNodeAddedCallback( _nice_name_scene_changed ) )
+        _nice_name_scene_callbacks.append( OpenMaya.MDGMessage.addNodeRemovedCallback( _nice_name_scene_changed ) )
+
+    index = {}
+
+    names = cmds.ls( type=list( MILA_GROUP_TYPES ) + MILA_COMPONENT_TYPES ) or []
+    sel = OpenMaya.MSelectionList()
+    for name in names:
+        sel.add( name )
+
+    for i in range( sel.length() ):
+        obj = OpenMaya.MObject()
+        sel.getDependNode( i, obj )
+        fn = OpenMaya.MFnDependencyNode( obj )
+        name = fn.name()
+
+        index.setdefault( name.lower(), set() ).add( name )
+        niceName = _nice_name( obj, fn )
+        if niceName:
+            index.setdefault( niceName.lower(), set() ).add( name )
+
+    _nice_name_index = index
+
+    return index
+
+
+def mila_find_nice_name( text ):
+    """ Return the sorted names of the mila layers and components whose nice name or name contains text (case insensitive) """
+
+    text = text.strip().lower()
+    if not text:
+        return []
+
+    found = set()
+    for key, names in mila_nice_name_index().items():
+        if text in key:
+            found.update( names )
+
+    return sorted( found )
+
+
+class MilaEdit( object ):
+    """ Edit transaction, the swatch refreshes are suspended while it is open.
+    The mila_materials to refresh are collected and each one is refreshed once when the outermost transaction closes.
+    materials are refreshed at the end even if no edit reaches them. Transactions can be nested """
+
+    depth = 0
+    # mila_material names waiting for a refresh, in order
+    pending = []
+    # nodes whose materials are already pending
+    touched = set()
+
+    def __init__( self, *materials ):
+        self.materials = materials
+
+    def __enter__( self ):
+
+        MilaEdit.depth += 1
+
+        for mila in self.materials:
+            if mila:
+                mila_refresh_swatch( mila )
+
+        return self
+
+    def __exit__( self, *args ):
+
+        MilaEdit.depth -= 1
+        if MilaEdit.depth:
+            return
+
+        pending = MilaEdit.pending
+        MilaEdit.pending = []
+        MilaEdit.touched.clear()
+
+        for name in pending:
+            # The material may have been deleted by the edit
+            mila = mila_node( name )
+            if mila:
+                mila_refresh_swatch( mila )
+
+
 def mila_refresh_swatch( node ):
     # Set a value to force refresh
     # This will fail if the show_framebuffer attribut has an input connection but it is very unlikely that someone will try to connect something to this
 
+    if MilaEdit.depth:
+        if str( node ) not in MilaEdit.pending:
+            MilaEdit.pending.append( str( node ) )
+        return
+
     if not cmds.objExists( node ):
         return
 
@@ -445,10 +643,20 @@ def mila_node( input_, parent=None, index=None, create=False, name="" ):
     else:
         return None
     
-def mila_copy( node ):
+@mila_profiled( "copy" )
+def mila_copy( node, upstream=False ):
+    """ Duplicate node and all the mila nodes under it.
+    Only the mila nodes are cloned, in a single MDGModifier, with their slot data. External inputs (textures, etc.) are
+    connected to the same sources as the original. Use upstream=True to duplicate the whole upstream graph instead. """
+
+    if upstream:
+        new_node = cmds.duplicate( node, upstreamNodes=True )[0]
+        return mila_node( new_node )
+
+    from mila_serialize import mila_snapshot, mila_rebuild
 
-    new_node = cmds.duplicate( node, upstreamNodes=True )[0]
-    return mila_node( new_node )
+    new_node, missing = mila_rebuild( mila_snapshot( node ) )
+    return new_node
     
 
 def get_connection_or_value( attribute ):
@@ -495,6 +703,279 @@ def set_connection_or_value( attr, value ):
                 raise
 
 
+def _plug_kind( plug ):
+    # Return how the value of a non compound plug is read and written, None if we don't handle it
+    attr = plug.attribute()
+
+    if attr.hasFn( OpenMaya.MFn.kNumericAttribute ):
+        unit = OpenMaya.MFnNumericAttribute( attr ).unitType()
+        if unit in MILA_BOOL_TYPES:
+            return "bool"
+        elif unit in MILA_SHORT_TYPES:
+            return "short"
+        elif unit in MILA_INT_TYPES:
+            return "int"
+        elif unit in MILA_FLOAT_TYPES:
+            return "float"
+        return "double"
+
+    elif attr.hasFn( OpenMaya.MFn.kEnumAttribute ):
+        return "short"
+
+    elif attr.hasFn( OpenMaya.MFn.kUnitAttribute ):
+        return "double"
+
+    elif attr.hasFn( OpenMaya.MFn.kTypedAttribute ):
+        if OpenMaya.MFnTypedAttribute( attr ).attrType() == OpenMaya.MFnData.kString:
+            return "string"
+
+    return None
+
+
+def mila_plug_value( plug ):
+    """ Return the value of the plug, a list for compound plugs (eg, colors), None if the type is not handled """
+
+    if plug.isCompound():
+        return [mila_plug_value( plug.child( i ) ) for i in range( plug.numChildren() )]
+
+    kind = _plug_kind( plug )
+
+    if kind == "bool":
+        return plug.asBool()
+    elif kind in ( "short", "int" ):
+        return plug.asInt()
+    elif kind in ( "float", "double" ):
+        return plug.asDouble()
+    elif kind == "string":
+        return plug.asString()
+
+    return None
+
+
+def mila_set_plug_value( modifier, plug, value ):
+    """ Queue the value on the modifier, the value is a result of mila_plug_value """
+
+    if value is None:
+        return
+
+    if plug.isCompound():
+        for i in range( min( plug.numChildren(), len( value ) ) ):
+            mila_set_plug_value( modifier, plug.child( i ), value[i] )
+        return
+
+    kind = _plug_kind( plug )
+
+    if kind == "bool":
+        modifier.newPlugValueBool( plug, bool( value ) )
+    elif kind == "short":
+        modifier.newPlugValueShort( plug, int( value ) )
+    elif kind == "int":
+        modifier.newPlugValueInt( plug, int( value ) )
+    elif kind == "float":
+        modifier.newPlugValueFloat( plug, float( value ) )
+    elif kind == "double":
+        modifier.newPlugValueDouble( plug, float( value ) )
+    elif kind == "string":
+        modifier.newPlugValueString( plug, value )
+
+
+def mila_plug_source( plug ):
+    """ Return the plug connected to the input of plug, or None """
+
+    plugs = OpenMaya.MPlugArray()
+    plug.connectedTo( plugs, True, False )
+    if plugs.length():
+        return plugs[0]
+
+    return None
+
+
+def mila_children_data( node ):
+    """ Return [( index, child, on, tint )] for the connected slots of the group node, in index order.
+    Everything is read in a single walk of the multi attribute: child is a MilaNode knowing its parent and index,
+    on is the enable state of the slot and tint the ( r, g, b ) of the child (MILA_NO_TINT if it has no tint attribute) """
+
+    node = mila_node( node )
+    if not node or node.type() != "group":
+        return []
+
+    fn = node._node
+    multi = fn.findPlug( node._multiAttrName() )
+    shader_attr = fn.attribute( "shader" )
+    on_attr = fn.attribute( "on" )
+
+    indices = OpenMaya.MIntArray()
+    multi.getExistingArrayAttributeIndices( indices )
+
+    rows = []
+    for index in sorted( indices[i] for i in range( indices.length() ) ):
+        element = multi.elementByLogicalIndex( index )
+
+        source = mila_plug_source( element.child( shader_attr ) )
+        if source is None:
+            continue
+
+        child_fn = OpenMaya.MFnDependencyNode( source.node() )
+        tint = MILA_NO_TINT
+        if child_fn.hasAttribute( "tint" ):
+            tint = tuple( mila_plug_value( child_fn.findPlug( "tint" ) ) )
+
+        child = MilaNode( child_fn.name() )
+        child._parent = node
+        child._parent_id = index
+
+        rows.append( ( index, child, element.child( on_attr ).asBool(), tint ) )
+
+    return rows
+
+
+def mila_plug_name( plug ):
+    # node.longAttributeName, used to store connections
+    return plug.partialName( True, False, False, False, False, True )
+
+
+def _plug_data( name, plug, values, inputs ):
+
+    source = mila_plug_source( plug )
+    if source is not None:
+        inputs[name] = mila_plug_name( source )
+        return
+
+    if plug.isCompound():
+        # Children of a compound (eg, color channels) can be connected individually
+        for i in range( plug.numChildren() ):
+            child = plug.child( i )
+            source = mila_plug_source( child )
+            if source is not None:
+                inputs[OpenMaya.MFnAttribute( child.attribute() ).name()] = mila_plug_name( source )
+
+    value = mila_plug_value( plug )
+    if value is not None:
+        values[name] = value
+
+
+def mila_attribute_data( node ):
+    """ Return the values and the input connections of the node's own attributes as two dict: ( {attr: value}, {attr: "node.attr"} )
+    Multi attributes (layers, components) and mila bookkeeping attributes are skipped """
+
+    node = mila_node( node )
+    fn = node._node
+
+    values = {}
+    inputs = {}
+
+    for i in range( fn.attributeCount() ):
+        attr = fn.attribute( i )
+        fnAttr = OpenMaya.MFnAttribute( attr )
+
+        if fnAttr.name() in MILA_IGNORED_ATTRS or attr.hasFn( OpenMaya.MFn.kMessageAttribute ):
+            continue
+        if fnAttr.isHidden() or not fnAttr.isWritable() or not fnAttr.isStorable() or fnAttr.isArray():
+            continue
+        # Children are handled with their compound parent
+        if not fnAttr.parent().isNull():
+            continue
+
+        _plug_data( fnAttr.name(), fn.findPlug( attr ), values, inputs )
+
+    return values, inputs
+
+
+def mila_slot_data( node, index ):
+    """ Same as mila_attribute_data for the slot at index of a group node ( values, inputs ), the shader input is skipped """
+
+    node = mila_node( node )
+
+    values = {}
+    inputs = {}
+
+    element = node._node.findPlug( node._multiAttrName() ).elementByLogicalIndex( index )
+
+    for i in range( element.numChildren() ):
+        child = element.child( i )
+        name = OpenMaya.MFnAttribute( child.attribute() ).name()
+        if name == "shader":
+            continue
+        _plug_data( name, child, values, inputs )
+
+    return values, inputs
+
+
+# ( node type, attribute ) -> default values, see mila_attribute_default
+_attribute_defaults = {}
+
+def mila_attribute_default( nodeType, attr ):
+    """ Return the default of the attribute of the node type as a list of numbers (one per child for compounds, eg. colors).
+    It is read from the attribute definition (an unused element of a multi is never read, it could be created), then cached """
+
+    key = ( nodeType, attr )
+    try:
+        return _attribute_defaults[key]
+    except KeyError:
+        default = _attribute_defaults[key] = cmds.attributeQuery( attr, type=nodeType, listDefault=True ) or []
+        return default
+
+
+def mila_reset_slot( modifier, node, index ):
+    """ Queue on modifier the reset of the slot at index of the group node: its attributes get their default values
+    (see mila_attribute_default) and their inputs are disconnected. The shader input is kept """
+
+    node = mila_node( node )
+    fn = node._node
+    nodeType = node.nodeType()
+    element = fn.findPlug( node._multiAttrName() ).elementByLogicalIndex( index )
+
+    for i in range( element.numChildren() ):
+        child = element.child( i )
+        name = OpenMaya.MFnAttribute( child.attribute() ).name()
+        if name == "shader":
+            continue
+
+        for plug in [child] + [child.child( j ) for j in range( child.numChildren() if child.isCompound() else 0 )]:
+            source = mila_plug_source( plug )
+            if source is not None:
+                modifier.disconnect( source, plug )
+
+        default = mila_attribute_default( nodeType, name )
+        if not default:
+            continue
+        if child.isCompound():
+            mila_set_plug_value( modifier, child, default )
+        else:
+            mila_set_plug_value( modifier, child, default[0] )
+
+
+_pending_operations = []
+
+def mila_execute( operation ):
+    """ Call operation( modifier ) with a new MDGModifier then execute the modifier (operation may also call doIt itself).
+    When the mila plugin is loaded, this goes through the milaDGModifier command so the whole modifier is a single undo step.
+    Return what operation returned. """
+
+    result = []
+    modifier = OpenMaya.MDGModifier()
+
+    def run():
+        result.append( operation( modifier ) )
+        modifier.doIt()
+        return modifier
+
+    if hasattr( cmds, "milaDGModifier" ):
+        _pending_operations.append( run )
+        cmds.milaDGModifier()
+    else:
+        run()
+
+    if result:
+        return result[0]
+    return None
+
+
+def mila_pop_operation():
+    # Used by the milaDGModifier command
+    return _pending_operations.pop()
+
+
 def mila_init( node ):
 
     root_layer = ""
@@ -512,6 +993,18 @@ def mila_init( node ):
     return root_layer
 
 
+def mila_root_layer( mila ):
+    """ Return the layer holding the network of the mila_material, ignoring any solo layer """
+
+    mila = mila_node( mila )
+
+    save_attr = mila.attr( "save_shader" )
+    if cmds.objExists( save_attr ) and cmds.connectionInfo( save_attr, isExactDestination=True ):
+        return mila.source( save_attr )
+
+    return mila.child()
+
+
 def mila_get_input( node, parent=None, index=None ):
 
     node = mila_node( node )
@@ -538,26 +1031,132 @@ def mila_enable_node( node, parent=None, index=None, value=True ):
         return cmds.setAttr( parent.multiAttr( index ) + ".on", value )
 
 
-def mila_delete( node, parent=None, index=None, force=False, clean=True ):
+def mila_enable_slots( slots, value=True ):
+    """ Set the on attribute of several ( parent, index ) slots in a single MDGModifier.
+    The slots already at value are skipped, return the list of the slots that changed """
+
+    value = bool( value )
+
+    changed = []
+    plugs = []
+    for parent, index in slots:
+        parent = mila_node( parent )
+        if not parent or parent.type() != "group" or ( parent.name(), index ) in changed:
+            continue
+
+        fn = parent._node
+        plug = fn.findPlug( parent._multiAttrName() ).elementByLogicalIndex( index ).child( fn.attribute( "on" ) )
+        if plug.asBool() != value:
+            plugs.append( plug )
+            changed.append( ( parent.name(), index ) )
+
+    def operation( modifier ):
+        for plug in plugs:
+            modifier.newPlugValueBool( plug, value )
+
+    if plugs:
+        mila_execute( operation )
+
+    return changed
+
+
+@mila_profiled( "delete" )
+def mila_delete( node, parent=None, index=None, force=False, clean=True, graph=None ):
+    """ Remove node from its parent, then delete it with every node of its subtree that is not used anywhere else.
+    With force=True, node is deleted even if it is linked somewhere else.
+    The shared nodes are found with the reverse index of a MilaGraph (scanned if not given, it is stale afterwards),
+    the slot removal, the deletions and the compaction of the parent (clean=True) are a single MDGModifier """
+
+    from mila_graph import MilaGraph
 
     node, parent, index = mila_get_input( node, parent, index )
 
-    multiConnection = False
-    if node.isUsedMultipleTimes():
-        multiConnection = True
-    # Disconnecting the node from its parent
-    node, null = mila_remove_node( parent, index )
+    if graph is None:
+        graph = MilaGraph()
 
-    if clean:
-        # Reorder and Clean the parent (to remove empty slots)
-        mila_reorder_node( parent, clean=True )
+    name = node.name()
+    if force:
+        edges = graph.parents.get( name, [] )
+    elif parent:
+        edges = [( parent.name(), index )]
+    else:
+        edges = []
+
+    deleted = graph.owned( name, edges )
+
+    def operation( modifier ):
+
+        if parent:
+            slots = [( i, child ) for i, child in graph.slots.get( parent.name(), [] ) if i != index]
+            modifier.commandToExecute( 'removeMultiInstance -b true "%s"' % parent.multiAttr( index ) )
+            if clean:
+                mila_queue_compaction( modifier, parent, slots )
+
+        for item in deleted:
+            modifier.deleteNode( graph.objects[item] )
+
+    mila_execute( operation )
+
+    return deleted
+
+
+def mila_slot_snapshot( node ):
+    """ Return [( index, child name or None )] for every slot of the group node, in index order, read in a single walk of its multi """
+
+    node = mila_node( node )
+    fn = node._node
+    multi = fn.findPlug( node._multiAttrName() )
+    shader_attr = fn.attribute( "shader" )
+
+    indices = OpenMaya.MIntArray()
+    multi.getExistingArrayAttributeIndices( indices )
 
-    if force or not multiConnection or not node.parents():
-        # Deleting all child of the node
-        for child, null in node.children( index=True ):
-            mila_delete( child, clean=False )
-        # Now delete the node
-        cmds.delete( node )
+    slots = []
+    for index in sorted( indices[i] for i in range( indices.length() ) ):
+        source = mila_plug_source( multi.elementByLogicalIndex( index ).child( shader_attr ) )
+        slots.append( ( index, OpenMaya.MFnDependencyNode( source.node() ).name() if source is not None else None ) )
+
+    return slots
+
+
+def mila_queue_compaction( modifier, parent, slots, start=0, clean=True ):
+    """ Queue on modifier the moves packing the slots of parent from index start, keeping their order.
+    slots is the [( index, child name or None )] list of the slots of parent (see mila_slot_snapshot), the empty ones are
+    removed when clean is True. Only the slots changing index are read and rewritten. Return the index after the last slot """
+
+    parent = mila_node( parent )
+    fn = parent._node
+    multi = fn.findPlug( parent._multiAttrName() )
+
+    moving = []
+    position = start
+    for index, child in slots:
+        if child is None:
+            if clean:
+                modifier.commandToExecute( 'removeMultiInstance -b true "%s"' % parent.multiAttr( index ) )
+            continue
+        if index != position:
+            # The data is read before anything is queued
+            moving.append( ( position, child, mila_slot_data( parent, index ) ) )
+            modifier.commandToExecute( 'removeMultiInstance -b true "%s"' % parent.multiAttr( index ) )
+        position += 1
+
+    sel = OpenMaya.MSelectionList()
+    for target, child, ( values, inputs ) in moving:
+        element = multi.elementByLogicalIndex( target )
+        modifier.connect( getDependencyNode( child )[0].findPlug( "message" ), element.child( fn.attribute( "shader" ) ) )
+
+        for attr, value in values.items():
+            mila_set_plug_value( modifier, element.child( fn.attribute( attr ) ), value )
+
+        for attr, source in inputs.items():
+            sel.clear()
+            sel.add( source )
+            plug = OpenMaya.MPlug()
+            sel.getPlug( 0, plug )
+            modifier.connect( plug, element.child( fn.attribute( attr ) ) )
+
+    return position
 
 
 def mila_get_node( parent=None, index=None ):
@@ -587,11 +1186,173 @@ def mila_remove_node( parent=None, index=None ):
     return node, attrData
 
 
+## Solo ---
+# Each mila_material owns one solo layer, created the first time it goes in solo and kept afterwards (linked to the
+# material by its solo_layer attribute). Going in or out of solo, or changing the solo item, only swaps connections.
+
+# mila_material name -> ( solo item handle or None, solo layer handle or None ), see _solo_state.
+# Handles follow the nodes through renames, a deleted node is detected when the state is read
+_solo_cache = {}
+# node name -> callback ids of the nodes watched by the solo cache
+_solo_callbacks = {}
+
+
+def _solo_changed( msg, plug, otherPlug, *args ):
+    if msg & ( OpenMaya.MNodeMessage.kConnectionMade | OpenMaya.MNodeMessage.kConnectionBroken | OpenMaya.MNodeMessage.kAttributeArrayRemoved ):
+        _solo_cache.clear()
+
+
+def _solo_renamed( node, previous, *args ):
+    _solo_cache.clear()
+    try:
+        _solo_callbacks[OpenMaya.MFnDependencyNode( node ).name()] = _solo_callbacks.pop( previous )
+    except KeyError:
+        pass
+
+
+def _solo_removed( node, *args ):
+    _solo_cache.clear()
+    for callback in _solo_callbacks.pop( OpenMaya.MFnDependencyNode( node ).name(), [] ):
+        OpenMaya.MMessage.removeCallback( callback )
+
+
+def _watch_solo( obj ):
+    # Any connection change on the material or its solo layer invalidates the cache, undo and redo included
+
+    name = OpenMaya.MFnDependencyNode( obj ).name()
+    if name in _solo_callbacks:
+        return
+
+    _solo_callbacks[name] = [
+                            OpenMaya.MNodeMessage.addAttributeChangedCallback( obj, _solo_changed ),
+                            OpenMaya.MNodeMessage.addNameChangedCallback( obj, _solo_renamed ),
+                            OpenMaya.MNodeMessage.addNodePreRemovalCallback( obj, _solo_removed )
+                            ]
+
+
+def _source_node( fn, attr ):
+    # MObject of the node connected to fn.attr, or None
+    if not fn.hasAttribute( attr ):
+        return None
+
+    source = mila_plug_source( fn.findPlug( attr ) )
+    if source is None:
+        return None
+    return source.node()
+
+
+def _handle_name( handle ):
+    # Current name of the node of the handle, None without handle
+    if handle is None:
+        return None
+    return OpenMaya.MFnDependencyNode( handle.object() ).name()
+
+
+def _solo_state( mila ):
+    # Return ( solo item name, solo layer name ) of the mila_material, read with the API once then cached
+
+    name = mila.name()
+    try:
+        handles = _solo_cache[name]
+    except KeyError:
+        pass
+    else:
+        if all( handle is None or handle.isValid() for handle in handles ):
+            return tuple( _handle_name( handle ) for handle in handles )
+
+    fn = mila._node
+    _watch_solo( mila.obj )
+
+    layer = _source_node( fn, "solo_layer" )
+    active = _source_node( fn, "shader" )
+
+    # A solo layer made by an older version is not linked to the material, it is only rendered
+    if layer is None and active is not None and OpenMaya.MFnDependencyNode( active ).hasAttribute( "tmp_layer" ):
+        layer = active
+
+    item = None
+    layer_handle = None
+
+    if layer is not None:
+        _watch_solo( layer )
+        layer_fn = OpenMaya.MFnDependencyNode( layer )
+        layer_handle = OpenMaya.MObjectHandle( layer )
+
+        if active is not None and _source_node( fn, "save_shader" ) is not None and active == layer:
+            slot = layer_fn.findPlug( "layers" ).elementByLogicalIndex( 0 ).child( layer_fn.attribute( "shader" ) )
+            source = mila_plug_source( slot )
+            if source is not None:
+                item = OpenMaya.MObjectHandle( source.node() )
+
+    handles = _solo_cache[name] = ( item, layer_handle )
+
+    return tuple( _handle_name( handle ) for handle in handles )
+
+
+def mila_solo_item( mila ):
+    """ Return the solo item of the mila_material (None if it is not in solo).
+    The state is cached until a connection of the material or of its solo layer changes, so it is cheap to query on every reload """
+
+    mila = mila_node( mila )
+
+    item = _solo_state( mila )[0]
+    if item is None:
+        return None
+
+    return MilaNode( item )
+
+
+def mila_solo_layer( mila, create=False ):
+    """ Return the solo layer of the mila_material (used or not). With create=True, it is created if the material has none yet """
+
+    mila = mila_node( mila )
+
+    layer = _solo_state( mila )[1]
+    if layer is not None or not create:
+        return MilaNode( layer ) if layer is not None else None
+
+    return MilaNode( mila_execute( lambda modifier: _create_solo_layer( modifier, mila ) ) )
+
+
+def _create_solo_layer( modifier, mila ):
+    # Create the solo layer of the material with modifier (doIt is called), return its name
+
+    fn = mila._node
+
+    for attr in ( "save_shader", "solo_layer" ):
+        if not fn.hasAttribute( attr ):
+            modifier.addAttribute( mila.obj, OpenMaya.MFnMessageAttribute().create( attr, attr ) )
+
+    # The layer is not registered as a render utility, it only exists for the material
+    obj = modifier.createNode( "mila_layer" )
+    modifier.renameNode( obj, "%s_solo_layer" % mila.name() )
+    modifier.addAttribute( obj, OpenMaya.MFnMessageAttribute().create( "tmp_layer", "tmp_layer" ) )
+    modifier.doIt()
+
+    modifier.connect( OpenMaya.MFnDependencyNode( obj ).findPlug( "message" ), fn.findPlug( "solo_layer" ) )
+
+    return OpenMaya.MFnDependencyNode( obj ).name()
+
+
+def _adopt_solo_layer( modifier, mila, layer ):
+    # Link a solo layer made by an older version to the material, so it is reused instead of deleted
+
+    fn = mila._node
+    if _source_node( fn, "solo_layer" ) is not None:
+        return
+
+    if not fn.hasAttribute( "solo_layer" ):
+        modifier.addAttribute( mila.obj, OpenMaya.MFnMessageAttribute().create( "solo_layer", "solo_layer" ) )
+        modifier.doIt()
+
+    modifier.connect( layer._node.findPlug( "message" ), fn.findPlug( "solo_layer" ) )
+
+
+@mila_profiled( "solo" )
 def mila_set_solo( node, mila=None ):
+    """ Render only node in the mila_material. The network is kept on save_shader while the solo layer is rendered.
+    When the material is already in solo, only the input of the solo layer is swapped """
 
-    # Create temp custom attribute on the mila to store the original graph
-    # Create a new empty layer to old the solo item and connect it to the shader attribute
-    # Connect the component into the new layer
     node = mila_node( node )
 
     if mila is None:
@@ -604,69 +1365,115 @@ def mila_set_solo( node, mila=None ):
     if not mila:
         return
 
-    # Some other node might be already solo, if so, only replace it
-    if cmds.connectionInfo( mila.shaderSaveAttr(), isExactDestination=True ):
-        tmp_layer = mila_node( cmds.connectionInfo( mila.inAttr(), sourceFromDestination=True ) )
-        if cmds.objExists( tmp_layer.attr( "tmp_layer" ) ):
-            # The layer in the mila is a solo layer, juste use it
-            cmds.connectAttr( node.outAttr(), tmp_layer.inAttr( 0 ), force=True )
+    solo_item, null = _solo_state( mila )
+    if solo_item == node.name():
+        return
 
-    else:
-        # Connect the root layer to the save_shader attr
-        cmds.connectAttr( mila.child().outAttr(), mila.shaderSaveAttr(), force=True )
+    layer = mila_solo_layer( mila )
 
-        # Create an empty layer
-        tmp_layer = mila_node( "mila_layer", name="%s_solo_layer" % mila.name() )
-        cmds.addAttr( tmp_layer, longName="tmp_layer", at="message" )
-        # Connect the solo node to the shader attribute of the mila
-        cmds.connectAttr( node.outAttr(), tmp_layer.inAttr( 0 ), force=True )
-        cmds.connectAttr( tmp_layer.outAttr(), mila.inAttr(), force=True )
+    fn = mila._node
+    in_solo = _source_node( fn, "save_shader" ) is not None
 
+    def operation( modifier ):
 
+        # The first solo creates the solo layer in the same undo step
+        if layer is None:
+            solo_layer = mila_node( _create_solo_layer( modifier, mila ) )
+        else:
+            solo_layer = layer
+            _adopt_solo_layer( modifier, mila, solo_layer )
+
+        layer_fn = solo_layer._node
+
+        slot = layer_fn.findPlug( "layers" ).elementByLogicalIndex( 0 ).child( layer_fn.attribute( "shader" ) )
+        current = mila_plug_source( slot )
+        if current is not None:
+            modifier.disconnect( current, slot )
+        modifier.connect( node._node.findPlug( "message" ), slot )
+
+        if in_solo:
+            return
+
+        # Swap the network for the solo layer
+        shader = fn.findPlug( "shader" )
+        root = mila_plug_source( shader )
+        if root is not None:
+            modifier.disconnect( root, shader )
+            modifier.connect( root, fn.findPlug( "save_shader" ) )
+        modifier.connect( layer_fn.findPlug( "message" ), shader )
+
+    mila_execute( operation )
+
+
+@mila_profiled( "solo" )
 def mila_remove_solo( mila ):
+    """ Render the network of the mila_material again. The solo layer is emptied and kept for the next solo """
 
     mila = mila_node( mila )
+    fn = mila._node
 
-    if cmds.connectionInfo( mila.shaderSaveAttr(), isExactDestination=True ):
-        # There is something to restore
-        # Get what is in the shader slot and delete it
-        tmp_layer = mila_node( cmds.connectionInfo( mila.inAttr(), sourceFromDestination=True ) )
-        if cmds.objExists( tmp_layer.attr( "tmp_layer" ) ):
-            cmds.delete( tmp_layer )
+    if _source_node( fn, "save_shader" ) is None:
+        return
+
+    layer = mila_solo_layer( mila )
+
+    def operation( modifier ):
+
+        saved = fn.findPlug( "save_shader" )
+        shader = fn.findPlug( "shader" )
+        root = mila_plug_source( saved )
+
+        current = mila_plug_source( shader )
+        if current is not None:
+            modifier.disconnect( current, shader )
+        modifier.disconnect( root, saved )
+        modifier.connect( root, shader )
 
-        orig_layer = mila_node( cmds.connectionInfo( mila.shaderSaveAttr(), sourceFromDestination=True ) )
+        if layer is not None:
+            _adopt_solo_layer( modifier, mila, layer )
+            # Release the solo item, it must not look used twice
+            if layer.indices():
+                modifier.commandToExecute( 'removeMultiInstance -b true "%s"' % layer.multiAttr( 0 ) )
 
-        cmds.connectAttr( orig_layer.outAttr(), mila.inAttr(), force=True )
-        cmds.disconnectAttr( orig_layer.outAttr(), mila.shaderSaveAttr() )
+    mila_execute( operation )
 
 def mila_clean( node, indices=None ):
-    # Remove all empty entry in the node
+    # Remove all empty entry in the node (or the empty ones among indices), found from a single snapshot of the slots
 
     node = mila_node( node )
-    if indices is None:
-        indices = node.indices()
 
-    for i in indices:
-        if not node.child( i ):
-            cmds.removeMultiInstance( node.multiAttr( i ), b=True )
+    empty = [index for index, child in mila_slot_snapshot( node ) if child is None and ( indices is None or index in indices )]
+
+    def operation( modifier ):
+        for index in empty:
+            modifier.commandToExecute( 'removeMultiInstance -b true "%s"' % node.multiAttr( index ) )
+
+    if empty:
+        mila_execute( operation )
 
 
 def mila_move_force( source, dest, index=None, nodeData=None, remove=False ):
     # Remove the source from its parent and connect it to the index in the specified destination.
     # The connection will be forced. Anything connected to the destination will be discarded.
-    # If nodeData is specified use it, else use the data from the node's parent
+    # If nodeData is specified use it (it was read before anything moved), else use the data from the node's parent
     source = mila_node( source )
     dest = mila_node( dest )
 
     parent, parent_id = source.parent()
 
+    # The slot may be gone already, eg, the caller removed it and the node is linked a second time in the same group
+    if parent and parent_id is not None and parent.child( parent_id ) != source:
+        parent = None
+
+    sourceData = nodeData
+
     if parent:
         if remove:
-            source, sourceData = mila_remove_node( parent, parent_id )
+            source, parentData = mila_remove_node( parent, parent_id )
         else:
-            source, sourceData = mila_get_node( parent, parent_id )
-    else:
-        sourceData = nodeData
+            source, parentData = mila_get_node( parent, parent_id )
+        if nodeData is None:
+            sourceData = parentData
 
     cmds.connectAttr( source.outAttr(), dest.inAttr( index ), force=True )
     if sourceData:
@@ -675,36 +1482,38 @@ def mila_move_force( source, dest, index=None, nodeData=None, remove=False ):
 
 def mila_reorder_node( parent, nodes=None, startingIndex=0, remove=True, clean=False ):
     # We need to make all node to start at startingIndex and follow consecutively
+    # Only the slots that move are read and rewritten
     parent = mila_node( parent )
 
-    # Get a list of all indices in the node to clean anything left empty
-    origIndices = parent.indices()
+    if nodes is None and remove:
+        # All the children, the permutation comes from a single snapshot of the slots and is done in one modifier
+        slots = mila_slot_snapshot( parent )
+        return mila_execute( lambda modifier: mila_queue_compaction( modifier, parent, slots, startingIndex, clean ) )
 
     if nodes is None:
         nodes = parent.children()
     else:
         nodes = [mila_node( node ) for node in nodes]
 
-    node_id_data = []
-
+    # Find the nodes that move before touching anything
+    moving = []
+    i = startingIndex
     for node in nodes:
         p, index = node.parent()
-        node, data = mila_get_node( p, index )
-        node_id_data.append( ( node, index, data ) )
-
-    i = startingIndex
-    for node, index, data in node_id_data:
-        if index != i:
-            mila_move_force( node, parent, index=i, nodeData=data, remove=remove )
+        if p != parent or index != i:
+            node, data = mila_get_node( p, index )
+            moving.append( ( node, i, data ) )
         i += 1
 
-    if clean and origIndices:
-        # Clean all possible empty slot
-        # we will range from the index 0, to the last possible index. It can be either the orginal last index; or the new last index
-        mila_clean( parent, range( max( i, origIndices[-1] ) + 1 ) )
+    for node, index, data in moving:
+        mila_move_force( node, parent, index=index, nodeData=data, remove=remove )
+
+    if clean:
+        mila_clean( parent )
 
     return i
 
+@mila_profiled( "move" )
 def mila_move( sources, dest, index=0, remove=False ):  # , reordering=False):
     # Move all items to the specified index inside the desdtination
     # Everything will be reorganized so that each group node wil have its first item at index 0 and everything stacked consecutively without hole
@@ -767,3 +1576,54 @@ def mila_move( sources, dest, index=0, remove=False ):  # , reordering=False):
     # Now clean all modified foreign group
     for node in parent_for_cleaning:
         mila_reorder_node( node, clean=True )
+
+
+def mila_insert( dest, insertions ):
+    """ Insert several nodes at several positions of dest in a single pass.
+    insertions is a list of ( position, node, data ): the node is inserted before the child currently at position
+    (positions count the connected children from the top, like in the ui), data is the slot data to set (can be empty,
+    the slot then gets its default data). Only the slots that actually change are read and rewritten. """
+
+    dest = mila_node( dest )
+
+    existing = list( dest.children( index=True ) )
+
+    # Build the final order of the stack
+    pending = sorted( insertions, key=lambda item: item[0] )
+    final = []
+    for position in range( len( existing ) + 1 ):
+        while pending and pending[0][0] <= position:
+            position_, node, data = pending.pop( 0 )
+            final.append( ( mila_node( node ), None, data ) )
+        if position < len( existing ):
+            child, index = existing[position]
+            final.append( ( child, index, None ) )
+
+    # Read the data of the existing children that need to move before touching anything
+    moving = []
+    for i, ( node, index, data ) in enumerate( final ):
+        if index is None:
+            moving.append( ( i, node, data ) )
+        elif index != i:
+            moving.append( ( i, node, dest.attrData( index ) ) )
+
+    # Free the slots of the moving children (it also breaks their connections)
+    for i, node, data in moving:
+        index = final[i][1]
+        if index is not None:
+            cmds.removeMultiInstance( dest.multiAttr( index ), b=True )
+
+    # An empty slot left by an earlier removal keeps its data, the new nodes without data must not inherit it
+    resets = []
+
+    for i, node, data in moving:
+        cmds.connectAttr( node.outAttr(), dest.inAttr( i ), force=True )
+        if data:
+            dest.setAttrData( data, i )
+        else:
+            resets.append( i )
+
+    if resets:
+        mila_execute( lambda modifier: [mila_reset_slot( modifier, dest, i ) for i in resets] )
+
+    return len( final )
@@ -0,0 +1,263 @@
+"""
+Opt-in profiling of the maya calls made by the mila tools.
+
+    import mila_profile
+    mila_profile.mila_profile_start()
+    # ... use the mila UI ...
+    profiler = mila_profile.mila_profile_stop()
+    print profiler.report()
+    profiler.writeChromeTrace( "mila_trace.json" )  # open with chrome://tracing
+
+While a profiler is active, the maya.cmds commands listed in MILA_PROFILED_COMMANDS are wrapped and their
+calls and time are attributed to the innermost running operation (the functions decorated with mila_profiled).
+When no profiler is active, the decorator only costs a global lookup.
+"""
+
+# Python modules
+import json
+import functools
+import threading
+import timeit
+
+# Maya modules
+import maya.cmds as cmds
+
+
+MILA_PROFILED_COMMANDS = (
+                            "connectionInfo",
+                            "getAttr",
+                            "setAttr",
+                            "objExists",
+                            "nodeType",
+                            "connectAttr",
+                            "disconnectAttr",
+                            "removeMultiInstance",
+                            "listAttr",
+                            "addAttr",
+                            "createNode",
+                            "delete",
+                            "dgdirty"
+                         )
+
+# Calls made outside of any operation
+MILA_NO_OPERATION = "<none>"
+
+_clock = timeit.default_timer
+
+_active = None
+
+
+class MilaProfiler( object ):
+    """ Count the calls and the time of the maya commands per operation. Use it as a context manager, or with mila_profile_start/stop """
+
+    def __init__( self, commands=MILA_PROFILED_COMMANDS, trace=True ):
+
+        self.commands = commands
+        self.trace = trace
+
+        # operation -> {"count": n, "time": seconds, "calls": {command: [count, seconds]}}
+        self.operations = {}
+        # Chrome trace events
+        self.events = []
+
+        self._stack = []
+        # {command: count} of each running operation, for the trace events
+        self._frames = []
+        self._original = {}
+        self._start = _clock()
+
+    ## Recording ---
+
+    def _stats( self, name ):
+        try:
+            return self.operations[name]
+        except KeyError:
+            stats = self.operations[name] = {"count": 0, "time": 0.0, "calls": {}}
+            return stats
+
+    def _wrap( self, name, fn ):
+
+        def wrapper( *args, **kwargs ):
+            start = _clock()
+            try:
+                return fn( *args, **kwargs )
+            finally:
+                elapsed = _clock() - start
+                operation = self._stack[-1] if self._stack else MILA_NO_OPERATION
+                calls = self._stats( operation )["calls"]
+                try:
+                    data = calls[name]
+                except KeyError:
+                    data = calls[name] = [0, 0.0]
+                data[0] += 1
+                data[1] += elapsed
+                if self._frames:
+                    frame = self._frames[-1]
+                    frame[name] = frame.get( name, 0 ) + 1
+
+        wrapper.__name__ = name
+
+        return wrapper
+
+    def begin( self, name ):
+        """ Start an operation, returns False if the operation is already the current one (it is not counted twice) """
+
+        if self._stack and self._stack[-1] == name:
+            return False
+
+        self._stack.append( name )
+        self._frames.append( {} )
+        self._stats( name )["count"] += 1
+
+        return True
+
+    def end( self, name, start ):
+
+        elapsed = _clock() - start
+        self._stack.pop()
+        calls = self._frames.pop()
+
+        # Nested operations are part of the time of their parents
+        if name not in self._stack:
+            self._stats( name )["time"] += elapsed
+
+        if self.trace:
+            self.events.append( {
+                                "name": name,
+                                "ph": "X",
+                                "ts": ( start - self._start ) * 1e6,
+                                "dur": elapsed * 1e6,
+                                "pid": 1,
+                                "tid": threading.current_thread().ident,
+                                "args": calls
+                                } )
+
+    def operation( self, name ):
+        return _MilaOperation( self, name )
+
+    def install( self ):
+
+        global _active
+
+        for name in self.commands:
+            fn = getattr( cmds, name, None )
+            if fn is not None and name not in self._original:
+                self._original[name] = fn
+                setattr( cmds, name, self._wrap( name, fn ) )
+
+        _active = self
+
+    def uninstall( self ):
+
+        global _active
+
+        for name, fn in self._original.items():
+            setattr( cmds, name, fn )
+        self._original = {}
+
+        if _active is self:
+            _active = None
+
+    def __enter__( self ):
+        self.install()
+        return self
+
+    def __exit__( self, *args ):
+        self.uninstall()
+
+    ## Results ---
+
+    def counts( self, operation=None ):
+        """ Return {command: count} for the operation, or for all operations """
+
+        counts = {}
+        for name, stats in self.operations.items():
+            if operation is not None and name != operation:
+                continue
+            for command, ( count, elapsed ) in stats["calls"].items():
+                counts[command] = counts.get( command, 0 ) + count
+
+        return counts
+
+    def report( self ):
+        """ Return a flat text report, the slowest operations first """
+
+        lines = ["%-24s %8s %10s %10s %10s" % ( "operation/command", "count", "time (ms)", "calls", "calls (ms)" )]
+
+        for name, stats in sorted( self.operations.items(), key=lambda item: -item[1]["time"] ):
+            calls = stats["calls"]
+            lines.append( "%-24s %8d %10.2f %10d %10.2f" % ( name, stats["count"], stats["time"] * 1000,
+                                                            sum( data[0] for data in calls.values() ),
+                                                            sum( data[1] for data in calls.values() ) * 1000 ) )
+
+            for command, ( count, elapsed ) in sorted( calls.items(), key=lambda item: -item[1][1] ):
+                lines.append( "    %-20s %8s %10s %10d %10.2f" % ( command, "", "", count, elapsed * 1000 ) )
+
+        return "\n".join( lines )
+
+    def writeReport( self, path ):
+        with open( path, "w" ) as f:
+            f.write( self.report() + "\n" )
+
+    def writeChromeTrace( self, path ):
+        """ Write the operations as a chrome://tracing (trace event format) json file, each event has its command counts as arguments """
+
+        with open( path, "w" ) as f:
+            json.dump( {"traceEvents": self.events, "displayTimeUnit": "ms"}, f )
+
+
+class _MilaOperation( object ):
+
+    def __init__( self, profiler, name ):
+        self.profiler = profiler
+        self.name = name
+        self.started = False
+
+    def __enter__( self ):
+        self.start = _clock()
+        self.started = self.profiler.begin( self.name )
+        return self
+
+    def __exit__( self, *args ):
+        if self.started:
+            self.profiler.end( self.name, self.start )
+
+
+def mila_profiled( name ):
+    """ Decorator attributing the maya calls made by the function to the operation name, while a profiler is active """
+
+    def decorator( fn ):
+
+        @functools.wraps( fn )
+        def wrapper( *args, **kwargs ):
+            profiler = _active
+            if profiler is None:
+                return fn( *args, **kwargs )
+
+            with profiler.operation( name ):
+                return fn( *args, **kwargs )
+
+        return wrapper
+
+    return decorator
+
+
+def mila_profile_start( commands=MILA_PROFILED_COMMANDS, trace=True ):
+    """ Start profiling the session, returns the profiler """
+
+    mila_profile_stop()
+
+    profiler = MilaProfiler( commands, trace )
+    profiler.install()
+
+    return profiler
+
+
+def mila_profile_stop():
+    """ Stop profiling, returns the profiler that was active (or None) """
+
+    profiler = _active
+    if profiler is not None:
+        profiler.uninstall()
+
+    return profiler
@@ -0,0 +1,213 @@
+"""
+Render-time stripping of the mila networks.
+
+Layer stacks keep disabled and zero weight slots for look-dev toggling, the renderer still translates and evaluates them.
+Before a render, the networks are rewired to what actually contributes and restored afterwards:
+
+    import mila_render
+    mila_render.mila_render_strip()
+    # ... render ...
+    mila_render.mila_render_restore()
+
+or, for every render of the scene (batch renders included):
+
+    mila_render.mila_render_install()
+
+A slot is dropped when it is disabled, when its weight or weight_tint is zero (and not connected), when it is empty
+or when its child group has nothing left. A group left with a single slot that has its default data (and no input)
+is replaced by its child. Nodes are never deleted: everything is done by one MDGModifier, undone to restore the scene
+exactly. It is not registered in the undo queue.
+"""
+
+# Maya modules
+import maya.cmds as cmds
+import maya.OpenMaya as OpenMaya
+
+# Mila modules
+from mila_node import *
+from mila_node import mila_attribute_data, mila_attribute_default, mila_slot_data, mila_slot_snapshot, getDependencyNode
+
+
+# No ";" in the commands, the render globals mel are split on it
+MILA_RENDER_PRE_MEL = 'python( "__import__( \'mila_render\' ).mila_render_strip()" )'
+MILA_RENDER_POST_MEL = 'python( "__import__( \'mila_render\' ).mila_render_restore()" )'
+
+# The modifier of the current strip, undone by mila_render_restore
+_strip_modifier = None
+
+
+def _is_zero( value ):
+    if isinstance( value, ( list, tuple ) ):
+        return all( _is_zero( item ) for item in value )
+    return value == 0
+
+
+def _flatten( value ):
+    if isinstance( value, ( list, tuple ) ):
+        return [float( item ) for item in value]
+    return [float( value )]
+
+
+class MilaRenderStrip( object ):
+    """ Queue on a modifier the rewiring of the mila networks to their contributing slots """
+
+    def __init__( self, modifier ):
+
+        self.modifier = modifier
+        # group name -> name of the node rendered in its place, None when nothing is left
+        self.effective = {}
+        self.removed = 0
+        self.collapsed = 0
+
+    def _dropped( self, values, inputs ):
+        # The slot adds nothing to the render
+        if not values.get( "on", True ) and "on" not in inputs:
+            return True
+
+        for attr in ( "weight", "weight_tint" ):
+            if attr in values and attr not in inputs and _is_zero( values[attr] ):
+                return True
+
+        return False
+
+    def _neutral( self, group, values, inputs ):
+        # The slot renders its child unchanged: default data and no input
+        if inputs:
+            return False
+
+        nodeType = group.nodeType()
+
+        for attr, value in values.items():
+            if isinstance( value, basestring ):
+                return False
+
+            default = mila_attribute_default( nodeType, attr )
+            value = _flatten( value )
+            # Float attributes are read back as doubles
+            if len( value ) != len( default ) or any( abs( a - b ) > 1e-6 for a, b in zip( value, default ) ):
+                return False
+
+        return True
+
+    def _rewire( self, group, index, name ):
+        # Connect name in place of the current child of the slot
+        fn = group._node
+        plug = fn.findPlug( group._multiAttrName() ).elementByLogicalIndex( index ).child( fn.attribute( "shader" ) )
+
+        plugs = OpenMaya.MPlugArray()
+        plug.connectedTo( plugs, True, False )
+        for i in range( plugs.length() ):
+            self.modifier.disconnect( plugs[i], plug )
+
+        self.modifier.connect( getDependencyNode( name )[0].findPlug( "message" ), plug )
+
+    def strip( self, node, root=False ):
+        """ Queue the stripping of the group node, return the name of the node rendered in its place (None if empty) """
+
+        node = mila_node( node )
+        name = node.name()
+
+        if node.type() != "group":
+            return name
+
+        if name in self.effective:
+            return self.effective[name]
+
+        # Set before recursing, a cycle keeps the group as it is
+        self.effective[name] = name
+
+        slots = mila_slot_snapshot( node )
+        kept = []
+
+        for index, child in slots:
+            values, inputs = mila_slot_data( node, index )
+
+            result = None
+            if child is not None and not self._dropped( values, inputs ):
+                result = self.strip( child )
+
+            if result is None:
+                self.modifier.commandToExecute( 'removeMultiInstance -b true "%s"' % node.multiAttr( index ) )
+                self.removed += 1
+                continue
+
+            if result != child:
+                self._rewire( node, index, result )
+
+            kept.append( ( index, result, values, inputs ) )
+
+        effective = name
+
+        if not kept and not root:
+            effective = None
+
+        elif len( kept ) == 1 and not root:
+            index, result, values, inputs = kept[0]
+            # The group's own inputs (if any) must keep being rendered
+            if self._neutral( node, values, inputs ) and not mila_attribute_data( node )[1]:
+                effective = result
+                self.collapsed += 1
+
+        self.effective[name] = effective
+
+        return effective
+
+
+def mila_render_strip( materials=None ):
+    """ Rewire the networks of the mila_material (all of them by default) to their contributing slots until mila_render_restore.
+    Return a report dictionary """
+
+    global _strip_modifier
+
+    # Never strip twice, the first modifier must be undone first
+    mila_render_restore()
+
+    if materials is None:
+        materials = cmds.ls( type="mila_material" ) or []
+
+    strip = MilaRenderStrip( OpenMaya.MDGModifier() )
+
+    for mila in materials:
+        # The rendered network (the solo layer while in solo)
+        root = mila_node( mila ).child()
+        if root:
+            strip.strip( root, root=True )
+
+    strip.modifier.doIt()
+    _strip_modifier = strip.modifier
+
+    return {"materials": len( materials ), "removed": strip.removed, "collapsed": strip.collapsed}
+
+
+def mila_render_restore():
+    """ Restore the networks stripped by mila_render_strip, return False if nothing was stripped """
+
+    global _strip_modifier
+
+    if _strip_modifier is None:
+        return False
+
+    modifier = _strip_modifier
+    _strip_modifier = None
+    modifier.undoIt()
+
+    return True
+
+
+def mila_render_install( globals_="defaultRenderGlobals" ):
+    """ Strip the networks around every render of the scene, through the pre and post render mel of the render globals """
+
+    for attr, mel in ( ( "preMel", MILA_RENDER_PRE_MEL ), ( "postMel", MILA_RENDER_POST_MEL ) ):
+        plug = "%s.%s" % ( globals_, attr )
+        current = cmds.getAttr( plug ) or ""
+        if mel not in current:
+            cmds.setAttr( plug, ";".join( item for item in ( current, mel ) if item ), type="string" )
+
+
+def mila_render_uninstall( globals_="defaultRenderGlobals" ):
+
+    for attr, mel in ( ( "preMel", MILA_RENDER_PRE_MEL ), ( "postMel", MILA_RENDER_POST_MEL ) ):
+        plug = "%s.%s" % ( globals_, attr )
+        current = cmds.getAttr( plug ) or ""
+        if mel in current:
+            cmds.setAttr( plug, ";".join( item for item in current.split( ";" ) if item and item != mel ), type="string" )
@@ -0,0 +1,479 @@
+"""
+Save and rebuild mila networks without going through a maya scene.
+
+A network is stored as a small versioned document:
+
+    {
+        "format": "mila",
+        "version": 1,
+        "material": "mila_material1",       # name of the exported mila_material, if any
+        "root": 0,                          # id of the top level node
+        "nodes": [
+            {
+                "type": "mila_layer",
+                "name": "mila_layer1",
+                "nice_name": "Coat",        # only when set
+                "values": {attr: value},    # own attributes
+                "inputs": {attr: "file1.outColor"},  # external connections
+                "slots": [[index, node_id, {attr: value}, {attr: "node.attr"}], ...]  # groups only
+            },
+            ...
+        ]
+    }
+
+A node used several times in the network is only stored once and referenced by its id.
+The document is written as json, or as a binary msgpack compatible stream (see mila_pack).
+"""
+
+# Python modules
+import re
+import json
+import struct
+
+# Maya modules
+import maya.cmds as cmds
+import maya.OpenMaya as OpenMaya
+
+# Mila modules
+from mila_node import *
+from mila_node import MILA_MULTI_ATTR_NAME, mila_attribute_data, mila_slot_data, mila_set_plug_value
+
+
+MILA_FORMAT = "mila"
+MILA_FORMAT_VERSION = 1
+
+MILA_BINARY_EXTENSION = ".milab"
+
+
+class MilaFormatError( ValueError ):
+    pass
+
+
+## Snapshot ---
+
+def mila_snapshot( node ):
+    """ Return the document describing the network under node (a mila_material, a group or a component) """
+
+    node = mila_node( node )
+
+    doc = {"format": MILA_FORMAT, "version": MILA_FORMAT_VERSION, "material": None, "root": None, "nodes": []}
+
+    if node.type() == "root":
+        doc["material"] = node.name()
+        node = mila_root_layer( node )
+        if not node:
+            return doc
+
+    ids = {}
+
+    def visit( item ):
+
+        if item.name() in ids:
+            return ids[item.name()]
+
+        node_id = len( doc["nodes"] )
+        ids[item.name()] = node_id
+
+        values, inputs = mila_attribute_data( item )
+
+        entry = {"type": item.nodeType(), "name": item.name(), "values": values, "inputs": inputs}
+
+        niceName = item.niceName()
+        if niceName != item.name():
+            entry["nice_name"] = niceName
+
+        # The entry is stored before its children so the ids follow the tree order
+        doc["nodes"].append( entry )
+
+        if item.type() == "group":
+            entry["slots"] = []
+            for index in item.indices():
+                child = item.child( index )
+                if not child:
+                    continue
+                slotValues, slotInputs = mila_slot_data( item, index )
+                entry["slots"].append( [index, visit( child ), slotValues, slotInputs] )
+
+        return node_id
+
+    doc["root"] = visit( node )
+
+    return doc
+
+
+## Rebuild ---
+
+def _unique_name( name, taken ):
+
+    if not cmds.objExists( name ) and name not in taken:
+        return name
+
+    base = re.sub( r"[0-9]+$", "", name )
+    i = 1
+    while cmds.objExists( base + str( i ) ) or ( base + str( i ) ) in taken:
+        i += 1
+
+    return base + str( i )
+
+
+def _get_plug( name ):
+
+    sel = OpenMaya.MSelectionList()
+    try:
+        sel.add( name )
+    except RuntimeError:
+        return None
+
+    plug = OpenMaya.MPlug()
+    try:
+        sel.getPlug( 0, plug )
+    except RuntimeError:
+        return None
+
+    return plug
+
+
+def _find_plug( fn, name ):
+
+    try:
+        return fn.findPlug( name )
+    except RuntimeError:
+        return None
+
+
+def _child_plug( fn, element, name ):
+    # Return the child of a compound (multi element) plug, None if the attribute doesn't exist
+    attr = fn.attribute( name )
+    if attr.isNull():
+        return None
+    return element.child( attr )
+
+
+def _apply_data( modifier, plug_getter, values, inputs, missing ):
+
+    for attr, value in values.items():
+        plug = plug_getter( attr )
+        if plug is not None:
+            mila_set_plug_value( modifier, plug, value )
+
+    for attr, source in inputs.items():
+        plug = plug_getter( attr )
+        source_plug = _get_plug( source )
+        if plug is None:
+            continue
+        if source_plug is None:
+            # The texture (or whatever was connected) does not exist in this scene
+            missing.append( source )
+            continue
+        modifier.connect( source_plug, plug )
+
+
+def _render_utility_plugs( count ):
+    # Return count free elements of defaultRenderUtilityList1.utilities
+    utilities = _get_plug( "defaultRenderUtilityList1.utilities" )
+    if utilities is None:
+        return []
+
+    indices = cmds.getAttr( "defaultRenderUtilityList1.utilities", multiIndices=True ) or []
+    start = indices[-1] + 1 if indices else 0
+
+    return [utilities.elementByLogicalIndex( start + i ) for i in range( count )]
+
+
+def mila_rebuild( doc, mila=None, modifier=None ):
+    """ Create the network described by doc in a single MDGModifier and return its top level MilaNode.
+    If mila is specified, the network is connected to its shader attribute.
+    If modifier is specified, the operations are queued on it (it is executed but the caller handles undo),
+    else the modifier goes through mila_execute (one undo step).
+    Returns ( top level MilaNode, list of missing external inputs ) """
+
+    if doc.get( "format" ) != MILA_FORMAT:
+        raise MilaFormatError( "Not a mila document" )
+    if doc.get( "version", 0 ) > MILA_FORMAT_VERSION:
+        raise MilaFormatError( "Unsupported mila document version: %s" % doc.get( "version" ) )
+
+    if doc.get( "root" ) is None:
+        return None, []
+
+    if mila is not None:
+        mila = mila_node( mila )
+
+    def operation( modifier ):
+
+        objs = []
+        taken = set()
+
+        # Create all nodes first, plugs can only be reached once the nodes exist
+        for entry in doc["nodes"]:
+            obj = modifier.createNode( entry["type"] )
+            name = _unique_name( entry["name"], taken )
+            taken.add( name )
+            modifier.renameNode( obj, name )
+
+            if entry.get( "nice_name" ):
+                fnAttr = OpenMaya.MFnTypedAttribute()
+                modifier.addAttribute( obj, fnAttr.create( "mila_nice_name", "mila_nice_name", OpenMaya.MFnData.kString ) )
+
+            objs.append( obj )
+
+        modifier.doIt()
+
+        fns = [OpenMaya.MFnDependencyNode( obj ) for obj in objs]
+        utilities = _render_utility_plugs( len( fns ) )
+        missing = []
+
+        for i, entry in enumerate( doc["nodes"] ):
+            fn = fns[i]
+
+            _apply_data( modifier, lambda attr: _find_plug( fn, attr ), entry.get( "values", {} ), entry.get( "inputs", {} ), missing )
+
+            if entry.get( "nice_name" ):
+                modifier.newPlugValueString( fn.findPlug( "mila_nice_name" ), entry["nice_name"] )
+
+            # Like mila_node( create=True ), register the node as a render utility
+            if utilities:
+                modifier.connect( fn.findPlug( "message" ), utilities[i] )
+
+            if "slots" in entry:
+                multi = fn.findPlug( MILA_MULTI_ATTR_NAME[entry["type"]] )
+
+                for index, child_id, values, inputs in entry["slots"]:
+                    element = multi.elementByLogicalIndex( index )
+                    modifier.connect( fns[child_id].findPlug( "message" ), _child_plug( fn, element, "shader" ) )
+                    _apply_data( modifier, lambda attr: _child_plug( fn, element, attr ), values, inputs, missing )
+
+        root_fn = fns[doc["root"]]
+
+        if mila is not None:
+            shader = mila._node.findPlug( "shader" )
+            previous = OpenMaya.MPlugArray()
+            if shader.connectedTo( previous, True, False ):
+                modifier.disconnect( previous[0], shader )
+            modifier.connect( root_fn.findPlug( "message" ), shader )
+
+        return root_fn.name(), missing
+
+    if modifier is None:
+        name, missing = mila_execute( operation )
+    else:
+        name, missing = operation( modifier )
+        modifier.doIt()
+
+    return mila_node( name ), missing
+
+
+## Encoding ---
+# Minimal msgpack implementation (nil, bool, int, float, str, array, map)
+
+def mila_pack( obj ):
+
+    out = []
+    _pack( obj, out.append )
+    return "".join( out )
+
+
+def _pack( obj, write ):
+
+    if obj is None:
+        write( "\xc0" )
+
+    elif obj is True:
+        write( "\xc3" )
+
+    elif obj is False:
+        write( "\xc2" )
+
+    elif isinstance( obj, ( int, long ) ):
+        if 0 <= obj < 0x80:
+            write( struct.pack( ">B", obj ) )
+        elif -0x20 <= obj < 0:
+            write( struct.pack( ">b", obj ) )
+        elif 0 <= obj <= 0xffffffff:
+            write( struct.pack( ">BI", 0xce, obj ) )
+        elif obj > 0:
+            write( struct.pack( ">BQ", 0xcf, obj ) )
+        elif obj >= -0x80000000:
+            write( struct.pack( ">Bi", 0xd2, obj ) )
+        else:
+            write( struct.pack( ">Bq", 0xd3, obj ) )
+
+    elif isinstance( obj, float ):
+        write( struct.pack( ">Bd", 0xcb, obj ) )
+
+    elif isinstance( obj, basestring ):
+        if isinstance( obj, unicode ):
+            obj = obj.encode( "utf-8" )
+        length = len( obj )
+        if length < 0x20:
+            write( struct.pack( ">B", 0xa0 | length ) )
+        elif length <= 0xff:
+            write( struct.pack( ">BB", 0xd9, length ) )
+        elif length <= 0xffff:
+            write( struct.pack( ">BH", 0xda, length ) )
+        else:
+            write( struct.pack( ">BI", 0xdb, length ) )
+        write( obj )
+
+    elif isinstance( obj, ( list, tuple ) ):
+        length = len( obj )
+        if length < 0x10:
+            write( struct.pack( ">B", 0x90 | length ) )
+        elif length <= 0xffff:
+            write( struct.pack( ">BH", 0xdc, length ) )
+        else:
+            write( struct.pack( ">BI", 0xdd, length ) )
+        for item in obj:
+            _pack( item, write )
+
+    elif isinstance( obj, dict ):
+        length = len( obj )
+        if length < 0x10:
+            write( struct.pack( ">B", 0x80 | length ) )
+        elif length <= 0xffff:
+            write( struct.pack( ">BH", 0xde, length ) )
+        else:
+            write( struct.pack( ">BI", 0xdf, length ) )
+        for key in sorted( obj ):
+            _pack( key, write )
+            _pack( obj[key], write )
+
+    else:
+        raise TypeError( "Can't pack %s" % type( obj ).__name__ )
+
+
+def mila_unpack( data ):
+
+    obj, offset = _unpack( data, 0 )
+    if offset != len( data ):
+        raise MilaFormatError( "Trailing data after the mila document" )
+    return obj
+
+
+def _unpack_string( data, offset, length ):
+    return data[offset:offset + length].decode( "utf-8" ), offset + length
+
+
+def _unpack_array( data, offset, length ):
+    items = []
+    for i in range( length ):
+        item, offset = _unpack( data, offset )
+        items.append( item )
+    return items, offset
+
+
+def _unpack_map( data, offset, length ):
+    items = {}
+    for i in range( length ):
+        key, offset = _unpack( data, offset )
+        items[key], offset = _unpack( data, offset )
+    return items, offset
+
+
+def _unpack_struct( fmt, data, offset ):
+    size = struct.calcsize( fmt )
+    return struct.unpack( fmt, data[offset:offset + size] )[0], offset + size
+
+
+def _unpack( data, offset ):
+
+    try:
+        code = ord( data[offset] )
+    except IndexError:
+        raise MilaFormatError( "Truncated mila document" )
+    offset += 1
+
+    if code < 0x80:
+        return code, offset
+    elif code >= 0xe0:
+        return code - 0x100, offset
+    elif 0x80 <= code <= 0x8f:
+        return _unpack_map( data, offset, code & 0x0f )
+    elif 0x90 <= code <= 0x9f:
+        return _unpack_array( data, offset, code & 0x0f )
+    elif 0xa0 <= code <= 0xbf:
+        return _unpack_string( data, offset, code & 0x1f )
+    elif code == 0xc0:
+        return None, offset
+    elif code == 0xc2:
+        return False, offset
+    elif code == 0xc3:
+        return True, offset
+    elif code == 0xca:
+        return _unpack_struct( ">f", data, offset )
+    elif code == 0xcb:
+        return _unpack_struct( ">d", data, offset )
+    elif code in _UNPACK_INTS:
+        return _unpack_struct( _UNPACK_INTS[code], data, offset )
+    elif code in ( 0xd9, 0xda, 0xdb ):
+        length, offset = _unpack_struct( _UNPACK_LENGTHS[code], data, offset )
+        return _unpack_string( data, offset, length )
+    elif code in ( 0xdc, 0xdd ):
+        length, offset = _unpack_struct( _UNPACK_LENGTHS[code], data, offset )
+        return _unpack_array( data, offset, length )
+    elif code in ( 0xde, 0xdf ):
+        length, offset = _unpack_struct( _UNPACK_LENGTHS[code], data, offset )
+        return _unpack_map( data, offset, length )
+
+    raise MilaFormatError( "Unsupported msgpack type: 0x%x" % code )
+
+_UNPACK_INTS = {0xcc: ">B", 0xcd: ">H", 0xce: ">I", 0xcf: ">Q", 0xd0: ">b", 0xd1: ">h", 0xd2: ">i", 0xd3: ">q"}
+_UNPACK_LENGTHS = {0xd9: ">B", 0xda: ">H", 0xdb: ">I", 0xdc: ">H", 0xdd: ">I", 0xde: ">H", 0xdf: ">I"}
+
+
+def mila_dumps( doc, binary=False ):
+
+    if binary:
+        return mila_pack( doc )
+
+    return json.dumps( doc, sort_keys=True, separators=( ",", ":" ) )
+
+
+def mila_loads( data ):
+    # json documents always start with "{", a msgpack map never does
+    if data[:1] == "{":
+        return json.loads( data )
+
+    return mila_unpack( data )
+
+
+## Files ---
+
+def mila_export( node, path, binary=None ):
+    """ Write the network of node to path. The binary format is used for .milab files unless specified """
+
+    if binary is None:
+        binary = path.endswith( MILA_BINARY_EXTENSION )
+
+    with open( path, "wb" ) as f:
+        f.write( mila_dumps( mila_snapshot( node ), binary ) )
+
+
+def mila_import( path, mila=None ):
+    """ Rebuild the network stored in path, returns ( top level MilaNode, list of missing external inputs ) """
+
+    with open( path, "rb" ) as f:
+        doc = mila_loads( f.read() )
+
+    return mila_rebuild( doc, mila )
+
+
+## Clipboard ---
+# Several networks (one per copied item) are packed in a single binary payload, so a paste doesn't need the original nodes
+
+MILA_MIME_TYPE = "application/x-mila-networks"
+
+def mila_pack_networks( nodes ):
+    """ Return the binary payload describing the networks of all nodes """
+
+    return mila_dumps( [mila_snapshot( node ) for node in nodes], binary=True )
+
+
+def mila_unpack_networks( data ):
+    """ Return the list of documents stored in a payload built by mila_pack_networks """
+
+    docs = mila_loads( data )
+
+    if not isinstance( docs, list ) or not all( isinstance( doc, dict ) and doc.get( "format" ) == MILA_FORMAT for doc in docs ):
+        raise MilaFormatError( "Not a mila clipboard payload" )
+
+    return docs
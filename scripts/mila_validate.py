@@ -0,0 +1,174 @@
+"""
+Find (and optionally fix) broken mila networks in the whole scene.
+
+    issues = mila_validate()            # report only
+    issues = mila_validate( fix=True )  # report and repair in a single undoable modifier
+
+The scene is read once with MilaGraph, every check then works on the in-memory graph.
+"""
+
+# Maya modules
+import maya.OpenMaya as OpenMaya
+
+# Mila modules
+from mila_node import mila_execute, MILA_MULTI_ATTR_NAME
+from mila_graph import MilaGraph
+
+
+class IssueType( object ):
+    kEmptySlot = "empty_slot"                       # a layer/mix slot with nothing connected
+    kStaleSoloLayer = "stale_solo_layer"            # a tmp_layer solo layer that is neither rendered in solo nor kept by its material
+    kDanglingSaveShader = "dangling_save_shader"    # save_shader is connected but the material is not in solo
+    kCycle = "cycle"                                # a group is (indirectly) connected into itself
+    kOrphan = "orphan"                              # a mila node that is not under any mila_material
+
+
+class MilaIssue( object ):
+
+    def __init__( self, kind, node, message, index=None ):
+
+        self.kind = kind
+        self.node = node
+        self.index = index
+        self.message = message
+
+    def __repr__( self ):
+        return "MilaIssue( %s, %s )" % ( self.kind, self.message )
+
+    def __str__( self ):
+        return self.message
+
+
+## Checks ---
+
+def _check_slots( graph, issues ):
+
+    for name, slots in graph.slots.items():
+        for index, child in slots:
+            if child is None:
+                issues.append( MilaIssue( IssueType.kEmptySlot, name, "%s.%s[%s] is empty" % ( name, MILA_MULTI_ATTR_NAME[graph.types[name]], index ), index ) )
+
+
+def _check_solo( graph, issues ):
+
+    # The solo layers actually used by a material in solo
+    active = set()
+
+    for material in graph.shader:
+        shader = graph.shader[material]
+        saved = graph.saved[material]
+
+        if saved is None:
+            continue
+
+        if shader in graph.solo_layers:
+            active.add( shader )
+        else:
+            issues.append( MilaIssue( IssueType.kDanglingSaveShader, material, "%s.save_shader is connected to %s but the material is not in solo" % ( material, saved ) ) )
+
+    # The solo layer of each material is kept between two solos
+    active.update( graph.pooled.values() )
+
+    for layer in graph.solo_layers:
+        if layer not in active:
+            issues.append( MilaIssue( IssueType.kStaleSoloLayer, layer, "%s is a solo layer left from a previous solo" % layer ) )
+
+
+def _check_cycles( graph, issues ):
+    # Iterative depth first search, a slot pointing to a node of the current path closes a cycle
+
+    kVisiting, kDone = 1, 2
+    state = {}
+
+    for start in graph.slots:
+        if start in state:
+            continue
+
+        state[start] = kVisiting
+        stack = [( start, iter( graph.slots[start] ) )]
+
+        while stack:
+            name, slots = stack[-1]
+
+            for index, child in slots:
+                if child is None:
+                    continue
+                if state.get( child ) == kVisiting:
+                    issues.append( MilaIssue( IssueType.kCycle, name, "%s.%s[%s] connects %s back into itself" % ( name, MILA_MULTI_ATTR_NAME[graph.types[name]], index, child ), index ) )
+                elif child not in state:
+                    state[child] = kVisiting
+                    stack.append( ( child, iter( graph.slots.get( child, [] ) ) ) )
+                    break
+            else:
+                state[name] = kDone
+                stack.pop()
+
+
+def _check_orphans( graph, issues ):
+
+    used = graph.used()
+
+    for name in sorted( graph.types ):
+        # Stale solo layers are already reported
+        if name not in used and name not in graph.solo_layers and graph.types[name] != "mila_material":
+            issues.append( MilaIssue( IssueType.kOrphan, name, "%s is not used by any mila_material" % name ) )
+
+
+MILA_CHECKS = [_check_slots, _check_solo, _check_cycles, _check_orphans]
+
+
+## Fixes ---
+
+def mila_fix_issues( issues, graph ):
+    """ Repair the issues found on graph with a single MDGModifier (one undo step) """
+
+    # A stale solo layer still rendered by a material is kept as its network, it only loses its tmp_layer attribute
+    rendered = set( graph.shader.values() )
+    deleted = set( issue.node for issue in issues if issue.kind == IssueType.kOrphan or ( issue.kind == IssueType.kStaleSoloLayer and issue.node not in rendered ) )
+
+    def operation( modifier ):
+
+        for issue in issues:
+            if issue.node in deleted:
+                # The node is going away anyway
+                continue
+
+            fn = OpenMaya.MFnDependencyNode( graph.objects[issue.node] )
+
+            if issue.kind in ( IssueType.kEmptySlot, IssueType.kCycle ):
+                # Removing the slot also breaks the connection closing the cycle
+                modifier.commandToExecute( 'removeMultiInstance -b true "%s.%s[%s]"' % ( issue.node, MILA_MULTI_ATTR_NAME[graph.types[issue.node]], issue.index ) )
+
+            elif issue.kind == IssueType.kDanglingSaveShader:
+                saved = fn.findPlug( "save_shader" )
+                sources = OpenMaya.MPlugArray()
+                saved.connectedTo( sources, True, False )
+                modifier.disconnect( sources[0], saved )
+                # Nothing is rendered, put the saved network back
+                if graph.shader[issue.node] is None:
+                    modifier.connect( sources[0], fn.findPlug( "shader" ) )
+
+            elif issue.kind == IssueType.kStaleSoloLayer:
+                modifier.removeAttribute( graph.objects[issue.node], fn.attribute( "tmp_layer" ) )
+
+        # Nodes are deleted last, the commands above may refer to them
+        for name in deleted:
+            modifier.deleteNode( graph.objects[name] )
+
+    mila_execute( operation )
+
+
+def mila_validate( fix=False, graph=None ):
+    """ Return the list of MilaIssue found in the scene. If fix is True, the issues are repaired (one undo step) """
+
+    if graph is None:
+        graph = MilaGraph()
+
+    issues = []
+    for check in MILA_CHECKS:
+        check( graph, issues )
+
+    if fix and issues:
+        mila_fix_issues( issues, graph )
+
+    return issues
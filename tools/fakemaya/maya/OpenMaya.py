@@ -0,0 +1,699 @@
+"""
+Subset of the maya.OpenMaya (API 1.0) classes working on the in-memory graph of maya._dg.
+"""
+
+# Python modules
+import shlex
+
+# Fake maya modules
+from maya._dg import dg, DG, Node, Attribute, Plug, color
+
+
+class MFn():
+    kInvalid = 0
+    kBase = 1
+    kDependencyNode = 4
+    kAttribute = 554
+    kCompoundAttribute = 571
+    kEnumAttribute = 572
+    kMessageAttribute = 579
+    kNumericAttribute = 580
+    kAttribute3Float = 560
+    kTypedAttribute = 587
+    kUnitAttribute = 588
+
+
+class MFnNumericData():
+    kInvalid = 0
+    kBoolean = 1
+    kByte = 2
+    kChar = 3
+    kShort = 4
+    kInt = 7
+    kLong = 7
+    kFloat = 11
+    k3Float = 13
+    kDouble = 14
+
+
+class MFnData():
+    kInvalid = 0
+    kString = 4
+
+
+_NUMERIC_TYPES = {
+                    "bool": MFnNumericData.kBoolean,
+                    "short": MFnNumericData.kShort,
+                    "int": MFnNumericData.kInt,
+                    "float": MFnNumericData.kFloat,
+                    "double": MFnNumericData.kDouble,
+                    "float3": MFnNumericData.k3Float
+                 }
+
+_NUMERIC_KINDS = dict( ( value, key ) for key, value in _NUMERIC_TYPES.items() )
+_NUMERIC_KINDS[MFnNumericData.kByte] = "short"
+_NUMERIC_KINDS[MFnNumericData.kChar] = "short"
+
+
+## Objects ---
+
+class MObject( object ):
+
+    def __init__( self, ref=None ):
+        # A Node, an Attribute or None
+        self._ref = ref
+
+    def isNull( self ):
+        return self._ref is None
+
+    def hasFn( self, fnType ):
+
+        ref = self._ref
+        if isinstance( ref, Node ):
+            return fnType in ( MFn.kBase, MFn.kDependencyNode )
+        if not isinstance( ref, Attribute ):
+            return False
+
+        if fnType in ( MFn.kBase, MFn.kAttribute ):
+            return True
+        if ref.kind == "message":
+            return fnType == MFn.kMessageAttribute
+        if ref.kind == "enum":
+            return fnType == MFn.kEnumAttribute
+        if ref.kind == "string":
+            return fnType == MFn.kTypedAttribute
+        if ref.kind == "float3":
+            return fnType in ( MFn.kNumericAttribute, MFn.kCompoundAttribute, MFn.kAttribute3Float )
+        if ref.kind == "compound":
+            return fnType == MFn.kCompoundAttribute
+
+        return fnType == MFn.kNumericAttribute
+
+    def apiType( self ):
+        if isinstance( self._ref, Node ):
+            return MFn.kDependencyNode
+        if isinstance( self._ref, Attribute ):
+            return MFn.kAttribute
+        return MFn.kInvalid
+
+    def __eq__( self, other ):
+        return isinstance( other, MObject ) and self._ref is other._ref
+
+    def __ne__( self, other ):
+        return not self.__eq__( other )
+
+    def __hash__( self ):
+        return hash( id( self._ref ) )
+
+MObject.kNullObj = MObject()
+
+
+class MObjectHandle( object ):
+
+    def __init__( self, obj=None ):
+        self._obj = obj if obj is not None else MObject()
+
+    def object( self ):
+        return self._obj
+
+    def isAlive( self ):
+        ref = self._obj._ref
+        return ref is not None and ( not isinstance( ref, Node ) or ref.alive )
+
+    def isValid( self ):
+        return self.isAlive()
+
+    def hashCode( self ):
+        return hash( id( self._obj._ref ) )
+
+
+class _Array( object ):
+    # Base of the MPlugArray/MIntArray... list wrappers
+
+    def __init__( self, items=() ):
+        self._items = list( items )
+
+    def length( self ):
+        return len( self._items )
+
+    def __len__( self ):
+        return len( self._items )
+
+    def __getitem__( self, index ):
+        return self._items[index]
+
+    def __iter__( self ):
+        return iter( self._items )
+
+    def append( self, item ):
+        self._items.append( item )
+
+    def clear( self ):
+        self._items = []
+
+    def setLength( self, length ):
+        self._items = self._items[:length]
+
+    def _set( self, items ):
+        self._items = list( items )
+
+
+class MPlugArray( _Array ):
+    pass
+
+class MIntArray( _Array ):
+    pass
+
+class MObjectArray( _Array ):
+    pass
+
+class MCallbackIdArray( _Array ):
+    pass
+
+
+## Plugs ---
+
+class MPlug( object ):
+
+    def __init__( self, plug=None ):
+        # A maya._dg.Plug, or None
+        self._plug = plug
+
+    def _set( self, plug ):
+        self._plug = plug
+
+    def isNull( self ):
+        return self._plug is None
+
+    def node( self ):
+        return MObject( self._plug.node )
+
+    def attribute( self ):
+        return MObject( self._plug.attr )
+
+    def name( self ):
+        return self._plug.name()
+
+    def partialName( self, includeNodeName=False, includeNonMandatoryIndices=False, includeInstancedIndices=False, useAlias=False, useFullAttributePath=False, useLongNames=False ):
+
+        if includeNodeName:
+            return self._plug.name()
+        return self._plug.path()
+
+    def info( self ):
+        return self._plug.name()
+
+    def isArray( self ):
+        return self._plug.isArray()
+
+    def isElement( self ):
+        return self._plug.attr.multi and self._plug.index is not None
+
+    def isChild( self ):
+        return self._plug.attr.parent is not None
+
+    def isCompound( self ):
+        return bool( self._plug.attr.children ) and not self._plug.isArray()
+
+    def isConnected( self ):
+        return self.isDestination() or self.isSource()
+
+    def isDestination( self ):
+        return dg.source( self._plug ) is not None
+
+    def isSource( self ):
+        return bool( dg.destinationsOf( self._plug ) )
+
+    def numChildren( self ):
+        return len( self._plug.attr.children )
+
+    def child( self, index ):
+
+        if isinstance( index, MObject ):
+            attr = index._ref
+            if attr not in self._plug.attr.children:
+                raise RuntimeError( "(kInvalidParameter): Object is not a child of the plug" )
+        else:
+            attr = self._plug.attr.children[index]
+
+        return MPlug( Plug( self._plug.node, attr, self._plug.index ) )
+
+    def parent( self ):
+        return MPlug( Plug( self._plug.node, self._plug.attr.parent, self._plug.index ) )
+
+    def array( self ):
+        return MPlug( Plug( self._plug.node, self._plug.attr, None ) )
+
+    def elementByLogicalIndex( self, index ):
+
+        if not self._plug.attr.multi:
+            raise RuntimeError( "(kFailure): %s is not an array" % self.name() )
+
+        return MPlug( Plug( self._plug.node, self._plug.attr, index ) )
+
+    def elementByPhysicalIndex( self, index ):
+        return self.elementByLogicalIndex( self._plug.node.existingIndices( self._plug.attr )[index] )
+
+    def logicalIndex( self ):
+        return self._plug.index
+
+    def numElements( self ):
+        return len( self._plug.node.existingIndices( self._plug.attr ) )
+
+    def getExistingArrayAttributeIndices( self, indices ):
+        existing = self._plug.node.existingIndices( self._plug.attr )
+        indices._set( existing )
+        return len( existing )
+
+    def connectedTo( self, plugs, asDst, asSrc ):
+
+        connected = []
+        if asDst:
+            src = dg.source( self._plug )
+            if src is not None:
+                connected.append( MPlug( src ) )
+        if asSrc:
+            connected += [MPlug( dst ) for dst in dg.destinationsOf( self._plug )]
+
+        plugs._set( connected )
+
+        return bool( connected )
+
+    def _value( self ):
+        plug = self._plug
+        src = dg.source( plug )
+        while src is not None:
+            plug = src
+            src = dg.source( plug )
+        return plug.node.value( plug.attr, plug.index )
+
+    def asBool( self ):
+        return bool( self._value() )
+
+    def asShort( self ):
+        return int( self._value() )
+
+    def asInt( self ):
+        return int( self._value() )
+
+    def asFloat( self ):
+        return float( self._value() )
+
+    def asDouble( self ):
+        return float( self._value() )
+
+    def asString( self ):
+        return self._value() or ""
+
+    def setBool( self, value ):
+        dg.setValue( self._plug, bool( value ) )
+
+    def setShort( self, value ):
+        dg.setValue( self._plug, int( value ) )
+
+    def setInt( self, value ):
+        dg.setValue( self._plug, int( value ) )
+
+    def setFloat( self, value ):
+        dg.setValue( self._plug, float( value ) )
+
+    def setDouble( self, value ):
+        dg.setValue( self._plug, float( value ) )
+
+    def setString( self, value ):
+        dg.setValue( self._plug, value )
+
+    def __eq__( self, other ):
+        return isinstance( other, MPlug ) and self._plug == other._plug
+
+    def __ne__( self, other ):
+        return not self.__eq__( other )
+
+
+## Function sets ---
+
+class MFnBase( object ):
+
+    def __init__( self, obj=None ):
+        self._obj = obj if obj is not None else MObject()
+
+    def setObject( self, obj ):
+        self._obj = obj
+
+    def object( self ):
+        return self._obj
+
+
+class MFnDependencyNode( MFnBase ):
+
+    def _node( self ):
+        return self._obj._ref
+
+    def name( self ):
+        return self._node().name
+
+    def typeName( self ):
+        return self._node().type
+
+    def setName( self, name ):
+        return dg.renameNode( self._node(), name )
+
+    def attributeCount( self ):
+        return len( list( self._node().allAttributes() ) )
+
+    def attribute( self, nameOrIndex ):
+
+        if isinstance( nameOrIndex, int ):
+            return MObject( list( self._node().allAttributes() )[nameOrIndex] )
+
+        return MObject( self._node().attribute( nameOrIndex ) )
+
+    def hasAttribute( self, name ):
+        return self._node().attribute( name ) is not None
+
+    def findPlug( self, attr, wantNetworkedPlug=False ):
+
+        node = self._node()
+
+        if isinstance( attr, MObject ):
+            attr = attr._ref
+        else:
+            name = attr
+            attr = node.attribute( name )
+            if attr is None:
+                raise RuntimeError( "(kInvalidParameter): No attribute %s on %s" % ( name, node.name ) )
+
+        return MPlug( Plug( node, attr ) )
+
+
+class MFnAttribute( MFnBase ):
+
+    def _attr( self ):
+        return self._obj._ref
+
+    def name( self ):
+        return self._attr().name
+
+    def shortName( self ):
+        return self._attr().name
+
+    def isHidden( self ):
+        return self._attr().hidden
+
+    def isWritable( self ):
+        return self._attr().writable
+
+    def isReadable( self ):
+        return self._attr().readable
+
+    def isStorable( self ):
+        return self._attr().storable
+
+    def isArray( self ):
+        return self._attr().multi
+
+    def isDynamic( self ):
+        return self._attr().dynamic
+
+    def parent( self ):
+        return MObject( self._attr().parent )
+
+    def setHidden( self, value ):
+        self._attr().hidden = value
+
+    def setStorable( self, value ):
+        self._attr().storable = value
+
+    def setArray( self, value ):
+        self._attr().multi = value
+
+
+class MFnNumericAttribute( MFnAttribute ):
+
+    def unitType( self ):
+        return _NUMERIC_TYPES.get( self._attr().kind, MFnNumericData.kInvalid )
+
+    def create( self, longName, shortName, unitType, default=0 ):
+        kind = _NUMERIC_KINDS[unitType]
+        if kind == "float3":
+            self._obj = MObject( color( longName ) )
+        else:
+            self._obj = MObject( Attribute( longName, kind, default ) )
+        return self._obj
+
+    def createColor( self, longName, shortName ):
+        self._obj = MObject( color( longName ) )
+        return self._obj
+
+
+class MFnTypedAttribute( MFnAttribute ):
+
+    def attrType( self ):
+        return MFnData.kString if self._attr().kind == "string" else MFnData.kInvalid
+
+    def create( self, longName, shortName, dataType, default=None ):
+        self._obj = MObject( Attribute( longName, "string", "" ) )
+        return self._obj
+
+
+class MFnMessageAttribute( MFnAttribute ):
+
+    def create( self, longName, shortName ):
+        self._obj = MObject( Attribute( longName, "message", storable=False ) )
+        return self._obj
+
+
+class MFnEnumAttribute( MFnAttribute ):
+
+    def create( self, longName, shortName, default=0 ):
+        self._obj = MObject( Attribute( longName, "enum", default ) )
+        return self._obj
+
+
+## Selection ---
+
+class MSelectionList( object ):
+
+    def __init__( self ):
+        self._items = []
+
+    def add( self, name ):
+
+        name = str( name )
+        if name in dg.nodes:
+            item = dg.nodes[name]
+        else:
+            try:
+                item = dg.plug( name )
+            except RuntimeError:
+                raise RuntimeError( "(kInvalidParameter): Object does not exist" )
+
+        if item not in self._items:
+            self._items.append( item )
+
+    def length( self ):
+        return len( self._items )
+
+    def clear( self ):
+        self._items = []
+
+    def getDependNode( self, index, obj ):
+        item = self._items[index]
+        obj._ref = item.node if isinstance( item, Plug ) else item
+
+    def getPlug( self, index, plug ):
+        item = self._items[index]
+        if not isinstance( item, Plug ):
+            raise RuntimeError( "(kInvalidParameter): Item is not a plug" )
+        plug._set( item )
+
+
+## Modifier ---
+
+class MDGModifier( object ):
+    """ The operations are queued and only run by doIt. Everything done is recorded so undoIt can revert it """
+
+    def __init__( self ):
+        self._queue = []
+        self._done = []
+        self._undone = False
+
+    def createNode( self, nodeType ):
+        node = dg.createNode( nodeType )
+        self._queue.append( lambda: dg.registerNode( node ) )
+        return MObject( node )
+
+    def renameNode( self, obj, name ):
+        self._queue.append( lambda: dg.renameNode( obj._ref, name ) )
+
+    def deleteNode( self, obj ):
+        self._queue.append( lambda: dg.unregisterNode( obj._ref ) if obj._ref.alive else None )
+
+    def addAttribute( self, obj, attr ):
+        self._queue.append( lambda: dg.addAttribute( obj._ref, attr._ref ) )
+
+    def removeAttribute( self, obj, attr ):
+        self._queue.append( lambda: dg.removeAttribute( obj._ref, attr._ref ) )
+
+    def connect( self, src, dst ):
+        self._queue.append( lambda: dg.connect( src._plug, dst._plug ) )
+
+    def disconnect( self, src, dst ):
+        self._queue.append( lambda: dg.disconnect( src._plug, dst._plug ) )
+
+    def _newValue( self, plug, value ):
+        self._queue.append( lambda: dg.setValue( plug._plug, value ) )
+
+    def newPlugValueBool( self, plug, value ):
+        self._newValue( plug, bool( value ) )
+
+    def newPlugValueShort( self, plug, value ):
+        self._newValue( plug, int( value ) )
+
+    def newPlugValueInt( self, plug, value ):
+        self._newValue( plug, int( value ) )
+
+    def newPlugValueFloat( self, plug, value ):
+        self._newValue( plug, float( value ) )
+
+    def newPlugValueDouble( self, plug, value ):
+        self._newValue( plug, float( value ) )
+
+    def newPlugValueString( self, plug, value ):
+        self._newValue( plug, value )
+
+    def commandToExecute( self, command ):
+        # Simple mel commands: name -flag value "argument" ...
+        self._queue.append( lambda: _execute_mel( command ) )
+
+    def doIt( self ):
+
+        if self._undone:
+            # Redo
+            dg.begin()
+            try:
+                dg.replay( self._done )
+                for redo_fn, undo_fn in self._done:
+                    dg.record( redo_fn, undo_fn )
+            finally:
+                dg.end()
+            self._undone = False
+            return
+
+        queue, self._queue = self._queue, []
+
+        dg.begin()
+        dg._recorders.append( self._done )
+        try:
+            for operation in queue:
+                operation()
+        finally:
+            dg._recorders.remove( self._done )
+            dg.end()
+
+    def undoIt( self ):
+
+        if not self._undone:
+            dg.replay( self._done, undo=True )
+            self._undone = True
+
+
+def _execute_mel( command ):
+
+    import maya.cmds as cmds
+
+    tokens = shlex.split( command.strip().rstrip( ";" ) )
+    name = tokens.pop( 0 )
+
+    args = []
+    flags = {}
+    while tokens:
+        token = tokens.pop( 0 )
+        if token.startswith( "-" ) and len( token ) > 1 and not token[1].isdigit():
+            value = True
+            if tokens and not tokens[0].startswith( "-" ) and tokens[0] in ( "true", "false", "on", "off", "1", "0" ):
+                value = tokens.pop( 0 ) in ( "true", "on", "1" )
+            flags[token[1:]] = value
+        else:
+            args.append( token )
+
+    return getattr( cmds, name )( *args, **flags )
+
+
+## Messages ---
+
+class MMessage( object ):
+
+    @staticmethod
+    def removeCallback( callback_id ):
+        dg.removeCallback( callback_id )
+
+    @staticmethod
+    def removeCallbacks( callback_ids ):
+        for callback_id in callback_ids:
+            dg.removeCallback( callback_id )
+
+
+class MNodeMessage( MMessage ):
+
+    kConnectionMade = DG.kConnectionMade
+    kConnectionBroken = DG.kConnectionBroken
+    kAttributeSet = DG.kAttributeSet
+    kAttributeAdded = DG.kAttributeAdded
+    kAttributeRemoved = DG.kAttributeRemoved
+    kIncomingDirection = DG.kIncomingDirection
+    kAttributeArrayAdded = DG.kAttributeArrayAdded
+    kAttributeArrayRemoved = DG.kAttributeArrayRemoved
+    kOtherPlugSet = DG.kOtherPlugSet
+
+    @staticmethod
+    def addNodeDirtyCallback( obj, fn, clientData=None ):
+        return dg.addCallback( "dirty", lambda plug: fn( obj, clientData ), obj._ref )
+
+    @staticmethod
+    def addNodeDirtyPlugCallback( obj, fn, clientData=None ):
+        return dg.addCallback( "dirty", lambda plug: fn( obj, MPlug( plug ), clientData ), obj._ref )
+
+    @staticmethod
+    def addNodePreRemovalCallback( obj, fn, clientData=None ):
+        return dg.addCallback( "preRemoval", lambda node: fn( obj, clientData ), obj._ref )
+
+    @staticmethod
+    def addAttributeChangedCallback( obj, fn, clientData=None ):
+        return dg.addCallback( "attributeChanged", lambda msg, plug, other: fn( msg, MPlug( plug ), MPlug( other ), clientData ), obj._ref )
+
+    @staticmethod
+    def addNameChangedCallback( obj, fn, clientData=None ):
+        return dg.addCallback( "nameChanged", lambda node, previous: fn( obj, previous, clientData ), obj._ref )
+
+
+class MDGMessage( MMessage ):
+
+    @staticmethod
+    def addConnectionCallback( fn, clientData=None ):
+        return dg.addCallback( "connection", lambda src, dst, made: fn( MPlug( src ), MPlug( dst ), made, clientData ) )
+
+    @staticmethod
+    def addNodeAddedCallback( fn, nodeType="dependNode", clientData=None ):
+        return dg.addCallback( "nodeAdded", lambda node: fn( MObject( node ), clientData ), nodeType=None if nodeType == "dependNode" else nodeType )
+
+    @staticmethod
+    def addNodeRemovedCallback( fn, nodeType="dependNode", clientData=None ):
+        return dg.addCallback( "nodeRemoved", lambda node: fn( MObject( node ), clientData ), nodeType=None if nodeType == "dependNode" else nodeType )
+
+
+class MGlobal( object ):
+
+    @staticmethod
+    def displayInfo( message ):
+        pass
+
+    @staticmethod
+    def displayWarning( message ):
+        import maya.cmds as cmds
+        cmds.warning( message )
+
+    @staticmethod
+    def displayError( message ):
+        import sys
+        sys.stderr.write( "// Error: %s //\n" % message )
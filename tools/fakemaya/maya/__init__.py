@@ -0,0 +1,13 @@
+"""
+In-memory stand-in for the maya python modules, to run the mila modules outside of maya (tests, benchmarks, CI).
+
+Put tools/fakemaya in front of sys.path (or PYTHONPATH) and the usual imports work:
+
+    import maya.cmds as cmds
+    import maya.OpenMaya as OpenMaya
+
+Only maya.cmds, maya.OpenMaya and maya.standalone are provided, with the subset used by the mila modules.
+The scene lives in maya._dg.dg, cmds.file( new=True ) resets it.
+"""
+
+FAKE = True
@@ -0,0 +1,723 @@
+"""
+In-memory dependency graph behind the fake maya.cmds and maya.OpenMaya modules.
+
+Nodes hold typed attributes (one level of multi compound, like the mila layers and components), values and
+connections. Every change goes through a few primitives that record a ( redo, undo ) pair, so cmds calls,
+undo chunks and MDGModifier all get the same undo behaviour as in maya, and fire the node/DG messages.
+"""
+
+from __future__ import print_function
+
+# Python modules
+import re
+import sys
+import traceback
+
+
+## Attributes ---
+
+class Attribute( object ):
+
+    def __init__( self, name, kind, default=None, children=(), multi=False, hidden=False, storable=True, writable=True, readable=True ):
+
+        self.name = name
+        # message, bool, short, enum, int, float, double, float3, string or compound
+        self.kind = kind
+        self.default = default
+        self.children = list( children )
+        self.multi = multi
+        self.hidden = hidden
+        self.storable = storable
+        self.writable = writable
+        self.readable = readable
+        self.parent = None
+        self.dynamic = False
+
+        for child in self.children:
+            child.parent = self
+
+    def walk( self ):
+        yield self
+        for child in self.children:
+            for attr in child.walk():
+                yield attr
+
+    def multiParent( self ):
+        # Return the multi attribute holding this attribute (itself included), or None
+        attr = self
+        while attr is not None:
+            if attr.multi:
+                return attr
+            attr = attr.parent
+        return None
+
+    def numeric( self ):
+        return self.kind in ( "bool", "short", "enum", "int", "float", "double" )
+
+    def __repr__( self ):
+        return "Attribute( %s, %s )" % ( self.name, self.kind )
+
+
+def message( name, **kwargs ):
+    return Attribute( name, "message", None, storable=False, **kwargs )
+
+def boolean( name, default=False, **kwargs ):
+    return Attribute( name, "bool", default, **kwargs )
+
+def number( name, default=0.0, kind="float", **kwargs ):
+    return Attribute( name, kind, default, **kwargs )
+
+def enum( name, default=0, **kwargs ):
+    return Attribute( name, "enum", default, **kwargs )
+
+def string( name, default="", **kwargs ):
+    return Attribute( name, "string", default, **kwargs )
+
+def color( name, default=( 1.0, 1.0, 1.0 ), **kwargs ):
+    return Attribute( name, "float3", None, [Attribute( name + channel, "float", default[i] ) for i, channel in enumerate( "RGB" )], **kwargs )
+
+def compound( name, children, multi=False, **kwargs ):
+    return Attribute( name, "compound", None, children, multi=multi, **kwargs )
+
+
+def _common():
+    return [
+            message( "message" ),
+            boolean( "caching" ),
+            boolean( "frozen" ),
+            number( "isHistoricallyInteresting", 2, "short", hidden=True ),
+            enum( "nodeState" ),
+            string( "binMembership", hidden=True )
+            ]
+
+def _slot( name ):
+    # One element of the layers/components multi of the mila groups, shader must stay the first child
+    children = [
+                message( "shader" ),
+                boolean( "on", True ),
+                number( "weight", 1.0 ),
+                color( "weight_tint" )
+                ]
+    if name == "layers":
+        children += [
+                    boolean( "use_directional_weight" ),
+                    enum( "directional_weight_mode" ),
+                    number( "normal_reflectivity", 0.04 ),
+                    number( "grazing_reflectivity", 1.0 ),
+                    number( "exponent", 5.0 ),
+                    number( "ior", 1.5 )
+                    ]
+    return compound( name, children, multi=True )
+
+def _component( extra=() ):
+    attrs = [
+            color( "tint" ),
+            number( "roughness" ),
+            number( "ior", 1.5 ),
+            number( "intensity", 1.0 ),
+            number( "direct", 1.0 ),
+            number( "indirect", 1.0 ),
+            color( "bump", ( 0.0, 0.0, 0.0 ) )
+            ]
+    return attrs + list( extra )
+
+_MAX_DIST = lambda: [boolean( "use_max_dist" ), number( "max_dist", 1.0 ), boolean( "use_max_dist_color" ), color( "max_dist_color", ( 0.0, 0.0, 0.0 ) )]
+_ANISOTROPY = lambda: [number( "anisotropy", 1.0 ), number( "aniso_angle" ), number( "aniso_channel", -1, "int" )]
+
+
+# node type -> function returning the ( static ) attributes of the type
+NODE_TYPES = {
+                "mila_material": lambda: [message( "shader" ), boolean( "show_framebuffer" )],
+                "mila_layer": lambda: [_slot( "layers" )],
+                "mila_mix": lambda: [_slot( "components" ), boolean( "clamp" )],
+                "mila_diffuse_reflection": lambda: _component(),
+                "mila_diffuse_transmission": lambda: _component(),
+                "mila_glossy_reflection": lambda: _component( _ANISOTROPY() + _MAX_DIST() ),
+                "mila_glossy_transmission": lambda: _component( _ANISOTROPY() + _MAX_DIST() ),
+                "mila_specular_reflection": lambda: _component( _MAX_DIST() ),
+                "mila_specular_transmission": lambda: _component( _MAX_DIST() ),
+                "mila_transparency": lambda: [color( "transparency" ), number( "direct", 1.0 ), number( "indirect", 1.0 )],
+                "mila_emission": lambda: _component(),
+                "mila_scatter": lambda: [
+                                        color( "front_tint" ), number( "front_weight", 0.5 ), number( "front_radius", 1.0 ), color( "front_radius_mod" ),
+                                        color( "back_tint" ), number( "back_weight", 0.5 ), number( "back_radius", 1.0 ), color( "back_radius_mod" ),
+                                        number( "back_depth" ), number( "scale_conversion", 1.0 ), number( "sampling_radius_mult", 1.0 ),
+                                        enum( "resolution", 1 ), number( "light_storage_gamma", 1.0 ),
+                                        number( "direct", 1.0 ), number( "indirect", 1.0 )
+                                        ],
+                # A few maya nodes so the networks can have external inputs
+                "file": lambda: [string( "fileTextureName" ), color( "outColor", ( 0.5, 0.5, 0.5 ), writable=False, storable=False ), number( "outAlpha", 1.0, writable=False, storable=False )],
+                "checker": lambda: [color( "color1" ), color( "color2", ( 0.0, 0.0, 0.0 ) ), color( "outColor", ( 0.5, 0.5, 0.5 ), writable=False, storable=False )],
+                "renderUtilityList": lambda: [Attribute( "utilities", "message", multi=True, storable=False )]
+              }
+
+_TYPE_CACHE = {}
+
+def _type_attributes( nodeType ):
+    # The static attributes are shared by all nodes of a type, like in maya
+    try:
+        return _TYPE_CACHE[nodeType]
+    except KeyError:
+        pass
+
+    attrs = _common() + NODE_TYPES[nodeType]()
+    _TYPE_CACHE[nodeType] = attrs
+
+    return attrs
+
+
+## Nodes ---
+
+class Node( object ):
+
+    def __init__( self, nodeType, name ):
+
+        self.type = nodeType
+        self.name = name
+        self.alive = False
+        # Creation order, set when the node is added to the graph
+        self.serial = None
+
+        # Top level attributes, in order
+        self.top = list( _type_attributes( nodeType ) )
+        # name -> Attribute, children included
+        self.attrs = {}
+        for attr in self.top:
+            for item in attr.walk():
+                self.attrs[item.name] = item
+
+        # ( attr name, index ) -> value
+        self.values = {}
+        # multi attr name -> set of existing logical indices
+        self.indices = {}
+
+    def attribute( self, name ):
+        return self.attrs.get( name )
+
+    def allAttributes( self ):
+        for attr in self.top:
+            for item in attr.walk():
+                yield item
+
+    def value( self, attr, index ):
+        try:
+            return self.values[( attr.name, index )]
+        except KeyError:
+            return attr.default
+
+    def existingIndices( self, attr ):
+        return sorted( self.indices.get( attr.name, () ) )
+
+    def __repr__( self ):
+        return "Node( %s, %s )" % ( self.type, self.name )
+
+
+class Plug( object ):
+    """ ( node, attribute, logical index ). The index is the one of the multi holding the attribute, None for an array plug """
+
+    __slots__ = ( "node", "attr", "index" )
+
+    def __init__( self, node, attr, index=None ):
+        self.node = node
+        self.attr = attr
+        self.index = index
+
+    def key( self ):
+        return ( self.node, self.attr.name, self.index )
+
+    def __eq__( self, other ):
+        return isinstance( other, Plug ) and self.key() == other.key()
+
+    def __ne__( self, other ):
+        return not self.__eq__( other )
+
+    def __hash__( self ):
+        return hash( ( id( self.node ), self.attr.name, self.index ) )
+
+    def isArray( self ):
+        return self.attr.multiParent() is not None and self.index is None
+
+    def path( self ):
+        # layers[2].shader, tint, tintR ...
+        multi = self.attr.multiParent()
+        if multi is None:
+            return self.attr.name
+        index = "" if self.index is None else "[%s]" % self.index
+        if multi is self.attr:
+            return multi.name + index
+        names = []
+        attr = self.attr
+        while attr is not multi:
+            names.insert( 0, attr.name )
+            attr = attr.parent
+        return "%s%s.%s" % ( multi.name, index, ".".join( names ) )
+
+    def name( self ):
+        return "%s.%s" % ( self.node.name, self.path() )
+
+    def children( self ):
+        return [Plug( self.node, child, self.index ) for child in self.attr.children]
+
+    def family( self ):
+        # The plug and all its children
+        yield self
+        for child in self.children():
+            for plug in child.family():
+                yield plug
+
+    def __repr__( self ):
+        return "Plug( %s )" % self.name()
+
+
+_PLUG_RE = re.compile( r"^([^.\[\]]+)\.([A-Za-z_][A-Za-z0-9_]*)(?:\[(\d+)\])?(?:\.([A-Za-z_][A-Za-z0-9_]*))?$" )
+
+
+## Graph ---
+
+class Callback( object ):
+
+    def __init__( self, kind, fn, node=None, nodeType=None ):
+        self.kind = kind
+        self.fn = fn
+        self.node = node
+        self.nodeType = nodeType
+
+
+class DG( object ):
+
+    # Node messages (the values of MNodeMessage.AttributeMessage)
+    kConnectionMade = 0x01
+    kConnectionBroken = 0x02
+    kAttributeSet = 0x08
+    kAttributeAdded = 0x40
+    kAttributeRemoved = 0x80
+    kIncomingDirection = 0x800
+    kAttributeArrayAdded = 0x1000
+    kAttributeArrayRemoved = 0x2000
+    kOtherPlugSet = 0x4000
+
+    def __init__( self ):
+        self.reset()
+
+    def reset( self ):
+
+        # name -> Node
+        self.nodes = {}
+        self._serial = 0
+        # plug key -> source Plug / destination key -> Plug
+        self.sources = {}
+        self.destinations = {}
+        self.selection = []
+
+        self.callbacks = {}
+        self._next_callback = 1
+
+        # Undo
+        self.undo_stack = []
+        self.redo_stack = []
+        self._step = None
+        self._depth = 0
+        self._chunks = 0
+        self._recorders = []
+        self._replaying = False
+
+        self._name_hints = {}
+
+        self.addNode( "renderUtilityList", "defaultRenderUtilityList1", record=False )
+
+    ## Undo ---
+
+    def begin( self ):
+        # A cmds call (or a modifier doIt) starts, everything until the matching end is one undo step
+        if self._depth == 0 and not self._chunks:
+            self._step = []
+        self._depth += 1
+
+    def end( self ):
+        self._depth -= 1
+        if self._depth == 0 and not self._chunks:
+            self._close_step()
+
+    def openChunk( self ):
+        if not self._chunks and self._depth == 0:
+            self._step = []
+        self._chunks += 1
+
+    def closeChunk( self ):
+        if self._chunks:
+            self._chunks -= 1
+            if not self._chunks and self._depth == 0:
+                self._close_step()
+
+    def _close_step( self ):
+        if self._step:
+            self.undo_stack.append( self._step )
+            self.redo_stack = []
+        self._step = None
+
+    def record( self, redo, undo ):
+
+        if self._replaying:
+            return
+
+        entry = ( redo, undo )
+
+        if self._step is not None:
+            self._step.append( entry )
+        for recorder in self._recorders:
+            recorder.append( entry )
+
+    def replay( self, entries, undo=False ):
+
+        self._replaying = True
+        try:
+            if undo:
+                for redo_fn, undo_fn in reversed( entries ):
+                    undo_fn()
+            else:
+                for redo_fn, undo_fn in entries:
+                    redo_fn()
+        finally:
+            self._replaying = False
+
+    def undo( self ):
+        if self.undo_stack:
+            step = self.undo_stack.pop()
+            self.replay( step, undo=True )
+            self.redo_stack.append( step )
+
+    def redo( self ):
+        if self.redo_stack:
+            step = self.redo_stack.pop()
+            self.replay( step )
+            self.undo_stack.append( step )
+
+    ## Callbacks ---
+
+    def addCallback( self, kind, fn, node=None, nodeType=None ):
+        callback_id = self._next_callback
+        self._next_callback += 1
+        self.callbacks[callback_id] = Callback( kind, fn, node, nodeType )
+        return callback_id
+
+    def removeCallback( self, callback_id ):
+        self.callbacks.pop( callback_id, None )
+
+    def notify( self, kind, node, *args ):
+
+        for callback in list( self.callbacks.values() ):
+            if callback.kind != kind:
+                continue
+            if callback.node is not None and callback.node is not node:
+                continue
+            if callback.nodeType is not None and ( node is None or node.type != callback.nodeType ):
+                continue
+            try:
+                callback.fn( *args )
+            except Exception:
+                # Like maya, a failing callback doesn't stop the command
+                traceback.print_exc( file=sys.stderr )
+
+    def _attribute_changed( self, msg, plug, other=None ):
+        self.notify( "attributeChanged", plug.node, msg, plug, other )
+        self.notify( "dirty", plug.node, plug )
+
+    ## Queries ---
+
+    def node( self, name ):
+        node = self.nodes.get( name )
+        if node is None:
+            raise RuntimeError( "No object matches name: %s" % name )
+        return node
+
+    def exists( self, name ):
+
+        if name in self.nodes:
+            return True
+        try:
+            self.plug( name )
+        except RuntimeError:
+            return False
+        return True
+
+    def plug( self, name ):
+        """ Parse node.attr, node.multi[i], node.multi[i].child or node.multi.child """
+
+        match = _PLUG_RE.match( str( name ) )
+        if not match:
+            raise RuntimeError( "No object matches name: %s" % name )
+
+        nodeName, attrName, index, childName = match.groups()
+        node = self.node( nodeName )
+        attr = node.attribute( attrName )
+        if attr is None:
+            raise RuntimeError( "No object matches name: %s" % name )
+
+        if index is not None:
+            index = int( index )
+            if not attr.multi:
+                raise RuntimeError( "%s is not a multi attribute" % name )
+
+        if childName is not None:
+            child = node.attribute( childName )
+            if child is None or child.multiParent() is not attr:
+                raise RuntimeError( "No object matches name: %s" % name )
+            attr = child
+
+        return Plug( node, attr, index )
+
+    def ordered( self ):
+        # The nodes in creation order
+        return sorted( self.nodes.values(), key=lambda node: node.serial )
+
+    def source( self, plug ):
+        return self.sources.get( plug.key() )
+
+    def destinationsOf( self, plug ):
+        return list( self.destinations.get( plug.key(), () ) )
+
+    def elementPlugs( self, plug ):
+        # All the plugs of an array or of an element (the children included)
+        multi = plug.attr.multiParent()
+        if plug.index is not None or multi is None:
+            return list( plug.family() )
+        plugs = []
+        for index in plug.node.existingIndices( multi ):
+            plugs += list( Plug( plug.node, multi, index ).family() )
+        return plugs
+
+    ## Primitives ---
+    # Every change of the graph goes through these methods
+
+    def uniqueName( self, name ):
+
+        if name not in self.nodes:
+            return name
+
+        base = re.sub( r"[0-9]+$", "", name )
+        i = self._name_hints.get( base, 1 )
+        while ( base + str( i ) ) in self.nodes:
+            i += 1
+        self._name_hints[base] = i + 1
+
+        return base + str( i )
+
+    def createNode( self, nodeType, name=None ):
+
+        if nodeType not in NODE_TYPES:
+            raise RuntimeError( "Unknown object type: %s" % nodeType )
+
+        return Node( nodeType, self.uniqueName( name or nodeType + "1" ) )
+
+    def addNode( self, nodeType, name=None, record=True ):
+        node = self.createNode( nodeType, name )
+        self.registerNode( node, record )
+        return node
+
+    def registerNode( self, node, record=True ):
+
+        node.name = self.uniqueName( node.name )
+        node.alive = True
+        self.nodes[node.name] = node
+        if node.serial is None:
+            self._serial += 1
+            node.serial = self._serial
+
+        if record:
+            self.record( lambda: self.registerNode( node ), lambda: self.unregisterNode( node ) )
+
+        self.notify( "nodeAdded", node, node )
+
+    def unregisterNode( self, node ):
+
+        self.notify( "preRemoval", node, node )
+
+        # Break every connection first (they are recorded, so undo restores them)
+        for key in [key for key in self.sources if key[0] is node]:
+            self.disconnect( self.sources[key], Plug( node, node.attrs[key[1]], key[2] ) )
+        for key in [key for key in self.destinations if key[0] is node]:
+            src = Plug( node, node.attrs[key[1]], key[2] )
+            for dst in self.destinationsOf( src ):
+                self.disconnect( src, dst )
+
+        self.record( lambda: self.unregisterNode( node ), lambda: self.registerNode( node, record=False ) )
+
+        del self.nodes[node.name]
+        node.alive = False
+        self.selection = [item for item in self.selection if item is not node]
+
+        self.notify( "nodeRemoved", node, node )
+
+    def renameNode( self, node, name ):
+
+        previous = node.name
+        if name == previous:
+            return previous
+
+        if node.alive:
+            name = self.uniqueName( name )
+            del self.nodes[previous]
+            self.nodes[name] = node
+        node.name = name
+
+        self.record( lambda: self.renameNode( node, name ), lambda: self.renameNode( node, previous ) )
+        self.notify( "nameChanged", node, node, previous )
+
+        return name
+
+    def addAttribute( self, node, attr ):
+
+        if attr.name in node.attrs:
+            raise RuntimeError( "Found a node attribute named %s" % attr.name )
+
+        attr.dynamic = True
+        node.top.append( attr )
+        for item in attr.walk():
+            node.attrs[item.name] = item
+
+        self.record( lambda: self.addAttribute( node, attr ), lambda: self.removeAttribute( node, attr ) )
+        self.notify( "attributeChanged", node, self.kAttributeAdded, Plug( node, attr ), None )
+
+    def removeAttribute( self, node, attr ):
+
+        plug = Plug( node, attr )
+        for item in self.elementPlugs( plug ):
+            src = self.source( item )
+            if src is not None:
+                self.disconnect( src, item )
+            for dst in self.destinationsOf( item ):
+                self.disconnect( item, dst )
+
+        values = dict( ( key, value ) for key, value in node.values.items() if key[0] in [item.name for item in attr.walk()] )
+        for key in values:
+            del node.values[key]
+        indices = node.indices.pop( attr.name, None )
+
+        node.top.remove( attr )
+        for item in attr.walk():
+            del node.attrs[item.name]
+
+        def undo():
+            self.addAttribute( node, attr )
+            node.values.update( values )
+            if indices is not None:
+                node.indices[attr.name] = indices
+
+        self.record( lambda: self.removeAttribute( node, attr ), undo )
+        self.notify( "attributeChanged", node, self.kAttributeRemoved, plug, None )
+
+    def addIndex( self, plug ):
+
+        multi = plug.attr.multiParent()
+        if multi is None or plug.index is None:
+            return
+
+        indices = plug.node.indices.setdefault( multi.name, set() )
+        if plug.index in indices:
+            return
+
+        indices.add( plug.index )
+
+        self.record( lambda: self.addIndex( plug ), lambda: self.removeIndex( Plug( plug.node, multi, plug.index ) ) )
+        self._attribute_changed( self.kAttributeArrayAdded, Plug( plug.node, multi, plug.index ) )
+
+    def removeIndex( self, plug ):
+        # Remove the element, its connections must already be broken
+
+        multi = plug.attr.multiParent()
+        indices = plug.node.indices.get( multi.name, set() )
+        if plug.index not in indices:
+            return
+
+        element = Plug( plug.node, multi, plug.index )
+
+        values = {}
+        for item in element.family():
+            key = ( item.attr.name, item.index )
+            if key in plug.node.values:
+                values[key] = plug.node.values.pop( key )
+
+        indices.discard( plug.index )
+
+        def undo():
+            self.addIndex( element )
+            plug.node.values.update( values )
+
+        self.record( lambda: self.removeIndex( element ), undo )
+        self._attribute_changed( self.kAttributeArrayRemoved, element )
+
+    def setValue( self, plug, value ):
+
+        key = ( plug.attr.name, plug.index )
+        had = key in plug.node.values
+        previous = plug.node.values.get( key )
+
+        self.addIndex( plug )
+        plug.node.values[key] = value
+
+        def undo():
+            if had:
+                plug.node.values[key] = previous
+            else:
+                plug.node.values.pop( key, None )
+            # Like maya, undoing a value change is notified
+            self._attribute_changed( self.kAttributeSet, plug )
+
+        self.record( lambda: self.setValue( plug, value ), undo )
+        self._attribute_changed( self.kAttributeSet, plug )
+
+    def connect( self, src, dst, force=False ):
+
+        if dst.attr.kind == "message" or src.attr.kind == "message":
+            if dst.attr.kind != src.attr.kind:
+                raise RuntimeError( "The attribute '%s' cannot be connected to '%s'. Data types of source and destination are not compatible." % ( src.name(), dst.name() ) )
+        elif src.attr.numeric() != dst.attr.numeric() or len( src.attr.children ) != len( dst.attr.children ):
+            raise RuntimeError( "The attribute '%s' cannot be connected to '%s'. Data types of source and destination are not compatible." % ( src.name(), dst.name() ) )
+
+        if not dst.attr.writable:
+            raise RuntimeError( "The destination attribute '%s' cannot be connected to." % dst.name() )
+
+        previous = self.source( dst )
+        if previous is not None:
+            if previous == src:
+                return False
+            if not force:
+                raise RuntimeError( "'%s' already has an incoming connection from '%s'." % ( dst.name(), previous.name() ) )
+            self.disconnect( previous, dst )
+
+        self.addIndex( src )
+        self.addIndex( dst )
+
+        self.sources[dst.key()] = src
+        self.destinations.setdefault( src.key(), [] ).append( dst )
+
+        self.record( lambda: self.connect( src, dst ), lambda: self.disconnect( src, dst ) )
+
+        self.notify( "attributeChanged", dst.node, self.kConnectionMade | self.kIncomingDirection, dst, src )
+        self.notify( "attributeChanged", src.node, self.kConnectionMade, src, dst )
+        self.notify( "connection", None, src, dst, True )
+        self.notify( "dirty", dst.node, dst )
+
+        return True
+
+    def disconnect( self, src, dst ):
+
+        if self.source( dst ) != src:
+            raise RuntimeError( "There is no connection from '%s' to '%s' to disconnect" % ( src.name(), dst.name() ) )
+
+        del self.sources[dst.key()]
+        dsts = self.destinations[src.key()]
+        dsts.remove( dst )
+        if not dsts:
+            del self.destinations[src.key()]
+
+        self.record( lambda: self.disconnect( src, dst ), lambda: self.connect( src, dst ) )
+
+        self.notify( "attributeChanged", dst.node, self.kConnectionBroken | self.kIncomingDirection, dst, src )
+        self.notify( "attributeChanged", src.node, self.kConnectionBroken, src, dst )
+        self.notify( "connection", None, src, dst, False )
+        self.notify( "dirty", dst.node, dst )
+
+
+# The scene
+dg = DG()
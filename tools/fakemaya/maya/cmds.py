@@ -0,0 +1,483 @@
+"""
+Subset of maya.cmds working on the in-memory graph of maya._dg.
+
+Only the flags used by the mila modules are implemented, unknown flags are ignored.
+Errors are raised as RuntimeError, like maya.cmds does.
+"""
+
+from __future__ import print_function
+
+# Python modules
+import sys
+import functools
+
+# Fake maya modules
+from maya._dg import dg, Attribute, Plug, color
+
+
+def _command( fn ):
+    # Every command is one undo step (or part of the open chunk)
+
+    @functools.wraps( fn )
+    def wrapper( *args, **kwargs ):
+        dg.begin()
+        try:
+            return fn( *args, **kwargs )
+        finally:
+            dg.end()
+
+    return wrapper
+
+
+def _flag( kwargs, *names, **default ):
+    # Return the value of a flag given by its long or short name
+    for name in names:
+        if name in kwargs:
+            return kwargs[name]
+    return default.get( "default" )
+
+
+def _names( args ):
+    # Flatten the node/plug arguments (strings, lists, MilaNode-like objects)
+    names = []
+    for arg in args:
+        if isinstance( arg, ( list, tuple ) ):
+            names += _names( arg )
+        else:
+            names.append( str( arg ) )
+    return names
+
+
+## Nodes ---
+
+@_command
+def createNode( nodeType, name=None, n=None, skipSelect=False, ss=False, **kwargs ):
+
+    node = dg.addNode( nodeType, name or n )
+
+    if not ( skipSelect or ss ):
+        dg.selection = [node]
+
+    return node.name
+
+
+@_command
+def delete( *args, **kwargs ):
+
+    names = _names( args ) or [node.name for node in dg.selection]
+    if not names:
+        raise RuntimeError( "Not enough objects or values." )
+
+    nodes = [dg.node( name ) for name in names]
+    for node in nodes:
+        if node.alive:
+            dg.unregisterNode( node )
+
+
+@_command
+def rename( old, new, **kwargs ):
+    return dg.renameNode( dg.node( str( old ) ), new )
+
+
+def objExists( name ):
+    return dg.exists( str( name ) )
+
+
+def nodeType( name, **kwargs ):
+
+    name = str( name )
+    if name not in dg.nodes:
+        return dg.plug( name ).node.type
+
+    return dg.node( name ).type
+
+
+def ls( *args, **kwargs ):
+
+    types = _flag( kwargs, "type", "typ" )
+    if isinstance( types, str ):
+        types = [types]
+
+    if _flag( kwargs, "selection", "sl" ):
+        nodes = list( dg.selection )
+    elif args:
+        nodes = [dg.nodes[name] for name in _names( args ) if name in dg.nodes]
+    else:
+        nodes = dg.ordered()
+
+    if types is not None:
+        types = set( types )
+        nodes = [node for node in nodes if node.type in types]
+
+    return [node.name for node in nodes]
+
+
+def select( *args, **kwargs ):
+
+    if _flag( kwargs, "clear", "cl" ):
+        dg.selection = []
+        return
+
+    nodes = [dg.node( name.split( "." )[0] ) for name in _names( args )]
+
+    if _flag( kwargs, "add" ):
+        dg.selection += [node for node in nodes if node not in dg.selection]
+    elif _flag( kwargs, "deselect", "d" ):
+        dg.selection = [node for node in dg.selection if node not in nodes]
+    else:
+        dg.selection = nodes
+
+
+@_command
+def duplicate( *args, **kwargs ):
+    """ Duplicate the nodes, with upstreamNodes the whole upstream graph is duplicated and reconnected """
+
+    nodes = [dg.node( name ) for name in _names( args )]
+
+    if _flag( kwargs, "upstreamNodes", "un" ):
+        stack = list( nodes )
+        seen = []
+        while stack:
+            node = stack.pop( 0 )
+            if node in seen:
+                continue
+            seen.append( node )
+            stack += [src.node for key, src in dg.sources.items() if key[0] is node]
+        nodes = seen
+
+    copies = {}
+    for node in nodes:
+        copy = dg.addNode( node.type, node.name )
+        for attr in node.top:
+            if attr.dynamic:
+                dg.addAttribute( copy, Attribute( attr.name, attr.kind, attr.default, [Attribute( child.name, child.kind, child.default ) for child in attr.children], attr.multi ) )
+        for ( name, index ), value in node.values.items():
+            dg.setValue( Plug( copy, copy.attrs[name], index ), value )
+        for multi, indices in node.indices.items():
+            for index in indices:
+                dg.addIndex( Plug( copy, copy.attrs[multi], index ) )
+        copies[node] = copy
+
+    # Connections between duplicated nodes are duplicated too
+    for key, src in list( dg.sources.items() ):
+        if key[0] in copies and src.node in copies:
+            dst = copies[key[0]]
+            new_src = copies[src.node]
+            dg.connect( Plug( new_src, new_src.attrs[src.attr.name], src.index ), Plug( dst, dst.attrs[key[1]], key[2] ) )
+
+    return [copies[node].name for node in nodes]
+
+
+## Attributes ---
+
+@_command
+def addAttr( *args, **kwargs ):
+
+    node = dg.node( _names( args )[0] if args else dg.selection[0].name )
+
+    name = _flag( kwargs, "longName", "ln" )
+    attrType = _flag( kwargs, "attributeType", "at" )
+    dataType = _flag( kwargs, "dataType", "dt" )
+    multi = bool( _flag( kwargs, "multi", "m" ) )
+
+    if dataType == "string":
+        attr = Attribute( name, "string", "" )
+    elif attrType in ( "float3", "double3" ):
+        attr = color( name )
+    elif attrType in ( "message", "bool", "short", "enum", "float", "double", "long" ):
+        kind = "int" if attrType == "long" else attrType
+        attr = Attribute( name, kind, None if kind == "message" else _flag( kwargs, "defaultValue", "dv", default=0 ) )
+    else:
+        raise RuntimeError( "Unsupported attribute type: %s" % ( attrType or dataType ) )
+
+    attr.multi = multi
+    dg.addAttribute( node, attr )
+
+
+@_command
+def deleteAttr( *args, **kwargs ):
+
+    plug = dg.plug( _names( args )[0] )
+    if not plug.attr.dynamic:
+        raise RuntimeError( "Cannot delete the static attribute %s" % plug.name() )
+
+    dg.removeAttribute( plug.node, plug.attr )
+
+
+def attributeQuery( attr, node=None, type=None, exists=False, **kwargs ):
+
+    if node is not None:
+        found = dg.node( str( node ) ).attribute( attr )
+    elif type is not None:
+        from maya._dg import _type_attributes
+        found = None
+        for top in _type_attributes( type ):
+            for item in top.walk():
+                if item.name == attr:
+                    found = item
+    else:
+        found = None
+
+    if _flag( kwargs, "listDefault", "ld" ):
+        if found is None:
+            raise RuntimeError( "attributeQuery: no attribute named %s" % attr )
+        # Numbers only, like maya (compounds give the defaults of their children)
+        return [float( item.default or 0 ) for item in ( found.children or [found] )]
+
+    return found is not None
+
+
+def listAttr( *args, **kwargs ):
+
+    name = _names( args )[0]
+    multi = _flag( kwargs, "multi", "m" )
+
+    if name in dg.nodes:
+        node = dg.nodes[name]
+        plugs = []
+        for attr in node.top:
+            plugs += _list_plugs( Plug( node, attr ), multi )
+    else:
+        plugs = _list_plugs( dg.plug( name ), multi )
+
+    return [plug.path() for plug in plugs]
+
+
+def _list_plugs( plug, multi ):
+
+    if plug.isArray():
+        if not multi:
+            return [plug]
+        plugs = []
+        for index in plug.node.existingIndices( plug.attr ):
+            plugs += list( Plug( plug.node, plug.attr, index ).family() )
+        return plugs
+
+    return list( plug.family() )
+
+
+def getAttr( name, **kwargs ):
+
+    plug = dg.plug( str( name ) )
+
+    if _flag( kwargs, "multiIndices", "mi" ):
+        multi = plug.attr.multiParent()
+        if multi is None:
+            raise RuntimeError( "%s is not a multi attribute" % name )
+        return plug.node.existingIndices( multi ) or None
+
+    if _flag( kwargs, "type" ):
+        if plug.attr.kind == "compound":
+            return "TdataCompound"
+        if plug.attr.kind == "int":
+            return "long"
+        return plug.attr.kind
+
+    if plug.isArray():
+        raise RuntimeError( "The value for the attribute could not be retrieved." )
+
+    if plug.attr.kind == "message":
+        raise RuntimeError( "Message attributes have no data values." )
+
+    if plug.attr.children:
+        return [tuple( _value( child ) for child in plug.children() )]
+
+    return _value( plug )
+
+
+def _value( plug ):
+    # The value of a plug, the one of its source when it is connected
+    src = dg.source( plug )
+    if src is not None:
+        return _value( src )
+
+    return plug.node.value( plug.attr, plug.index )
+
+
+@_command
+def setAttr( name, *values, **kwargs ):
+
+    plug = dg.plug( str( name ) )
+
+    if plug.attr.kind == "message" or plug.isArray():
+        raise RuntimeError( "setAttr: '%s' is not a simple numeric attribute." % name )
+
+    if any( dg.source( item ) is not None for item in plug.family() ):
+        raise RuntimeError( "setAttr: The attribute '%s' is locked or connected and cannot be modified." % name )
+
+    if plug.attr.children:
+        if len( values ) == 1 and isinstance( values[0], ( list, tuple ) ):
+            values = values[0]
+        for child, value in zip( plug.children(), values ):
+            dg.setValue( child, float( value ) )
+        return
+
+    if not values:
+        raise RuntimeError( "setAttr: No value specified for %s" % name )
+
+    value = values[0]
+    if plug.attr.kind == "bool":
+        value = bool( value )
+    elif plug.attr.kind in ( "short", "enum", "int" ):
+        value = int( value )
+    elif plug.attr.kind in ( "float", "double" ):
+        value = float( value )
+
+    dg.setValue( plug, value )
+
+
+@_command
+def removeMultiInstance( name, b=False, breakConnections=False, **kwargs ):
+
+    plug = dg.plug( str( name ) )
+    if plug.index is None:
+        raise RuntimeError( "removeMultiInstance: %s is not an element of a multi" % name )
+
+    element = Plug( plug.node, plug.attr.multiParent(), plug.index )
+
+    connections = []
+    for item in element.family():
+        src = dg.source( item )
+        if src is not None:
+            connections.append( ( src, item ) )
+        connections += [( item, dst ) for dst in dg.destinationsOf( item )]
+
+    if connections and not ( b or breakConnections ):
+        raise RuntimeError( "removeMultiInstance: %s has connections, use -b to break them" % name )
+
+    for src, dst in connections:
+        dg.disconnect( src, dst )
+
+    dg.removeIndex( element )
+
+
+## Connections ---
+
+@_command
+def connectAttr( src, dst, force=False, f=False, nextAvailable=False, na=False, **kwargs ):
+
+    src = dg.plug( str( src ) )
+    dst = dg.plug( str( dst ) )
+
+    if ( nextAvailable or na ) and dst.isArray():
+        indices = dst.node.existingIndices( dst.attr.multiParent() )
+        dst = Plug( dst.node, dst.attr, indices[-1] + 1 if indices else 0 )
+
+    if not dg.connect( src, dst, force or f ):
+        warning( "'%s' is already connected to '%s'." % ( src.name(), dst.name() ) )
+
+    return "Connected %s to %s." % ( src.name(), dst.name() )
+
+
+@_command
+def disconnectAttr( src, dst, **kwargs ):
+    dg.disconnect( dg.plug( str( src ) ), dg.plug( str( dst ) ) )
+
+
+def connectionInfo( name, **kwargs ):
+
+    plug = dg.plug( str( name ) )
+
+    if _flag( kwargs, "isExactDestination", "ied" ):
+        return dg.source( plug ) is not None
+
+    if _flag( kwargs, "isDestination", "id" ):
+        return any( dg.source( item ) is not None for item in dg.elementPlugs( plug ) )
+
+    if _flag( kwargs, "isExactSource", "ies" ):
+        return bool( dg.destinationsOf( plug ) )
+
+    if _flag( kwargs, "isSource", "is" ):
+        return any( dg.destinationsOf( item ) for item in dg.elementPlugs( plug ) )
+
+    if _flag( kwargs, "sourceFromDestination", "sfd" ):
+        src = dg.source( plug )
+        return src.name() if src is not None else ""
+
+    if _flag( kwargs, "destinationFromSource", "dfs" ):
+        return [dst.name() for dst in dg.destinationsOf( plug )]
+
+    raise RuntimeError( "connectionInfo: no flag specified" )
+
+
+def listConnections( *args, **kwargs ):
+
+    source = _flag( kwargs, "source", "s", default=True )
+    destination = _flag( kwargs, "destination", "d", default=True )
+    plugs = _flag( kwargs, "plugs", "p" )
+
+    result = []
+    for name in _names( args ):
+        if name in dg.nodes:
+            node = dg.nodes[name]
+            items = []
+            for attr in node.top:
+                items += dg.elementPlugs( Plug( node, attr ) )
+        else:
+            items = dg.elementPlugs( dg.plug( name ) )
+
+        for item in items:
+            src = dg.source( item )
+            if source and src is not None:
+                result.append( src.name() if plugs else src.node.name )
+            if destination:
+                result += [dst.name() if plugs else dst.node.name for dst in dg.destinationsOf( item )]
+
+    return result or None
+
+
+## Scene ---
+
+def dgdirty( *args, **kwargs ):
+
+    for name in _names( args ):
+        plug = dg.plug( name ) if "." in name else None
+        node = plug.node if plug else dg.node( name )
+        dg.notify( "dirty", node, plug )
+
+
+def file( *args, **kwargs ):
+
+    if _flag( kwargs, "newFile", "new", "n" ):
+        dg.reset()
+        return "untitled"
+
+    raise RuntimeError( "file: only new scenes are supported by the in-memory graph" )
+
+
+def undoInfo( *args, **kwargs ):
+
+    if _flag( kwargs, "openChunk", "ock" ):
+        dg.openChunk()
+    elif _flag( kwargs, "closeChunk", "cck" ):
+        dg.closeChunk()
+    elif _flag( kwargs, "query", "q" ):
+        return True
+
+
+def undo( *args, **kwargs ):
+    dg.undo()
+
+
+def redo( *args, **kwargs ):
+    dg.redo()
+
+
+def loadPlugin( *args, **kwargs ):
+    return []
+
+
+def pluginInfo( *args, **kwargs ):
+    return True
+
+
+def refresh( *args, **kwargs ):
+    pass
+
+
+def warning( message ):
+    sys.stderr.write( "// Warning: %s //\n" % message )
+
+
+def error( message ):
+    raise RuntimeError( message )
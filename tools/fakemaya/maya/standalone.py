@@ -0,0 +1,10 @@
+"""
+maya.standalone stand-in, there is nothing to initialize for the in-memory graph.
+"""
+
+def initialize( name="python" ):
+    pass
+
+
+def uninitialize():
+    pass